@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import logging
+import time
+from collections import deque
+
+from app.errors import UpstreamModelError
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, *, failure_threshold: int, recovery_seconds: float, half_open_max_calls: int = 1):
+        self.failure_threshold = max(failure_threshold, 1)
+        self.recovery_seconds = recovery_seconds
+        self.half_open_max_calls = max(half_open_max_calls, 1)
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self._stats = {"opened": 0, "short_circuited": 0}
+
+    def _transition(self, state: str) -> None:
+        if state == self.state:
+            return
+        logger.warning(
+            "circuit_state_change",
+            extra={
+                "previous_state": self.state,
+                "circuit_state": state,
+                "consecutive_failures": self.consecutive_failures,
+            },
+        )
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+            self._stats["opened"] += 1
+        self.probes_in_flight = 0
+
+    def before_call(self) -> bool:
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.recovery_seconds:
+            self._transition(HALF_OPEN)
+        if self.state == OPEN or (self.state == HALF_OPEN and self.probes_in_flight >= self.half_open_max_calls):
+            self._stats["short_circuited"] += 1
+            raise UpstreamModelError("Model service is temporarily unavailable (circuit open)")
+        if self.state == HALF_OPEN:
+            self.probes_in_flight += 1
+            return True
+        return False
+
+    def record_success(self, probe: bool) -> None:
+        self.consecutive_failures = 0
+        if probe or self.state == HALF_OPEN:
+            self._transition(CLOSED)
+
+    def record_failure(self, probe: bool) -> None:
+        self.consecutive_failures += 1
+        if probe or self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self._transition(OPEN)
+
+    def record_neutral(self, probe: bool) -> None:
+        # Cancelled or non-upstream outcomes say nothing about health; just free the probe slot.
+        if probe and self.state == HALF_OPEN:
+            self.probes_in_flight = max(self.probes_in_flight - 1, 0)
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "opened": self._stats["opened"],
+            "short_circuited": self._stats["short_circuited"],
+        }
+
+
+class RetryBudget:
+    def __init__(self, *, ratio: float, min_retries: int, window_seconds: float):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window_seconds = window_seconds
+        self._requests: deque[float] = deque()
+        self._retries: deque[float] = deque()
+        self._denied = 0
+
+    def _prune(self, now: float) -> None:
+        cutoff = now - self.window_seconds
+        for events in (self._requests, self._retries):
+            while events and events[0] < cutoff:
+                events.popleft()
+
+    def record_request(self) -> None:
+        now = time.monotonic()
+        self._prune(now)
+        self._requests.append(now)
+
+    def try_spend(self) -> bool:
+        now = time.monotonic()
+        self._prune(now)
+        # Retries may add at most `ratio` extra load on top of recent first attempts, plus a small floor.
+        if len(self._retries) >= self.min_retries + self.ratio * len(self._requests):
+            self._denied += 1
+            return False
+        self._retries.append(now)
+        return True
+
+    def stats(self) -> dict:
+        self._prune(time.monotonic())
+        return {
+            "requests_in_window": len(self._requests),
+            "retries_in_window": len(self._retries),
+            "denied": self._denied,
+            "ratio": self.ratio,
+        }
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import importlib.util
+import threading
+
+import httpx
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+from app.config import Settings, get_settings
+
+_LOCK = threading.Lock()
+_sync_http_client: httpx.Client | None = None
+_async_http_client: httpx.AsyncClient | None = None
+_chat_models: dict[tuple[str, str], ChatOpenAI] = {}
+_embeddings: dict[tuple[str, str], OpenAIEmbeddings] = {}
+
+
+def _http2_enabled(settings: Settings) -> bool:
+    # httpx only speaks HTTP/2 when the optional h2 package is installed.
+    return settings.llm_http2 and importlib.util.find_spec("h2") is not None
+
+
+def _limits(settings: Settings) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.llm_max_connections,
+        max_keepalive_connections=settings.llm_max_keepalive_connections,
+        keepalive_expiry=settings.llm_keepalive_expiry_seconds,
+    )
+
+
+def get_sync_http_client() -> httpx.Client:
+    global _sync_http_client
+    with _LOCK:
+        if _sync_http_client is None or _sync_http_client.is_closed:
+            settings = get_settings()
+            _sync_http_client = httpx.Client(limits=_limits(settings), http2=_http2_enabled(settings))
+        return _sync_http_client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    global _async_http_client
+    with _LOCK:
+        if _async_http_client is None or _async_http_client.is_closed:
+            settings = get_settings()
+            _async_http_client = httpx.AsyncClient(limits=_limits(settings), http2=_http2_enabled(settings))
+        return _async_http_client
+
+
+def get_chat_model(model_name: str | None = None) -> ChatOpenAI:
+    settings = get_settings()
+    model = model_name or settings.model_name
+    key = (model, settings.openai_api_key or "")
+    http_client = get_sync_http_client()
+    http_async_client = get_async_http_client()
+    with _LOCK:
+        llm = _chat_models.get(key)
+        if llm is None:
+            llm = ChatOpenAI(
+                model=model,
+                api_key=settings.openai_api_key,
+                base_url=settings.openai_base_url,
+                temperature=0,
+                max_retries=0,
+                http_client=http_client,
+                http_async_client=http_async_client,
+            )
+            _chat_models[key] = llm
+        return llm
+
+
+def get_embeddings_client() -> OpenAIEmbeddings:
+    settings = get_settings()
+    key = (settings.embedding_model, settings.openai_api_key or "")
+    http_client = get_sync_http_client()
+    http_async_client = get_async_http_client()
+    with _LOCK:
+        embeddings = _embeddings.get(key)
+        if embeddings is None:
+            embeddings = OpenAIEmbeddings(
+                model=settings.embedding_model,
+                api_key=settings.openai_api_key,
+                base_url=settings.openai_base_url,
+                http_client=http_client,
+                http_async_client=http_async_client,
+            )
+            _embeddings[key] = embeddings
+        return embeddings
+
+
+async def close_clients() -> None:
+    global _sync_http_client, _async_http_client
+    with _LOCK:
+        sync_client, async_client = _sync_http_client, _async_http_client
+        _sync_http_client = None
+        _async_http_client = None
+        _chat_models.clear()
+        _embeddings.clear()
+    if async_client is not None:
+        await async_client.aclose()
+    if sync_client is not None:
+        sync_client.close()
@@ -1,13 +1,29 @@
+import math
+import warnings
 from functools import lru_cache
 from pathlib import Path
+from typing import Literal
 
-from pydantic import Field
+from pydantic import Field, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from app.tokens import CHARS_PER_TOKEN
+
+# Character budgets from before token-based packing, mapped to the settings that replaced them.
+_DEPRECATED_CHAR_BUDGETS = {
+    "max_chunk_chars": ("MAX_CHUNK_CHARS", "max_chunk_tokens", "MAX_CHUNK_TOKENS"),
+    "max_context_chars": ("MAX_CONTEXT_CHARS", "max_context_tokens", "MAX_CONTEXT_TOKENS"),
+}
+
 
 class Settings(BaseSettings):
     openai_api_key: str | None = Field(default=None, alias="OPENAI_API_KEY")
+    openai_base_url: str | None = Field(default=None, alias="OPENAI_BASE_URL")
     model_name: str = Field(default="gpt-4o-mini", alias="MODEL_NAME")
+    triage_model: str | None = Field(default=None, alias="TRIAGE_MODEL")
+    module_model: str | None = Field(default=None, alias="MODULE_MODEL")
+    module_models: dict[str, str] = Field(default_factory=dict, alias="MODULE_MODELS")
+    repair_model: str | None = Field(default=None, alias="REPAIR_MODEL")
     embedding_model: str = Field(default="text-embedding-3-small", alias="EMBEDDING_MODEL")
 
     app_env: str = Field(default="development", alias="APP_ENV")
@@ -17,15 +33,68 @@ class Settings(BaseSettings):
     uploads_dir: Path = Field(default=Path("data/uploads"), alias="UPLOADS_DIR")
     chroma_dir: Path = Field(default=Path("data/chroma"), alias="CHROMA_DIR")
 
-    max_chunk_chars: int = Field(default=220, alias="MAX_CHUNK_CHARS")
-    max_context_chars: int = Field(default=6000, alias="MAX_CONTEXT_CHARS")
+    max_chunk_tokens: int = Field(default=80, alias="MAX_CHUNK_TOKENS")
+    max_context_tokens: int = Field(default=1500, alias="MAX_CONTEXT_TOKENS")
+    max_chunk_chars: int | None = Field(default=None, alias="MAX_CHUNK_CHARS")
+    max_context_chars: int | None = Field(default=None, alias="MAX_CONTEXT_CHARS")
+    retrieval_overfetch_factor: int = Field(default=3, alias="RETRIEVAL_OVERFETCH_FACTOR")
+    retrieval_dedup_enabled: bool = Field(default=True, alias="RETRIEVAL_DEDUP_ENABLED")
+    retrieval_dedup_threshold: float = Field(default=0.8, alias="RETRIEVAL_DEDUP_THRESHOLD")
+    retrieval_mmr_lambda: float | None = Field(default=None, alias="RETRIEVAL_MMR_LAMBDA")
+    module_retrieval_enabled: bool = Field(default=True, alias="MODULE_RETRIEVAL_ENABLED")
+    module_context_top_k: int = Field(default=4, alias="MODULE_CONTEXT_TOP_K")
+    module_context_tokens: int = Field(default=600, alias="MODULE_CONTEXT_TOKENS")
     default_top_k: int = Field(default=6, alias="DEFAULT_TOP_K")
     default_budget_modules: int = Field(default=3, alias="DEFAULT_BUDGET_MODULES")
+    llm_max_connections: int = Field(default=20, alias="LLM_MAX_CONNECTIONS")
+    llm_max_keepalive_connections: int = Field(default=10, alias="LLM_MAX_KEEPALIVE_CONNECTIONS")
+    llm_keepalive_expiry_seconds: float = Field(default=30.0, alias="LLM_KEEPALIVE_EXPIRY_SECONDS")
+    llm_http2: bool = Field(default=True, alias="LLM_HTTP2")
     llm_timeout_seconds: float = Field(default=30.0, alias="LLM_TIMEOUT_SECONDS")
     llm_max_retries: int = Field(default=2, alias="LLM_MAX_RETRIES")
     llm_retry_base_backoff_seconds: float = Field(default=0.35, alias="LLM_RETRY_BASE_BACKOFF_SECONDS")
     retrieval_timeout_seconds: float = Field(default=15.0, alias="RETRIEVAL_TIMEOUT_SECONDS")
+    embedding_cache_max_entries: int = Field(default=1024, alias="EMBEDDING_CACHE_MAX_ENTRIES")
+    embedding_cache_ttl_seconds: float | None = Field(default=None, alias="EMBEDDING_CACHE_TTL_SECONDS")
+    embedding_cache_path: Path | None = Field(default=None, alias="EMBEDDING_CACHE_PATH")
+    embedding_batch_window_ms: float = Field(default=5.0, alias="EMBEDDING_BATCH_WINDOW_MS")
+    embedding_batch_max_size: int = Field(default=16, alias="EMBEDDING_BATCH_MAX_SIZE")
+    vectorstore_cache_size: int = Field(default=32, alias="VECTORSTORE_CACHE_SIZE")
     retrieval_concurrency: int = Field(default=4, alias="RETRIEVAL_CONCURRENCY")
+    retrieval_executor_workers: int = Field(default=4, alias="RETRIEVAL_EXECUTOR_WORKERS")
+    llm_adaptive_limit_enabled: bool = Field(default=True, alias="LLM_ADAPTIVE_LIMIT_ENABLED")
+    llm_adaptive_limit_initial: int = Field(default=4, alias="LLM_ADAPTIVE_LIMIT_INITIAL")
+    llm_adaptive_limit_min: int = Field(default=1, alias="LLM_ADAPTIVE_LIMIT_MIN")
+    llm_adaptive_limit_max: int = Field(default=32, alias="LLM_ADAPTIVE_LIMIT_MAX")
+    llm_limiter_max_wait_seconds: float = Field(default=30.0, alias="LLM_LIMITER_MAX_WAIT_SECONDS")
+    llm_rate_limits: dict[str, dict[str, int]] = Field(default_factory=dict, alias="LLM_RATE_LIMITS")
+    llm_output_tokens_estimate: int = Field(default=1500, alias="LLM_OUTPUT_TOKENS_ESTIMATE")
+    llm_output_mode: Literal["text", "json_schema"] = Field(default="text", alias="LLM_OUTPUT_MODE")
+    llm_cascade_model: str | None = Field(default=None, alias="LLM_CASCADE_MODEL")
+    llm_cascade_min_evidence_ratio: float = Field(default=0.5, alias="LLM_CASCADE_MIN_EVIDENCE_RATIO")
+    llm_response_cache_max_entries: int = Field(default=512, alias="LLM_RESPONSE_CACHE_MAX_ENTRIES")
+    llm_response_cache_ttl_seconds: float | None = Field(default=None, alias="LLM_RESPONSE_CACHE_TTL_SECONDS")
+    llm_response_cache_path: Path | None = Field(default=None, alias="LLM_RESPONSE_CACHE_PATH")
+    llm_hedging_enabled: bool = Field(default=False, alias="LLM_HEDGING_ENABLED")
+    llm_hedge_percentile: float = Field(default=95.0, alias="LLM_HEDGE_PERCENTILE")
+    llm_hedge_min_samples: int = Field(default=20, alias="LLM_HEDGE_MIN_SAMPLES")
+    llm_hedge_window_size: int = Field(default=200, alias="LLM_HEDGE_WINDOW_SIZE")
+    llm_circuit_failure_threshold: int = Field(default=5, alias="LLM_CIRCUIT_FAILURE_THRESHOLD")
+    llm_circuit_recovery_seconds: float = Field(default=30.0, alias="LLM_CIRCUIT_RECOVERY_SECONDS")
+    llm_retry_budget_ratio: float = Field(default=0.2, alias="LLM_RETRY_BUDGET_RATIO")
+    llm_retry_budget_min_retries: int = Field(default=10, alias="LLM_RETRY_BUDGET_MIN_RETRIES")
+    llm_retry_budget_window_seconds: float = Field(default=10.0, alias="LLM_RETRY_BUDGET_WINDOW_SECONDS")
+    llm_concurrency: int = Field(default=4, alias="LLM_CONCURRENCY")
+    speculative_module_count: int = Field(default=0, alias="SPECULATIVE_MODULE_COUNT")
+    analysis_cache_enabled: bool = Field(default=True, alias="ANALYSIS_CACHE_ENABLED")
+    analysis_cache_max_entries: int = Field(default=256, alias="ANALYSIS_CACHE_MAX_ENTRIES")
+    analysis_cache_ttl_seconds: float = Field(default=900.0, alias="ANALYSIS_CACHE_TTL_SECONDS")
+    analysis_cache_path: Path | None = Field(default=None, alias="ANALYSIS_CACHE_PATH")
+    jobs_db_path: Path = Field(default=Path("data/jobs.sqlite3"), alias="JOBS_DB_PATH")
+    jobs_worker_count: int = Field(default=2, alias="JOBS_WORKER_COUNT")
+    jobs_queue_depth: int = Field(default=100, alias="JOBS_QUEUE_DEPTH")
+    jobs_ttl_seconds: float | None = Field(default=86400.0, alias="JOBS_TTL_SECONDS")
+    jobs_cleanup_interval_seconds: float = Field(default=300.0, alias="JOBS_CLEANUP_INTERVAL_SECONDS")
     files_default_limit: int = Field(default=50, alias="FILES_DEFAULT_LIMIT")
     files_max_limit: int = Field(default=200, alias="FILES_MAX_LIMIT")
     max_upload_bytes: int = Field(default=20 * 1024 * 1024, alias="MAX_UPLOAD_BYTES")
@@ -40,6 +109,21 @@ class Settings(BaseSettings):
         protected_namespaces=("settings_",),
     )
 
+    @model_validator(mode="after")
+    def _convert_char_budgets(self) -> "Settings":
+        for chars_field, (chars_env, tokens_field, tokens_env) in _DEPRECATED_CHAR_BUDGETS.items():
+            chars = getattr(self, chars_field)
+            if chars is None:
+                continue
+            if tokens_field in self.model_fields_set:
+                message = f"{chars_env} is deprecated and ignored because {tokens_env} is set"
+            else:
+                setattr(self, tokens_field, max(math.ceil(chars / CHARS_PER_TOKEN), 1))
+                message = f"{chars_env} is deprecated; using {tokens_env}={getattr(self, tokens_field)}"
+            # FutureWarning rather than DeprecationWarning so operators see it without -W flags.
+            warnings.warn(message, FutureWarning)
+        return self
+
 
 @lru_cache
 def get_settings() -> Settings:
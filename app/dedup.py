@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from langchain_core.documents import Document
+
+from app.lexical import tokenize
+
+SHINGLE_SIZE = 3
+MIN_OVERLAP_CHARS = 40
+
+
+def shingles(text: str) -> frozenset[str]:
+    words = tokenize(text)
+    if len(words) <= SHINGLE_SIZE:
+        return frozenset({" ".join(words)})
+    return frozenset(" ".join(words[i : i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1))
+
+
+def jaccard_similarity(left: frozenset[str], right: frozenset[str]) -> float:
+    shared = len(left & right)
+    return shared / (len(left) + len(right) - shared)
+
+
+def _overlap_length(left: str, right: str) -> int:
+    # Longest suffix of `left` that starts `right`, as produced by the splitter's chunk_overlap.
+    limit = min(len(left), len(right))
+    for size in range(limit, MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _page_key(doc: Document) -> tuple:
+    return doc.metadata.get("source_file"), doc.metadata.get("page")
+
+
+def _merge_adjacent(kept: list[Document], doc: Document, removed: list[str]) -> bool:
+    for index, existing in enumerate(kept):
+        if _page_key(existing) != _page_key(doc):
+            continue
+        for first, second in ((existing, doc), (doc, existing)):
+            overlap = _overlap_length(first.page_content, second.page_content)
+            if overlap:
+                merged = first.page_content + second.page_content[overlap:]
+                kept[index] = Document(id=existing.id, page_content=merged, metadata=existing.metadata)
+                removed.append(second.page_content[:overlap])
+                return True
+    return False
+
+
+def suppress_duplicates(docs: list[Document], threshold: float) -> tuple[list[Document], list[str]]:
+    kept: list[Document] = []
+    removed: list[str] = []
+    kept_shingles: list[frozenset[str]] = []
+    for doc in docs:
+        if _merge_adjacent(kept, doc, removed):
+            continue
+        # Exact Jaccard over shingle sets is cheaper than building MinHash signatures for a few dozen candidates.
+        doc_shingles = shingles(doc.page_content)
+        if any(jaccard_similarity(doc_shingles, existing) >= threshold for existing in kept_shingles):
+            removed.append(doc.page_content)
+            continue
+        kept.append(doc)
+        kept_shingles.append(doc_shingles)
+    return kept, removed
+
+
+def mmr_order(docs: list[Document], lambda_mult: float) -> list[Document]:
+    # Relevance comes from the retrieval rank; redundancy from shingle similarity to chunks already chosen.
+    doc_shingles = [shingles(doc.page_content) for doc in docs]
+    redundancy = [0.0] * len(docs)
+    remaining = list(range(len(docs)))
+    selected: list[int] = []
+    while remaining:
+        best = max(
+            remaining,
+            key=lambda index: lambda_mult * (1 - index / len(docs)) - (1 - lambda_mult) * redundancy[index],
+        )
+        selected.append(best)
+        remaining.remove(best)
+        # Only the newly chosen chunk can raise a candidate's similarity to the selection.
+        for index in remaining:
+            redundancy[index] = max(redundancy[index], jaccard_similarity(doc_shingles[index], doc_shingles[best]))
+    return [docs[index] for index in selected]
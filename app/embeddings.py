@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections.abc import Awaitable, Callable
+
+from app.cache import TieredCache, build_tiered_cache, make_cache_key
+from app.config import get_settings
+from app.store import get_embeddings
+
+_CACHE_LOCK = threading.Lock()
+_EMBEDDING_CACHE: TieredCache | None = None
+_EMBED_STATS = {"upstream_calls": 0, "upstream_ms_total": 0.0}
+_BATCHER: EmbeddingBatcher | None = None
+
+
+class EmbeddingBatcher:
+    def __init__(
+        self,
+        embed_many: Callable[[list[str]], Awaitable[list[list[float]]]],
+        *,
+        window_seconds: float,
+        max_batch_size: int,
+    ):
+        self._embed_many = embed_many
+        self._window_seconds = window_seconds
+        self._max_batch_size = max(1, max_batch_size)
+        self._pending: dict[str, list[asyncio.Future[list[float]]]] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self._sends: set[asyncio.Task[None]] = set()
+        self.loop = asyncio.get_running_loop()
+        self.requests = 0
+        self.batches = 0
+        self.texts_sent = 0
+        self.max_batch_seen = 0
+
+    async def embed(self, text: str) -> list[float]:
+        future: asyncio.Future[list[float]] = self.loop.create_future()
+        self._pending.setdefault(text, []).append(future)
+        self.requests += 1
+        if len(self._pending) >= self._max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = self.loop.call_later(self._window_seconds, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        task = self.loop.create_task(self._send(batch))
+        self._sends.add(task)
+        task.add_done_callback(self._sends.discard)
+
+    async def _send(self, batch: dict[str, list[asyncio.Future[list[float]]]]) -> None:
+        texts = list(batch)
+        self.batches += 1
+        self.texts_sent += len(texts)
+        self.max_batch_seen = max(self.max_batch_seen, len(texts))
+        try:
+            vectors = await self._embed_many(texts)
+        except BaseException as exc:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(exc)
+            if isinstance(exc, asyncio.CancelledError):
+                raise
+            return
+        for text, vector in zip(texts, vectors):
+            for future in batch[text]:
+                # Callers that timed out or were cancelled no longer want their vector.
+                if not future.done():
+                    future.set_result(vector)
+
+    async def aclose(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, {}
+        for futures in pending.values():
+            for future in futures:
+                future.cancel()
+        sends = list(self._sends)
+        for task in sends:
+            task.cancel()
+        await asyncio.gather(*sends, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "texts_sent": self.texts_sent,
+            "max_batch_size": self.max_batch_seen,
+            "avg_batch_size": round(self.texts_sent / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(text.split())
+
+
+def _embedding_cache() -> TieredCache:
+    global _EMBEDDING_CACHE
+    with _CACHE_LOCK:
+        if _EMBEDDING_CACHE is None:
+            settings = get_settings()
+            _EMBEDDING_CACHE = build_tiered_cache(
+                max_entries=settings.embedding_cache_max_entries,
+                ttl_seconds=settings.embedding_cache_ttl_seconds,
+                disk_path=settings.embedding_cache_path,
+            )
+        return _EMBEDDING_CACHE
+
+
+def _embedding_key(text: str) -> str:
+    return make_cache_key("embedding", get_settings().embedding_model, normalize_query(text))
+
+
+def _record_upstream(start: float) -> None:
+    with _CACHE_LOCK:
+        _EMBED_STATS["upstream_calls"] += 1
+        _EMBED_STATS["upstream_ms_total"] += (time.perf_counter() - start) * 1000
+
+
+async def _aembed_many(texts: list[str]) -> list[list[float]]:
+    start = time.perf_counter()
+    vectors = await get_embeddings().aembed_documents(texts)
+    _record_upstream(start)
+    return vectors
+
+
+def _batcher() -> EmbeddingBatcher:
+    # Batches are tied to the running event loop, so a new loop gets a fresh batcher.
+    global _BATCHER
+    loop = asyncio.get_running_loop()
+    if _BATCHER is None or _BATCHER.loop is not loop:
+        settings = get_settings()
+        _BATCHER = EmbeddingBatcher(
+            _aembed_many,
+            window_seconds=settings.embedding_batch_window_ms / 1000,
+            max_batch_size=settings.embedding_batch_max_size,
+        )
+    return _BATCHER
+
+
+async def close_embedding_batcher() -> None:
+    global _BATCHER
+    batcher, _BATCHER = _BATCHER, None
+    # A batcher from another (already closed) loop has nothing left that this loop can await.
+    if batcher is not None and batcher.loop is asyncio.get_running_loop():
+        await batcher.aclose()
+
+
+# The cache's disk tier is SQLite, so each request's lookups and stores run in one worker thread hop.
+def _cached_vectors(keys: list[str]) -> list[list[float] | None]:
+    cache = _embedding_cache()
+    return [cache.get(key) for key in keys]
+
+
+def _store_vectors(entries: list[tuple[str, list[float]]]) -> None:
+    cache = _embedding_cache()
+    for key, vector in entries:
+        cache.set(key, vector)
+
+
+async def aembed_query_cached(text: str) -> list[float]:
+    key = _embedding_key(text)
+    (vector,) = await asyncio.to_thread(_cached_vectors, [key])
+    if vector is not None:
+        return vector
+
+    if get_settings().embedding_batch_window_ms > 0:
+        vector = await _batcher().embed(normalize_query(text))
+    else:
+        start = time.perf_counter()
+        vector = await get_embeddings().aembed_query(normalize_query(text))
+        _record_upstream(start)
+    await asyncio.to_thread(_store_vectors, [(key, vector)])
+    return vector
+
+
+async def aembed_queries_cached(texts: list[str]) -> list[list[float]]:
+    keys = [_embedding_key(text) for text in texts]
+    vectors = await asyncio.to_thread(_cached_vectors, keys)
+    misses = list(dict.fromkeys(normalize_query(text) for text, vector in zip(texts, vectors) if vector is None))
+    if misses:
+        # All uncached texts go upstream together as one embeddings request.
+        fetched = dict(zip(misses, await _aembed_many(misses)))
+        stored = []
+        for index, text in enumerate(texts):
+            if vectors[index] is None:
+                vectors[index] = fetched[normalize_query(text)]
+                stored.append((keys[index], vectors[index]))
+        await asyncio.to_thread(_store_vectors, stored)
+    return vectors
+
+
+def embedding_cache_stats() -> dict:
+    stats = _embedding_cache().stats()
+    with _CACHE_LOCK:
+        upstream_calls = _EMBED_STATS["upstream_calls"]
+        upstream_ms_total = _EMBED_STATS["upstream_ms_total"]
+    avg_embed_ms = upstream_ms_total / upstream_calls if upstream_calls else 0.0
+    stats["upstream_calls"] = upstream_calls
+    stats["avg_embed_ms"] = round(avg_embed_ms, 2)
+    # Each cache hit skipped one embeddings round trip of roughly the observed average cost.
+    stats["embed_ms_saved"] = round((stats["memory_hits"] + stats["disk_hits"]) * avg_embed_ms, 2)
+    stats["batching"] = _BATCHER.stats() if _BATCHER is not None else None
+    return stats
@@ -40,6 +40,12 @@ class UpstreamModelError(DomainError):
     retryable = True
 
 
+class UpstreamOverloadedError(DomainError):
+    code = "UPSTREAM_OVERLOADED"
+    http_status = 503
+    retryable = True
+
+
 class CollectionEmptyError(DomainError):
     code = "COLLECTION_EMPTY"
     http_status = 404
@@ -74,3 +80,21 @@ class UploadTooLargeError(DomainError):
     code = "UPLOAD_TOO_LARGE"
     http_status = 413
     retryable = False
+
+
+class JobQueueFullError(DomainError):
+    code = "JOB_QUEUE_FULL"
+    http_status = 503
+    retryable = True
+
+
+class JobNotFoundError(DomainError):
+    code = "JOB_NOT_FOUND"
+    http_status = 404
+    retryable = False
+
+
+class JobInterruptedError(DomainError):
+    code = "JOB_INTERRUPTED"
+    http_status = 503
+    retryable = True
@@ -12,7 +12,8 @@ from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 from app.config import get_settings
 from app.errors import InvalidPDFError, PayloadValidationError, UploadTooLargeError
-from app.store import get_vectorstore
+from app.lexical import add_to_lexical_index
+from app.store import bump_collection_version, get_vectorstore, stored_chunks
 
 CHUNK_SIZE_BYTES = 1024 * 1024
 PDF_MAGIC = b"%PDF-"
@@ -135,6 +136,8 @@ def ingest_pdf(upload_file: UploadFile, collection: str) -> dict:
 
     vectorstore = get_vectorstore(collection, require_embeddings=True)
     vectorstore.add_documents(split_docs, ids=ids)
+    add_to_lexical_index(collection, split_docs, ids, load_chunks=lambda: stored_chunks(vectorstore))
+    bump_collection_version(collection)
 
     chunk_count_by_file = Counter(doc.metadata.get("source_file", "unknown") for doc in split_docs)
 
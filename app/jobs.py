@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+from app.errors import DomainError, JobInterruptedError, JobNotFoundError, JobQueueFullError
+from app.models import AnalyzeRequest, AnalyzeResponse
+
+logger = logging.getLogger("app.jobs")
+
+JobEventHandler = Callable[[str, dict], Awaitable[None]]
+JobRunner = Callable[[AnalyzeRequest, str, JobEventHandler], Awaitable[AnalyzeResponse]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    request TEXT NOT NULL,
+    progress TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+_INDEX = "CREATE INDEX IF NOT EXISTS jobs_status_updated_at ON jobs (status, updated_at)"
+
+
+class JobStore:
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute(_SCHEMA)
+            self._conn.execute(_INDEX)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def create(self, job_id: str, request: dict, progress: dict) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, status, request, progress, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, "queued", json.dumps(request), json.dumps(progress), now, now),
+            )
+
+    def update(
+        self,
+        job_id: str,
+        *,
+        status: str | None = None,
+        progress: dict | None = None,
+        result: dict | None = None,
+        error: dict | None = None,
+    ) -> None:
+        fields: dict[str, str] = {}
+        if status is not None:
+            fields["status"] = status
+        if progress is not None:
+            fields["progress"] = json.dumps(progress)
+        if result is not None:
+            fields["result"] = json.dumps(result)
+        if error is not None:
+            fields["error"] = json.dumps(error)
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE jobs SET {assignments}, updated_at = ? WHERE job_id = ?",
+                (*fields.values(), time.time(), job_id),
+            )
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row["job_id"],
+            "status": row["status"],
+            "request": json.loads(row["request"]),
+            "progress": json.loads(row["progress"]),
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": json.loads(row["error"]) if row["error"] else None,
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    def delete(self, job_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+    def delete_finished_before(self, cutoff: float) -> int:
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND updated_at < ?", (cutoff,)
+            )
+        return cursor.rowcount
+
+    def fail_unfinished(self, error: dict) -> int:
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE status IN ('queued', 'running')",
+                (json.dumps(error), time.time()),
+            )
+        return cursor.rowcount
+
+
+class JobManager:
+    def __init__(
+        self,
+        *,
+        db_path: Path,
+        worker_count: int,
+        queue_depth: int,
+        runner: JobRunner,
+        ttl_seconds: float | None = None,
+        cleanup_interval_seconds: float = 300.0,
+    ):
+        self.db_path = db_path
+        self.worker_count = worker_count
+        self.queue_depth = queue_depth
+        self.runner = runner
+        self.ttl_seconds = ttl_seconds
+        self.cleanup_interval_seconds = cleanup_interval_seconds
+        self._store: JobStore | None = None
+        self._queue: asyncio.Queue[tuple[str, AnalyzeRequest]] | None = None
+        self._workers: list[asyncio.Task] = []
+        self._sweeper: asyncio.Task | None = None
+
+    @property
+    def started(self) -> bool:
+        return self._store is not None
+
+    async def start(self) -> None:
+        if self.started:
+            return
+        # SQLite calls block, so they run in worker threads and never stall the event loop.
+        store = await asyncio.to_thread(JobStore, self.db_path)
+        if self.started:
+            await asyncio.to_thread(store.close)
+            return
+        self._store = store
+        # Anything still queued/running belonged to a previous process and will never finish.
+        interrupted = await asyncio.to_thread(
+            store.fail_unfinished,
+            JobInterruptedError("Job was interrupted by a server restart").to_error_payload(request_id="")["error"],
+        )
+        if interrupted:
+            logger.warning("jobs_interrupted", extra={"job_count": interrupted})
+        self._queue = asyncio.Queue(maxsize=self.queue_depth)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+        if self.ttl_seconds is not None:
+            self._sweeper = asyncio.create_task(self._sweep_expired(self.ttl_seconds))
+
+    async def stop(self) -> None:
+        tasks = [*self._workers, *([self._sweeper] if self._sweeper is not None else [])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._sweeper = None
+        self._queue = None
+        if self._store is not None:
+            store, self._store = self._store, None
+            await asyncio.to_thread(store.close)
+
+    async def submit(self, payload: AnalyzeRequest) -> dict:
+        await self.start()
+        assert self._store is not None and self._queue is not None
+        if self._queue.full():
+            raise JobQueueFullError(f"Analysis job queue is full ({self.queue_depth} jobs waiting)")
+        store, queue = self._store, self._queue
+        job_id = str(uuid.uuid4())
+        await asyncio.to_thread(store.create, job_id, payload.model_dump(), {"stage": "queued", "modules": {}})
+        try:
+            queue.put_nowait((job_id, payload))
+        except asyncio.QueueFull:
+            # Another submission filled the last slot while this job's row was being written.
+            await asyncio.to_thread(store.delete, job_id)
+            raise JobQueueFullError(f"Analysis job queue is full ({self.queue_depth} jobs waiting)") from None
+        return await self.get(job_id)
+
+    async def get(self, job_id: str) -> dict:
+        job = await asyncio.to_thread(self._store.get, job_id) if self._store is not None else None
+        if job is None:
+            raise JobNotFoundError(f"Analysis job not found: {job_id}")
+        return job
+
+    def queue_size(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _worker(self) -> None:
+        assert self._queue is not None
+        queue = self._queue
+        while True:
+            job_id, payload = await queue.get()
+            try:
+                await self._run_job(job_id, payload)
+            finally:
+                queue.task_done()
+
+    async def _sweep_expired(self, ttl_seconds: float) -> None:
+        assert self._store is not None
+        store = self._store
+        while True:
+            removed = await asyncio.to_thread(store.delete_finished_before, time.time() - ttl_seconds)
+            if removed:
+                logger.info("jobs_expired", extra={"job_count": removed})
+            await asyncio.sleep(self.cleanup_interval_seconds)
+
+    async def _run_job(self, job_id: str, payload: AnalyzeRequest) -> None:
+        store = self._store
+        assert store is not None
+        progress: dict = {"stage": "retrieval", "modules": {}}
+        await asyncio.to_thread(store.update, job_id, status="running", progress=progress)
+        start = time.perf_counter()
+
+        async def _on_event(event: str, data: dict) -> None:
+            if event == "triage":
+                progress["stage"] = "modules"
+                for module in data["selected_modules"]:
+                    progress["modules"].setdefault(module, "running")
+            elif event == "module":
+                progress["modules"][data["module"]] = "completed"
+            elif event == "retrieval":
+                progress["stage"] = "triage"
+            else:
+                return
+            # The write runs in a thread while later events keep changing progress, so it gets a snapshot.
+            snapshot = {**progress, "modules": dict(progress["modules"])}
+            await asyncio.to_thread(store.update, job_id, progress=snapshot)
+
+        try:
+            response = await self.runner(payload, job_id, _on_event)
+        except asyncio.CancelledError:
+            raise
+        except DomainError as exc:
+            await asyncio.to_thread(
+                store.update, job_id, status="failed", error=exc.to_error_payload(request_id=job_id)["error"]
+            )
+            logger.warning(
+                "job_failed",
+                extra={
+                    "request_id": job_id,
+                    "job_id": job_id,
+                    "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+                    "error_code": exc.code,
+                    "error_class": exc.__class__.__name__,
+                    "retryable": exc.retryable,
+                    "error_message": exc.message,
+                },
+            )
+            return
+        except Exception as exc:
+            await asyncio.to_thread(
+                store.update,
+                job_id,
+                status="failed",
+                error={"code": "INTERNAL_ERROR", "message": "Internal server error", "retryable": False},
+            )
+            logger.exception(
+                "job_failed",
+                extra={
+                    "request_id": job_id,
+                    "job_id": job_id,
+                    "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+                    "error_code": "INTERNAL_ERROR",
+                    "error_class": exc.__class__.__name__,
+                },
+            )
+            return
+
+        progress["stage"] = "completed"
+        await asyncio.to_thread(
+            store.update, job_id, status="succeeded", progress=progress, result=response.model_dump()
+        )
+        logger.info(
+            "job_complete",
+            extra={
+                "request_id": job_id,
+                "job_id": job_id,
+                "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+            },
+        )
@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import json
+import re
+from collections.abc import Iterator
+from typing import Any, Literal, TypeVar, get_args, get_origin
+
+from pydantic import BaseModel, ValidationError
+
+SchemaModel = TypeVar("SchemaModel", bound=BaseModel)
+
+MAX_CUT_BACKS = 8
+
+_FENCE_RE = re.compile(r"^```[A-Za-z]*\s*|\s*```\s*$")
+_NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?")
+_PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_LITERAL_SYNONYMS = {
+    "critical": "high",
+    "severe": "high",
+    "blocker": "high",
+    "major": "high",
+    "moderate": "medium",
+    "med": "medium",
+    "minor": "low",
+    "trivial": "low",
+    "info": "low",
+    "informational": "low",
+}
+
+
+class _CoercionError(ValueError):
+    pass
+
+
+def _strip_wrapping(text: str) -> str:
+    cleaned = _FENCE_RE.sub("", text.strip())
+    if cleaned.lower().startswith("json"):
+        cleaned = cleaned[4:]
+    starts = [index for index in (cleaned.find("{"), cleaned.find("[")) if index != -1]
+    return cleaned[min(starts) :] if starts else cleaned
+
+
+def _drop_trailing_comma(out: list[str]) -> None:
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def _scan(text: str) -> tuple[list[str], list[str], str | None, list[tuple[int, list[str]]]]:
+    # One pass over the text that normalizes quoting and escapes, drops trailing commas, quotes bare keys,
+    # and remembers where the last complete member ended so a truncated reply can be cut back to it.
+    out: list[str] = []
+    stack: list[str] = []
+    quote: str | None = None
+    cut_points: list[tuple[int, list[str]]] = []
+    index = 0
+    while index < len(text):
+        char = text[index]
+        if quote is not None:
+            if char == "\\":
+                if index + 1 < len(text):
+                    # JSON has no \' escape; inside a single-quoted string it is just an apostrophe.
+                    out.append("'" if text[index + 1] == "'" else text[index : index + 2])
+                index += 2
+                continue
+            if char == quote:
+                out.append('"')
+                quote = None
+            elif char == '"':
+                out.append('\\"')
+            elif char in "\n\r\t":
+                out.append({"\n": "\\n", "\r": "\\r", "\t": "\\t"}[char])
+            else:
+                out.append(char)
+            index += 1
+            continue
+
+        if char in "\"'":
+            quote = char
+            out.append('"')
+        elif char in "{[":
+            if stack and stack[-1] == "]":
+                # An array element that never finished can be dropped while keeping its siblings.
+                cut_points.append((len(out), list(stack)))
+            stack.append("}" if char == "{" else "]")
+            out.append(char)
+        elif char in "}]":
+            if char in stack:
+                _drop_trailing_comma(out)
+                while stack:
+                    closer = stack.pop()
+                    out.append(closer)
+                    if closer == char:
+                        break
+                cut_points.append((len(out), list(stack)))
+        elif char == ",":
+            cut_points.append((len(out), list(stack)))
+            out.append(char)
+        elif char.isalpha() or char == "_":
+            end = index
+            while end < len(text) and (text[end].isalnum() or text[end] == "_"):
+                end += 1
+            word = text[index:end]
+            rest = text[end:].lstrip()
+            if word in _PYTHON_LITERALS:
+                out.append(_PYTHON_LITERALS[word])
+            elif word not in {"true", "false", "null"} and rest.startswith(":"):
+                out.append(f'"{word}"')
+            else:
+                out.append(word)
+            index = end
+            continue
+        else:
+            out.append(char)
+        index += 1
+    return out, stack, quote, cut_points
+
+
+def _close(out: list[str], stack: list[str]) -> str:
+    closed = list(out)
+    _drop_trailing_comma(closed)
+    while closed and closed[-1] == ":":
+        closed.pop()
+    return "".join(closed) + "".join(reversed(stack))
+
+
+def _parsed_candidates(text: str) -> Iterator[Any]:
+    cleaned = _strip_wrapping(text)
+    try:
+        yield json.loads(cleaned)
+        return
+    except json.JSONDecodeError:
+        pass
+    out, stack, quote, cut_points = _scan(cleaned)
+    if quote is not None:
+        out.append('"')
+    candidates = [_close(out, stack)]
+    # A reply cut off mid-member is closed at the most recent points where a member or element was complete.
+    candidates.extend(_close(out[:length], cut_stack) for length, cut_stack in reversed(cut_points[-MAX_CUT_BACKS:]))
+    for candidate in candidates:
+        try:
+            yield json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+
+
+def repair_json_text(text: str) -> Any | None:
+    return next(_parsed_candidates(text), None)
+
+
+def _coerce_literal(value: Any, allowed: tuple) -> Any:
+    if value in allowed:
+        return value
+    if isinstance(value, str):
+        key = value.strip().lower()
+        if key in allowed:
+            return key
+        if _LITERAL_SYNONYMS.get(key) in allowed:
+            return _LITERAL_SYNONYMS[key]
+    raise _CoercionError(f"{value!r} is not one of {allowed}")
+
+
+def _coerce_number(value: Any, number_type: type) -> Any:
+    if isinstance(value, bool):
+        raise _CoercionError("booleans are not numbers")
+    if isinstance(value, (int, float)):
+        return number_type(value)
+    if isinstance(value, str):
+        match = _NUMBER_RE.search(value)
+        if match:
+            return number_type(float(match.group()))
+    raise _CoercionError(f"{value!r} is not a number")
+
+
+def _coerce_text(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    if isinstance(value, dict) and len(value) == 1:
+        return _coerce_text(next(iter(value.values())))
+    raise _CoercionError(f"{value!r} is not text")
+
+
+def _field_key(name: str) -> str:
+    return re.sub(r"[\s-]+", "_", name.strip().lower())
+
+
+def _coerce_model(value: Any, model: type[BaseModel]) -> dict:
+    if not isinstance(value, dict):
+        raise _CoercionError(f"expected an object for {model.__name__}")
+    by_key = {_field_key(str(key)): item for key, item in value.items()}
+    coerced = {}
+    for name, field in model.model_fields.items():
+        if name in by_key:
+            coerced[name] = _coerce(by_key[name], field.annotation)
+    return coerced
+
+
+def _coerce(value: Any, annotation: Any) -> Any:
+    origin = get_origin(annotation)
+    if origin is Literal:
+        return _coerce_literal(value, get_args(annotation))
+    if origin is list:
+        if value is None:
+            return []
+        items = value if isinstance(value, list) else [value]
+        return [_coerce(item, get_args(annotation)[0]) for item in items]
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return _coerce_model(value, annotation)
+    if annotation in (int, float):
+        return _coerce_number(value, annotation)
+    if annotation is str:
+        return _coerce_text(value)
+    return value
+
+
+def coerce_to_schema(data: Any, schema: type[SchemaModel]) -> dict | None:
+    try:
+        return schema.model_validate(_coerce_model(data, schema)).model_dump()
+    except (_CoercionError, ValidationError):
+        return None
+
+
+def repair_structured_output(text: str, schema: type[SchemaModel]) -> dict | None:
+    for parsed in _parsed_candidates(text):
+        coerced = coerce_to_schema(parsed, schema)
+        if coerced is not None:
+            return coerced
+    return None
@@ -0,0 +1,346 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import math
+import re
+import shutil
+import sys
+import threading
+import uuid
+from bisect import bisect_left
+from collections import Counter
+from collections.abc import Callable
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.cache import LRUCache
+from app.config import get_settings
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+MANIFEST_NAME = "manifest.json"
+MERGED_POSTINGS_CACHE_TERMS = 1024
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_WRITE_LOCKS_GUARD = threading.Lock()
+_WRITE_LOCKS: dict[Path, threading.Lock] = {}
+_INDEXES: dict[Path, tuple[int, LexicalIndex]] = {}
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class LexicalSegment:
+    # Postings keep raw term frequencies, so a segment stays valid as collection-wide statistics change.
+    # They are stored flat: term i's postings are doc_ids[starts[i]:starts[i + 1]] and the same slice of tfs.
+    def __init__(
+        self,
+        name: str,
+        chunks: list[dict],
+        lengths: np.ndarray,
+        terms: list[str],
+        starts: np.ndarray,
+        doc_ids: np.ndarray,
+        tfs: np.ndarray,
+    ):
+        self.name = name
+        self.chunks = chunks
+        self.lengths = lengths
+        # Every segment repeats common terms, so interning keeps one copy of each string per process.
+        self.terms = [sys.intern(term) for term in terms]
+        self.starts = starts
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.source_file = chunks[0]["source_file"] if chunks else "unknown"
+        self.total_length = int(lengths.sum())
+
+    @classmethod
+    def from_chunks(cls, name: str, chunks: list[dict]) -> LexicalSegment:
+        lengths = []
+        raw: dict[str, list[tuple[int, int]]] = {}
+        for doc_index, chunk in enumerate(chunks):
+            counts = Counter(tokenize(chunk["text"]))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                raw.setdefault(term, []).append((doc_index, tf))
+
+        terms = sorted(raw)
+        postings = [entry for term in terms for entry in raw[term]]
+        return cls(
+            name,
+            chunks,
+            np.array(lengths, dtype=np.uint32),
+            terms,
+            np.cumsum([0] + [len(raw[term]) for term in terms], dtype=np.uint32),
+            np.array([doc_index for doc_index, _ in postings], dtype=np.uint32),
+            np.array([tf for _, tf in postings], dtype=np.uint32),
+        )
+
+    def postings(self, term: str) -> tuple[np.ndarray, np.ndarray] | None:
+        position = bisect_left(self.terms, term)
+        if position == len(self.terms) or self.terms[position] != term:
+            return None
+        start, end = self.starts[position], self.starts[position + 1]
+        return self.doc_ids[start:end], self.tfs[start:end]
+
+    def to_payload(self) -> dict:
+        return {
+            "chunks": self.chunks,
+            "lengths": _encode_array(self.lengths),
+            "terms": self.terms,
+            "starts": _encode_array(self.starts),
+            "doc_ids": _encode_array(self.doc_ids),
+            "tfs": _encode_array(self.tfs),
+        }
+
+    @classmethod
+    def from_payload(cls, name: str, payload: dict) -> LexicalSegment:
+        return cls(
+            name,
+            payload["chunks"],
+            _decode_array(payload["lengths"]),
+            payload["terms"],
+            _decode_array(payload["starts"]),
+            _decode_array(payload["doc_ids"]),
+            _decode_array(payload["tfs"]),
+        )
+
+    def document(self, doc_index: int) -> Document:
+        chunk = self.chunks[doc_index]
+        return Document(
+            id=chunk["id"],
+            page_content=chunk["text"],
+            metadata={"source_file": chunk["source_file"], "page": chunk["page"]},
+        )
+
+
+class LexicalIndex:
+    def __init__(self, segments: list[LexicalSegment]):
+        # One segment per source file, so a file filter only ever reads that file's postings.
+        self.segments = {segment.source_file: segment for segment in segments}
+        self._ordered = list(self.segments.values())
+        self._offsets = np.cumsum([0] + [len(segment.chunks) for segment in self._ordered])
+        self.doc_count = int(self._offsets[-1])
+        total_length = sum(segment.total_length for segment in self._ordered)
+        self.avg_length = total_length / self.doc_count if self.doc_count else 0.0
+        self._lengths = (
+            np.concatenate([segment.lengths for segment in self._ordered]) if self._ordered else np.zeros(0, np.uint32)
+        )
+        self._idf: dict[str, float] = {}
+        self._merged = LRUCache(MERGED_POSTINGS_CACHE_TERMS)
+
+    @classmethod
+    def from_chunks(cls, chunks: list[dict]) -> LexicalIndex:
+        by_file: dict[str, list[dict]] = {}
+        for chunk in chunks:
+            by_file.setdefault(chunk["source_file"], []).append(chunk)
+        return cls([LexicalSegment.from_chunks(name, file_chunks) for name, file_chunks in by_file.items()])
+
+    def idf(self, term: str) -> float:
+        idf = self._idf.get(term)
+        if idf is None:
+            df = sum(len(posting[0]) for segment in self._ordered if (posting := segment.postings(term)) is not None)
+            idf = math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5)) if df else 0.0
+            self._idf[term] = idf
+        return idf
+
+    def search(self, query: str, top_k: int, file_filter: str | None = None) -> list[tuple[Document, float]]:
+        if file_filter is None:
+            size, weighted, document = self.doc_count, self._merged_postings, self._document
+        elif file_filter in self.segments:
+            segment = self.segments[file_filter]
+            size, document = len(segment.chunks), segment.document
+
+            def weighted(term: str) -> tuple[np.ndarray, np.ndarray] | None:
+                posting = segment.postings(term)
+                return self._weigh(*posting, segment.lengths) if posting is not None else None
+
+        else:
+            return []
+        parts = [(posting, self.idf(term)) for term in set(tokenize(query)) if (posting := weighted(term)) is not None]
+        if top_k <= 0 or not parts:
+            return []
+
+        # Every posting of every query term is scored against the live collection statistics; a term lists each
+        # chunk once, so summing the weighted postings per chunk gives its exact BM25 score.
+        scores = np.bincount(
+            np.concatenate([doc_ids for (doc_ids, _), _ in parts]),
+            weights=np.concatenate([weights * idf for (_, weights), idf in parts]),
+            minlength=size,
+        )
+        matched = np.flatnonzero(scores)
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        ranked = matched[np.lexsort((matched, -scores[matched]))]
+        return [(document(int(doc_index)), float(scores[doc_index])) for doc_index in ranked]
+
+    def _weigh(self, doc_ids: np.ndarray, tfs: np.ndarray, lengths: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        tfs = tfs.astype(np.float64)
+        if self.avg_length:
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[doc_ids] / self.avg_length)
+        else:
+            norm = BM25_K1
+        return doc_ids.astype(np.intp), tfs * (BM25_K1 + 1) / (tfs + norm)
+
+    def _merged_postings(self, term: str) -> tuple[np.ndarray, np.ndarray] | None:
+        merged = self._merged.get(term)
+        if merged is None:
+            parts = [
+                (posting, offset)
+                for segment, offset in zip(self._ordered, self._offsets)
+                if (posting := segment.postings(term)) is not None
+            ]
+            if not parts:
+                return None
+            doc_ids, weights = self._weigh(
+                np.concatenate([doc_ids.astype(np.intp) + offset for (doc_ids, _), offset in parts]),
+                np.concatenate([tfs for (_, tfs), _ in parts]),
+                self._lengths,
+            )
+            # Common terms span most chunks, so cached merges are kept compact.
+            merged = (doc_ids.astype(np.uint32), weights.astype(np.float32))
+            self._merged.set(term, merged)
+        return merged
+
+    def _document(self, doc_index: int) -> Document:
+        position = int(np.searchsorted(self._offsets, doc_index, side="right")) - 1
+        return self._ordered[position].document(doc_index - int(self._offsets[position]))
+
+
+def _encode_array(values: np.ndarray) -> str:
+    return base64.b64encode(values.astype(np.uint32).tobytes()).decode("ascii")
+
+
+def _decode_array(encoded: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(encoded), dtype=np.uint32)
+
+
+def _index_path(collection: str) -> Path:
+    safe_name = re.sub(r"[^A-Za-z0-9._-]+", "_", collection)
+    # Sanitizing can map different names (a/b and a_b) to one directory, so the exact name's hash is appended.
+    digest = hashlib.sha256(collection.encode("utf-8")).hexdigest()[:12]
+    return get_settings().chroma_dir / "lexical" / f"{safe_name}-{digest}"
+
+
+def _write_lock(path: Path) -> threading.Lock:
+    with _WRITE_LOCKS_GUARD:
+        return _WRITE_LOCKS.setdefault(path, threading.Lock())
+
+
+def _read_index(path: Path, previous: LexicalIndex | None) -> LexicalIndex:
+    manifest = json.loads((path / MANIFEST_NAME).read_text(encoding="utf-8"))
+    # Segment files are never rewritten in place, so ones already loaded are reused by name.
+    loaded = {segment.name: segment for segment in previous.segments.values()} if previous is not None else {}
+    segments = []
+    for name in manifest["segments"].values():
+        segment = loaded.get(name)
+        if segment is None:
+            payload = json.loads((path / f"{name}.json").read_text(encoding="utf-8"))
+            segment = LexicalSegment.from_payload(name, payload)
+        segments.append(segment)
+    return LexicalIndex(segments)
+
+
+def _write_index(path: Path, existing: LexicalIndex | None, docs: list[Document], ids: list[str]) -> None:
+    by_file: dict[str, dict[str, dict]] = {}
+    for doc, chunk_id in zip(docs, ids):
+        source_file = doc.metadata.get("source_file", "unknown")
+        by_file.setdefault(source_file, {})[chunk_id] = {
+            "id": chunk_id,
+            "source_file": source_file,
+            "page": int(doc.metadata.get("page", 0)),
+            "text": doc.page_content,
+        }
+    segments = dict(existing.segments) if existing is not None else {}
+    superseded = []
+    path.mkdir(parents=True, exist_ok=True)
+    # Only the segments of files in this batch are written; BM25 statistics are combined at query time.
+    for source_file, chunks in by_file.items():
+        previous = segments.get(source_file)
+        if previous is not None:
+            chunks = {**{chunk["id"]: chunk for chunk in previous.chunks}, **chunks}
+            superseded.append(previous.name)
+        segment = LexicalSegment.from_chunks(uuid.uuid4().hex, list(chunks.values()))
+        (path / f"{segment.name}.json").write_text(json.dumps(segment.to_payload()), encoding="utf-8")
+        segments[source_file] = segment
+
+    manifest = {"segments": {source_file: segment.name for source_file, segment in segments.items()}}
+    tmp_path = path / f"{MANIFEST_NAME}.tmp"
+    tmp_path.write_text(json.dumps(manifest), encoding="utf-8")
+    # Readers keep using the previous index until the manifest and cache entry are swapped in.
+    tmp_path.replace(path / MANIFEST_NAME)
+    _INDEXES[path] = ((path / MANIFEST_NAME).stat().st_mtime_ns, LexicalIndex(list(segments.values())))
+    for name in superseded:
+        (path / f"{name}.json").unlink(missing_ok=True)
+
+
+def add_to_lexical_index(
+    collection: str,
+    docs: list[Document],
+    ids: list[str],
+    load_chunks: Callable[[], tuple[list[Document], list[str]]] | None = None,
+) -> None:
+    path = _index_path(collection)
+    # Only writers to the same collection wait here; lookups never take this lock.
+    with _write_lock(path):
+        existing = get_lexical_index(collection)
+        if existing is None and load_chunks is not None:
+            # A collection without an index may predate it, so its stored chunks are indexed along with the new ones.
+            stored_docs, stored_ids = load_chunks()
+            docs, ids = [*stored_docs, *docs], [*stored_ids, *ids]
+        _write_index(path, existing, docs, ids)
+
+
+def backfill_lexical_index(
+    collection: str, load_chunks: Callable[[], tuple[list[Document], list[str]]]
+) -> LexicalIndex | None:
+    # Collections ingested before the lexical index existed get one built from their stored chunks.
+    path = _index_path(collection)
+    with _write_lock(path):
+        index = get_lexical_index(collection)
+        if index is not None:
+            return index
+        docs, ids = load_chunks()
+        if not docs:
+            return None
+        _write_index(path, None, docs, ids)
+    return get_lexical_index(collection)
+
+
+def delete_lexical_index(collection: str) -> None:
+    path = _index_path(collection)
+    with _write_lock(path):
+        shutil.rmtree(path, ignore_errors=True)
+        _INDEXES.pop(path, None)
+
+
+def get_lexical_index(collection: str) -> LexicalIndex | None:
+    path = _index_path(collection)
+    try:
+        mtime_ns = (path / MANIFEST_NAME).stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _INDEXES.get(path)
+    if cached is not None and cached[0] == mtime_ns:
+        return cached[1]
+    try:
+        index = _read_index(path, cached[1] if cached is not None else None)
+    except FileNotFoundError:
+        # Another process swapped the manifest or dropped a superseded segment mid-read; the next lookup retries.
+        return cached[1] if cached is not None else None
+    _INDEXES[path] = (mtime_ns, index)
+    return index
+
+
+def lexical_search(
+    collection: str, query: str, top_k: int, file_filter: str | None = None
+) -> list[tuple[Document, float]]:
+    index = get_lexical_index(collection)
+    if index is None:
+        return []
+    return index.search(query, top_k, file_filter)
@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from email.utils import parsedate_to_datetime
+from typing import TypeVar
+
+from openai import APIStatusError, APITimeoutError, RateLimitError
+
+from app.errors import UpstreamOverloadedError
+
+T = TypeVar("T")
+
+
+def retry_after_seconds(exc: BaseException) -> float | None:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return max(float(retry_after_ms) / 1000, 0.0)
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return max(float(retry_after), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def is_overload(exc: BaseException) -> bool:
+    if isinstance(exc, (asyncio.TimeoutError, APITimeoutError, RateLimitError)):
+        return True
+    return isinstance(exc, APIStatusError) and exc.status_code in {429, 503}
+
+
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        *,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        max_wait_seconds: float,
+        decrease_factor: float = 0.5,
+    ):
+        self.min_limit = max(min_limit, 1)
+        self.max_limit = max(max_limit, self.min_limit)
+        self.limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self.max_wait_seconds = max_wait_seconds
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._waiters: deque[asyncio.Future[None]] = deque()
+        self._unblock_timer: asyncio.TimerHandle | None = None
+        self._stats = {
+            "successes": 0,
+            "overloads": 0,
+            "rejections": 0,
+            "retry_after_honored": 0,
+            "queue_wait_ms_total": 0.0,
+            "queue_wait_ms_max": 0.0,
+            "acquired": 0,
+        }
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit) and time.monotonic() >= self.blocked_until
+
+    def _wake(self) -> None:
+        # Slots are handed to waiters in arrival order; the woken caller already owns its slot.
+        while self._waiters and self._has_capacity():
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+        # A Retry-After pause ends without any release to wake on, so a timer resumes the queue.
+        if self._unblock_timer is not None:
+            self._unblock_timer.cancel()
+            self._unblock_timer = None
+        now = time.monotonic()
+        if self._waiters and self.blocked_until > now:
+            self._unblock_timer = asyncio.get_running_loop().call_later(self.blocked_until - now, self._unblock)
+
+    def _unblock(self) -> None:
+        self._unblock_timer = None
+        self._wake()
+
+    async def _acquire(self) -> None:
+        start = time.monotonic()
+        if self._has_capacity() and not self._waiters:
+            self.in_flight += 1
+        else:
+            waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            self._wake()
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter), timeout=max(self.max_wait_seconds, 0.0))
+            except asyncio.TimeoutError:
+                # A slot handed over just as the deadline passed is still ours to use.
+                if not waiter.done():
+                    self._waiters.remove(waiter)
+                    waiter.cancel()
+                    self._stats["rejections"] += 1
+                    raise UpstreamOverloadedError("Model service is saturated; try again shortly") from None
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # Cancelled after being handed a slot: pass it on to the next waiter.
+                    self.in_flight -= 1
+                    self._wake()
+                else:
+                    self._waiters.remove(waiter)
+                    waiter.cancel()
+                raise
+        wait_ms = (time.monotonic() - start) * 1000
+        self._stats["acquired"] += 1
+        self._stats["queue_wait_ms_total"] += wait_ms
+        self._stats["queue_wait_ms_max"] = max(self._stats["queue_wait_ms_max"], wait_ms)
+
+    def _release(self, exc: BaseException | None, started_at: float) -> None:
+        self.in_flight -= 1
+        if exc is None:
+            self._stats["successes"] += 1
+            # Additive increase: roughly one extra slot per window of successful calls.
+            self.limit = min(self.limit + 1 / self.limit, float(self.max_limit))
+        elif is_overload(exc):
+            self._stats["overloads"] += 1
+            # Calls sent before the last cut report the same congestion, so they do not cut again.
+            if started_at >= self._last_decrease:
+                self.limit = max(self.limit * self.decrease_factor, float(self.min_limit))
+                self._last_decrease = time.monotonic()
+            retry_after = retry_after_seconds(exc)
+            if retry_after:
+                self._stats["retry_after_honored"] += 1
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+        self._wake()
+
+    async def run(self, fn: Callable[[], Awaitable[T]]) -> T:
+        await self._acquire()
+        started_at = time.monotonic()
+        try:
+            result = await fn()
+        except BaseException as exc:
+            # Cancellation and non-overload errors release the slot without moving the limit.
+            self._release(exc, started_at)
+            raise
+        self._release(None, started_at)
+        return result
+
+    def stats(self) -> dict:
+        acquired = self._stats["acquired"]
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "successes": self._stats["successes"],
+            "overloads": self._stats["overloads"],
+            "rejections": self._stats["rejections"],
+            "retry_after_honored": self._stats["retry_after_honored"],
+            "retry_after_remaining_s": round(max(self.blocked_until - time.monotonic(), 0.0), 3),
+            "avg_queue_wait_ms": round(self._stats["queue_wait_ms_total"] / acquired, 2) if acquired else 0.0,
+            "max_queue_wait_ms": round(self._stats["queue_wait_ms_max"], 2),
+        }
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = float(capacity)
+        self.refill_per_second = refill_per_second
+        self.available = float(capacity)
+        self._updated = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self._updated) * self.refill_per_second)
+        self._updated = now
+
+    def seconds_until(self, amount: float) -> float:
+        self.refill()
+        deficit = min(amount, self.capacity) - self.available
+        return max(deficit / self.refill_per_second, 0.0) if self.refill_per_second else 0.0
+
+
+class RateLimitScheduler:
+    def __init__(self, *, rpm: int | None, tpm: int | None, max_wait_seconds: float):
+        # Per-minute quotas refill continuously, so a full minute's allowance can be spent as a burst.
+        self.requests = TokenBucket(rpm, rpm / 60) if rpm else None
+        self.tokens = TokenBucket(tpm, tpm / 60) if tpm else None
+        self.max_wait_seconds = max_wait_seconds
+        self._stats = {"acquired": 0, "waited": 0, "rejections": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0}
+
+    def _wait_seconds(self, tokens: int) -> float:
+        waits = [0.0]
+        if self.requests is not None:
+            waits.append(self.requests.seconds_until(1))
+        if self.tokens is not None:
+            waits.append(self.tokens.seconds_until(tokens))
+        return max(waits)
+
+    async def acquire(self, tokens: int) -> float:
+        start = time.monotonic()
+        while True:
+            wait = self._wait_seconds(tokens)
+            if wait <= 0:
+                break
+            if time.monotonic() - start + wait > self.max_wait_seconds:
+                self._stats["rejections"] += 1
+                raise UpstreamOverloadedError("Model rate limit budget exhausted; try again shortly")
+            await asyncio.sleep(wait)
+        if self.requests is not None:
+            self.requests.available -= 1
+        if self.tokens is not None:
+            self.tokens.available -= min(tokens, self.tokens.capacity)
+        waited_ms = (time.monotonic() - start) * 1000
+        self._stats["acquired"] += 1
+        if waited_ms > 1:
+            self._stats["waited"] += 1
+        self._stats["wait_ms_total"] += waited_ms
+        self._stats["wait_ms_max"] = max(self._stats["wait_ms_max"], waited_ms)
+        return waited_ms
+
+    def settle(self, estimated_tokens: int, actual_tokens: int) -> None:
+        # Give back (or take) the difference once the provider reports what the call really used.
+        if self.tokens is not None:
+            self.tokens.refill()
+            self.tokens.available = min(self.tokens.capacity, self.tokens.available + estimated_tokens - actual_tokens)
+
+    def stats(self) -> dict:
+        acquired = self._stats["acquired"]
+        stats: dict = {
+            "acquired": acquired,
+            "waited": self._stats["waited"],
+            "rejections": self._stats["rejections"],
+            "avg_wait_ms": round(self._stats["wait_ms_total"] / acquired, 2) if acquired else 0.0,
+            "max_wait_ms": round(self._stats["wait_ms_max"], 2),
+        }
+        for name, bucket in (("rpm", self.requests), ("tpm", self.tokens)):
+            if bucket is not None:
+                bucket.refill()
+                stats[name] = {
+                    "capacity": int(bucket.capacity),
+                    "available": round(bucket.available, 1),
+                    "fill": round(bucket.available / bucket.capacity, 3),
+                }
+        return stats
+
+
+class LatencyTracker:
+    def __init__(self, *, window_size: int, min_samples: int):
+        self.min_samples = max(min_samples, 1)
+        self._samples: deque[float] = deque(maxlen=max(window_size, self.min_samples))
+        self.hedges_sent = 0
+        self.hedges_won = 0
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, percent: float) -> float | None:
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(int(len(ordered) * percent / 100), len(ordered) - 1)
+        return ordered[index]
+
+    def stats(self, percent: float) -> dict:
+        hedge_after = self.percentile(percent)
+        return {
+            "samples": len(self._samples),
+            "hedge_after_ms": round(hedge_after * 1000, 2) if hedge_after is not None else None,
+            "hedges_sent": self.hedges_sent,
+            "hedges_won": self.hedges_won,
+        }
@@ -3,16 +3,254 @@ from __future__ import annotations
 import asyncio
 import json
 import random
-from typing import TypeVar
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from contextvars import ContextVar
+from typing import Any, TypeVar
 
 from langchain_openai import ChatOpenAI
 from openai import APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
 from pydantic import BaseModel, ValidationError
 
-from app.errors import ModelOutputError, UpstreamModelError, UpstreamTimeoutError
+from app.cache import TieredCache, build_tiered_cache, make_cache_key
+from app.circuit import CircuitBreaker, RetryBudget
+from app.config import get_settings
+from app.errors import ModelOutputError, UpstreamModelError, UpstreamOverloadedError, UpstreamTimeoutError
+from app.json_repair import coerce_to_schema, repair_json_text, repair_structured_output
+from app.limiter import AdaptiveLimiter, LatencyTracker, RateLimitScheduler, retry_after_seconds
+from app.tokens import count_tokens
 
 SchemaModel = TypeVar("SchemaModel", bound=BaseModel)
 
+LLM_USAGE: ContextVar[dict | None] = ContextVar("llm_usage", default=None)
+LLM_HEDGES: ContextVar[dict | None] = ContextVar("llm_hedges", default=None)
+LLM_CACHE_HITS: ContextVar[dict | None] = ContextVar("llm_cache_hits", default=None)
+JSON_REPAIRS: ContextVar[dict | None] = ContextVar("json_repairs", default=None)
+LLM_MODELS: ContextVar[dict | None] = ContextVar("llm_models", default=None)
+LLM_CACHE_BYPASS: ContextVar[bool] = ContextVar("llm_cache_bypass", default=False)
+_RESPONSE_CACHE_LOCK = threading.Lock()
+_RESPONSE_CACHE: TieredCache | None = None
+_LLM_LIMITER: AdaptiveLimiter | None = None
+
+
+def get_llm_limiter() -> AdaptiveLimiter:
+    global _LLM_LIMITER
+    if _LLM_LIMITER is None:
+        settings = get_settings()
+        if settings.llm_adaptive_limit_enabled:
+            _LLM_LIMITER = AdaptiveLimiter(
+                initial_limit=settings.llm_adaptive_limit_initial,
+                min_limit=settings.llm_adaptive_limit_min,
+                max_limit=settings.llm_adaptive_limit_max,
+                max_wait_seconds=settings.llm_limiter_max_wait_seconds,
+            )
+        else:
+            # With adaptation off the same limiter holds a fixed LLM_CONCURRENCY cap, still per call.
+            _LLM_LIMITER = AdaptiveLimiter(
+                initial_limit=settings.llm_concurrency,
+                min_limit=settings.llm_concurrency,
+                max_limit=settings.llm_concurrency,
+                max_wait_seconds=settings.llm_limiter_max_wait_seconds,
+            )
+    return _LLM_LIMITER
+
+
+def llm_limiter_stats() -> dict:
+    return get_llm_limiter().stats()
+
+
+_RATE_SCHEDULERS: dict[str, RateLimitScheduler] = {}
+_LATENCY_TRACKERS: dict[str, LatencyTracker] = {}
+_CIRCUIT_BREAKER: CircuitBreaker | None = None
+_RETRY_BUDGET: RetryBudget | None = None
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    global _CIRCUIT_BREAKER
+    if _CIRCUIT_BREAKER is None:
+        settings = get_settings()
+        _CIRCUIT_BREAKER = CircuitBreaker(
+            failure_threshold=settings.llm_circuit_failure_threshold,
+            recovery_seconds=settings.llm_circuit_recovery_seconds,
+        )
+    return _CIRCUIT_BREAKER
+
+
+def get_retry_budget() -> RetryBudget:
+    global _RETRY_BUDGET
+    if _RETRY_BUDGET is None:
+        settings = get_settings()
+        _RETRY_BUDGET = RetryBudget(
+            ratio=settings.llm_retry_budget_ratio,
+            min_retries=settings.llm_retry_budget_min_retries,
+            window_seconds=settings.llm_retry_budget_window_seconds,
+        )
+    return _RETRY_BUDGET
+
+
+def get_rate_scheduler(model_name: str) -> RateLimitScheduler | None:
+    settings = get_settings()
+    limits = settings.llm_rate_limits.get(model_name)
+    if not limits:
+        return None
+    scheduler = _RATE_SCHEDULERS.get(model_name)
+    if scheduler is None:
+        scheduler = RateLimitScheduler(
+            rpm=limits.get("rpm"),
+            tpm=limits.get("tpm"),
+            max_wait_seconds=settings.llm_limiter_max_wait_seconds,
+        )
+        _RATE_SCHEDULERS[model_name] = scheduler
+    return scheduler
+
+
+def get_latency_tracker(model_name: str) -> LatencyTracker:
+    tracker = _LATENCY_TRACKERS.get(model_name)
+    if tracker is None:
+        settings = get_settings()
+        tracker = LatencyTracker(window_size=settings.llm_hedge_window_size, min_samples=settings.llm_hedge_min_samples)
+        _LATENCY_TRACKERS[model_name] = tracker
+    return tracker
+
+
+def hedging_stats() -> dict:
+    percentile = get_settings().llm_hedge_percentile
+    return {model_name: tracker.stats(percentile) for model_name, tracker in _LATENCY_TRACKERS.items()}
+
+
+def resilience_stats() -> dict:
+    return {"circuit": get_circuit_breaker().stats(), "retry_budget": get_retry_budget().stats()}
+
+
+def rate_limit_stats() -> dict:
+    return {model_name: scheduler.stats() for model_name, scheduler in _RATE_SCHEDULERS.items()}
+
+
+def _estimate_call_tokens(llm: ChatOpenAI, model_name: str, prompt: str) -> tuple[int, int]:
+    max_output_tokens = getattr(llm, "max_tokens", None) or get_settings().llm_output_tokens_estimate
+    prompt_tokens = count_tokens(prompt, model_name)
+    return prompt_tokens, prompt_tokens + max_output_tokens
+
+
+def _used_tokens(response: object) -> int | None:
+    metadata = getattr(response, "usage_metadata", None) or {}
+    total = metadata.get("total_tokens")
+    return int(total) if total else None
+
+
+def start_llm_usage() -> dict:
+    # Tasks created afterwards inherit the context, so every call made for one analysis adds to this dict.
+    usage = {"calls": 0, "input_tokens": 0, "output_tokens": 0}
+    LLM_USAGE.set(usage)
+    return usage
+
+
+def _response_cache() -> TieredCache:
+    global _RESPONSE_CACHE
+    with _RESPONSE_CACHE_LOCK:
+        if _RESPONSE_CACHE is None:
+            settings = get_settings()
+            _RESPONSE_CACHE = build_tiered_cache(
+                max_entries=settings.llm_response_cache_max_entries,
+                ttl_seconds=settings.llm_response_cache_ttl_seconds,
+                disk_path=settings.llm_response_cache_path,
+            )
+        return _RESPONSE_CACHE
+
+
+# The cache's disk tier is SQLite, so lookups and stores run in a worker thread instead of on the event loop.
+def _cached_response(cache_key: str) -> Any | None:
+    return _response_cache().get(cache_key)
+
+
+def _store_response(cache_key: str, value: Any) -> None:
+    _response_cache().set(cache_key, value)
+
+
+def llm_response_cache_stats() -> dict:
+    return _response_cache().stats()
+
+
+def start_llm_cache_hits() -> dict:
+    hits: dict[str, bool] = {}
+    LLM_CACHE_HITS.set(hits)
+    return hits
+
+
+def set_llm_cache_bypass(bypass: bool) -> None:
+    # Like an analysis-cache bypass: stored answers are not read, but fresh ones still replace them.
+    LLM_CACHE_BYPASS.set(bypass)
+
+
+def _record_cache_lookup(cache_label: str | None, hit: bool) -> None:
+    hits = LLM_CACHE_HITS.get()
+    if hits is not None and cache_label is not None:
+        hits[cache_label] = hit
+
+
+def start_json_repairs() -> dict:
+    repairs = {"local": 0, "remote": 0}
+    JSON_REPAIRS.set(repairs)
+    return repairs
+
+
+def _record_repair(kind: str, count: int = 1) -> None:
+    repairs = JSON_REPAIRS.get()
+    if repairs is not None:
+        repairs[kind] += count
+
+
+def start_llm_models() -> dict:
+    models = {"triage": None, "modules": {}, "repairs": {}, "escalations": {}}
+    LLM_MODELS.set(models)
+    return models
+
+
+def record_stage_model(stage: str, model_name: str) -> None:
+    models = LLM_MODELS.get()
+    if models is None:
+        return
+    if stage == "triage":
+        models["triage"] = model_name
+    else:
+        models["modules"][stage] = model_name
+
+
+def record_escalation(module_name: str, reason: str) -> None:
+    models = LLM_MODELS.get()
+    if models is not None:
+        models["escalations"][module_name] = reason
+
+
+def _record_repair_model(label: str | None, llm: ChatOpenAI) -> None:
+    models = LLM_MODELS.get()
+    if models is not None and label is not None:
+        models["repairs"][label] = getattr(llm, "model_name", None) or get_settings().model_name
+
+
+def start_llm_hedges() -> dict:
+    hedges = {"hedges_sent": 0, "hedges_won": 0}
+    LLM_HEDGES.set(hedges)
+    return hedges
+
+
+def _count_hedge(tracker: LatencyTracker, key: str) -> None:
+    setattr(tracker, key, getattr(tracker, key) + 1)
+    hedges = LLM_HEDGES.get()
+    if hedges is not None:
+        hedges[key] += 1
+
+
+def _record_usage(response: object) -> None:
+    usage = LLM_USAGE.get()
+    if usage is None:
+        return
+    usage["calls"] += 1
+    metadata = getattr(response, "usage_metadata", None) or {}
+    usage["input_tokens"] += metadata.get("input_tokens", 0)
+    usage["output_tokens"] += metadata.get("output_tokens", 0)
+
 
 def _extract_json(text: str) -> dict:
     cleaned = text.strip()
@@ -39,6 +277,13 @@ def _is_transient_error(exc: Exception) -> bool:
     return False
 
 
+def _is_upstream_failure(exc: Exception) -> bool:
+    # Rate limiting means the service is up but busy, so it does not count against the breaker.
+    if isinstance(exc, RateLimitError):
+        return False
+    return _is_transient_error(exc)
+
+
 def _map_upstream_error(exc: Exception) -> Exception:
     if isinstance(exc, (asyncio.TimeoutError, APITimeoutError)):
         return UpstreamTimeoutError("Model request timed out")
@@ -53,6 +298,55 @@ def _map_upstream_error(exc: Exception) -> Exception:
     return UpstreamModelError("Model request failed unexpectedly")
 
 
+async def _timed_ainvoke(llm: ChatOpenAI, prompt: str, timeout_seconds: float, tracker: LatencyTracker) -> object:
+    started = time.monotonic()
+    try:
+        response = await asyncio.wait_for(llm.ainvoke(prompt), timeout=timeout_seconds)
+    except asyncio.TimeoutError:
+        # A timeout is a lower bound on the call's latency; dropping it would let the percentile drift
+        # down to the calls that finished. Failed and cancelled calls (hedge losers) say nothing about it.
+        tracker.record(timeout_seconds)
+        raise
+    tracker.record(time.monotonic() - started)
+    return response
+
+
+def _has_spare_capacity(limiter: AdaptiveLimiter | None) -> bool:
+    return limiter is None or limiter.in_flight < int(limiter.limit)
+
+
+async def _first_response(
+    send: Callable[[float], Awaitable[object]],
+    timeout_seconds: float,
+    hedge_after: float | None,
+    limiter: AdaptiveLimiter | None,
+    tracker: LatencyTracker,
+) -> object:
+    started = time.monotonic()
+    primary = asyncio.ensure_future(send(timeout_seconds))
+    tasks = [primary]
+    try:
+        if hedge_after is not None:
+            await asyncio.wait(tasks, timeout=hedge_after)
+            remaining = timeout_seconds - (time.monotonic() - started)
+            if not primary.done() and remaining > 0 and _has_spare_capacity(limiter):
+                tasks.append(asyncio.ensure_future(send(remaining)))
+                _count_hedge(tracker, "hedges_sent")
+        pending = set(tasks)
+        while pending:
+            _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in tasks:
+                if task.done() and not task.cancelled() and task.exception() is None:
+                    if task is not primary:
+                        _count_hedge(tracker, "hedges_won")
+                    return task.result()
+        return primary.result()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
 async def _invoke_with_retry(
     llm: ChatOpenAI,
     prompt: str,
@@ -63,20 +357,64 @@ async def _invoke_with_retry(
     retries_used = 0
     last_exc: Exception | None = None
 
+    settings = get_settings()
+    limiter = get_llm_limiter()
+    model_name = getattr(llm, "model_name", None) or settings.model_name
+    scheduler = get_rate_scheduler(model_name)
+    prompt_tokens, estimated_tokens = (0, 0) if scheduler is None else _estimate_call_tokens(llm, model_name, prompt)
+    tracker = get_latency_tracker(model_name)
+    breaker = get_circuit_breaker()
+    retry_budget = get_retry_budget()
+    retry_budget.record_request()
+
+    async def _send(call_timeout: float) -> object:
+        # The slot covers one request only; backoff sleeps between attempts hold nothing.
+        if scheduler is None:
+            return await limiter.run(lambda: _timed_ainvoke(llm, prompt, call_timeout, tracker))
+        # Wait for RPM/TPM capacity locally instead of sending a request that would come back 429.
+        await scheduler.acquire(estimated_tokens)
+        response = None
+        try:
+            response = await limiter.run(lambda: _timed_ainvoke(llm, prompt, call_timeout, tracker))
+            return response
+        finally:
+            # Every reservation is settled, failed attempts and cancelled hedge losers included. Without
+            # a reply the prompt is counted as sent and the unused output allowance is given back.
+            used = prompt_tokens if response is None else _used_tokens(response) or estimated_tokens
+            scheduler.settle(estimated_tokens, used)
+
     for attempt in range(max_retries + 1):
+        probe = breaker.before_call()
+        # Half-open probes stay single so a recovering upstream sees exactly one request.
+        hedge_after = (
+            tracker.percentile(settings.llm_hedge_percentile) if settings.llm_hedging_enabled and not probe else None
+        )
         try:
-            response = await asyncio.wait_for(llm.ainvoke(prompt), timeout=timeout_seconds)
+            response = await _first_response(_send, timeout_seconds, hedge_after, limiter, tracker)
+            breaker.record_success(probe)
+            _record_usage(response)
             content = response.content if isinstance(response.content, str) else str(response.content)
             return content, retries_used
-        except asyncio.CancelledError:
-            # Preserve cooperative cancellation and never convert it to upstream errors.
+        except (asyncio.CancelledError, UpstreamOverloadedError):
+            # Preserve cooperative cancellation and never convert it to upstream errors; a saturated
+            # limiter has already waited its full budget, so retrying would only queue again.
+            breaker.record_neutral(probe)
             raise
         except Exception as exc:
             last_exc = exc
+            if _is_upstream_failure(exc):
+                breaker.record_failure(probe)
+            else:
+                breaker.record_neutral(probe)
             if not _is_transient_error(exc) or attempt == max_retries:
                 raise _map_upstream_error(exc) from exc
+            # Rate-limit retries are already paced by the limiter and Retry-After, so only
+            # degradation retries draw on the shared budget.
+            if _is_upstream_failure(exc) and not retry_budget.try_spend():
+                raise _map_upstream_error(exc) from exc
             retries_used += 1
             delay = (base_backoff_seconds * (2**attempt)) + random.uniform(0, base_backoff_seconds)
+            delay = max(delay, retry_after_seconds(exc) or 0.0)
             await asyncio.sleep(delay)
 
     # Defensive fallback; loop always returns or raises.
@@ -90,24 +428,176 @@ async def invoke_json_with_retries(
     timeout_seconds: float,
     max_retries: int,
     base_backoff_seconds: float,
+    cache_label: str | None = None,
+    repair_llm: ChatOpenAI | None = None,
+    remote_repair: bool = True,
 ) -> tuple[dict, int, bool]:
     total_retry_count = 0
 
+    # Only deterministic (temperature 0) calls are cacheable; the prompt fully determines their output.
+    cache_key = None
+    if getattr(llm, "temperature", None) == 0:
+        model_name = getattr(llm, "model_name", None) or get_settings().model_name
+        cache_key = make_cache_key("llm_response", model_name, schema.__name__, prompt)
+        cached = None if LLM_CACHE_BYPASS.get() else await asyncio.to_thread(_cached_response, cache_key)
+        _record_cache_lookup(cache_label, cached is not None)
+        if cached is not None:
+            return cached, 0, False
+
     content, retries = await _invoke_with_retry(llm, prompt, timeout_seconds, max_retries, base_backoff_seconds)
     total_retry_count += retries
     try:
         parsed = _extract_json(content)
         validated = schema.model_validate(parsed).model_dump()
+        if cache_key is not None:
+            await asyncio.to_thread(_store_response, cache_key, validated)
         return validated, total_retry_count, False
     except (json.JSONDecodeError, ValidationError):
+        pass
+
+    # Most malformed replies are fixable locally, which saves resending the whole prompt and context.
+    validated = repair_structured_output(content, schema)
+    if validated is not None:
+        _record_repair("local")
+    elif not remote_repair:
+        # The caller has a better fallback than asking the same model again (a cascade escalates instead).
+        raise ModelOutputError("The model returned invalid structured output")
+    else:
+        _record_repair("remote")
+        repair_llm = repair_llm or llm
+        _record_repair_model(cache_label, repair_llm)
         repair_prompt = prompt + "\n\nReturn JSON only, no markdown."
         repaired_content, repair_retries = await _invoke_with_retry(
-            llm, repair_prompt, timeout_seconds, max_retries, base_backoff_seconds
+            repair_llm, repair_prompt, timeout_seconds, max_retries, base_backoff_seconds
         )
         total_retry_count += repair_retries
+        validated = repair_structured_output(repaired_content, schema)
+        if validated is None:
+            raise ModelOutputError("The model returned invalid structured output after repair attempt")
+    # Repaired output is not cached: a cut-back truncated reply may have lost findings.
+    return validated, total_retry_count, True
+
+
+def strict_json_schema(schema: type[BaseModel]) -> dict:
+    # Strict structured output wants every property required, no extra keys, and no defaults or titles.
+    def _strict(node: object) -> object:
+        if isinstance(node, list):
+            return [_strict(item) for item in node]
+        if not isinstance(node, dict):
+            return node
+        strict: dict = {}
+        for key, value in node.items():
+            if key in {"default", "title"}:
+                continue
+            if key in {"properties", "$defs"}:
+                strict[key] = {name: _strict(child) for name, child in value.items()}
+            else:
+                strict[key] = _strict(value)
+        if strict.get("type") == "object" and "properties" in strict:
+            strict["required"] = list(strict["properties"])
+            strict["additionalProperties"] = False
+        return strict
+
+    return _strict(schema.model_json_schema())
+
+
+def json_schema_response_format(schema: type[BaseModel], enums: dict[str, list[str]] | None = None) -> dict:
+    strict = strict_json_schema(schema)
+    # Allowed values the model type only loosely (a list of names) are constrained in the sent schema.
+    for name, values in (enums or {}).items():
+        node = strict["properties"][name]
+        target = node["items"] if node.get("type") == "array" else node
+        target["enum"] = list(values)
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": schema.__name__, "strict": True, "schema": strict},
+    }
+
+
+def keyed_json_schema_response_format(schema: type[BaseModel], keys: list[str]) -> dict:
+    strict = strict_json_schema(schema)
+    # Every key gets the same section schema; shared definitions stay at the root so their $refs resolve.
+    definitions = strict.pop("$defs", None)
+    keyed: dict = {
+        "type": "object",
+        "properties": {key: strict for key in keys},
+        "required": list(keys),
+        "additionalProperties": False,
+    }
+    if definitions:
+        keyed["$defs"] = definitions
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": f"Keyed{schema.__name__}", "strict": True, "schema": keyed},
+    }
+
+
+def _validate_sections(
+    parsed: dict, keys: list[str], schema: type[SchemaModel]
+) -> tuple[dict[str, dict], list[str], bool]:
+    valid: dict[str, dict] = {}
+    invalid: list[str] = []
+    coerced_any = False
+    for key in keys:
         try:
-            repaired_parsed = _extract_json(repaired_content)
-            validated = schema.model_validate(repaired_parsed).model_dump()
-            return validated, total_retry_count, True
-        except (json.JSONDecodeError, ValidationError) as exc:
-            raise ModelOutputError("The model returned invalid structured output after repair attempt") from exc
+            valid[key] = schema.model_validate(parsed.get(key)).model_dump()
+        except ValidationError:
+            coerced = coerce_to_schema(parsed.get(key), schema)
+            if coerced is None:
+                invalid.append(key)
+            else:
+                valid[key] = coerced
+                coerced_any = True
+                _record_repair("local")
+    return valid, invalid, coerced_any
+
+
+async def invoke_keyed_json_with_retries(
+    llm: ChatOpenAI,
+    prompt: str,
+    keys: list[str],
+    schema: type[SchemaModel],
+    timeout_seconds: float,
+    max_retries: int,
+    base_backoff_seconds: float,
+    repair_llm: ChatOpenAI | None = None,
+) -> tuple[dict[str, dict], list[str], int, bool]:
+    # Each keyed section is validated on its own; failed sections go back to the caller to re-request.
+    cache_key = None
+    if getattr(llm, "temperature", None) == 0:
+        model_name = getattr(llm, "model_name", None) or get_settings().model_name
+        cache_key = make_cache_key("llm_response", model_name, schema.__name__, keys, prompt)
+        cached = None if LLM_CACHE_BYPASS.get() else await asyncio.to_thread(_cached_response, cache_key)
+        for key in keys:
+            _record_cache_lookup(key, cached is not None)
+        if cached is not None:
+            return cached, [], 0, False
+
+    content, retries = await _invoke_with_retry(llm, prompt, timeout_seconds, max_retries, base_backoff_seconds)
+    try:
+        parsed = _extract_json(content)
+        repaired = False
+    except json.JSONDecodeError:
+        repaired = True
+        parsed = repair_json_text(content)
+        if parsed is not None:
+            _record_repair("local")
+        else:
+            _record_repair("remote")
+            repair_llm = repair_llm or llm
+            _record_repair_model("combined", repair_llm)
+            repair_prompt = prompt + "\n\nReturn JSON only, no markdown."
+            repaired_content, repair_retries = await _invoke_with_retry(
+                repair_llm, repair_prompt, timeout_seconds, max_retries, base_backoff_seconds
+            )
+            retries += repair_retries
+            parsed = repair_json_text(repaired_content)
+            if parsed is None:
+                raise ModelOutputError("The model returned invalid structured output after repair attempt")
+    if not isinstance(parsed, dict):
+        return {}, list(keys), retries, repaired
+    valid, invalid, coerced = _validate_sections(parsed, keys, schema)
+    # Like single reviews, only a reply whose every section validated as sent is cached.
+    if cache_key is not None and not (invalid or coerced or repaired):
+        await asyncio.to_thread(_store_response, cache_key, valid)
+    return valid, invalid, retries, repaired
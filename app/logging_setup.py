@@ -28,8 +28,22 @@ class JsonFormatter(logging.Formatter):
             "budget_modules",
             "selected_modules",
             "context_chars_used",
+            "context_tokens_used",
             "retry_count",
             "retrieval_concurrency",
+            "llm_limit",
+            "module_latency_ms",
+            "speculative_modules",
+            "job_id",
+            "job_count",
+            "circuit_state",
+            "previous_state",
+            "consecutive_failures",
+            "model_name",
+            "module_name",
+            "cascade_model",
+            "escalation_reason",
+            "llm_models",
             "error_code",
             "retryable",
             "error_message",
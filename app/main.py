@@ -2,16 +2,25 @@ from __future__ import annotations
 
 import logging
 import asyncio
+import json
 import time
 import uuid
+from collections import Counter
+from contextlib import asynccontextmanager
+from collections.abc import Awaitable, Callable
 from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
 
 from fastapi import FastAPI, File, Header, Query, Request, UploadFile
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
+from app.cache import build_tiered_cache, make_cache_key
+from app.clients import close_clients
 from app.config import get_settings
+from app.embeddings import close_embedding_batcher, embedding_cache_stats
 from app.errors import (
     CollectionEmptyError,
     DomainError,
@@ -21,19 +30,84 @@ from app.errors import (
     UpstreamTimeoutError,
 )
 from app.ingest import ingest_pdf, list_ingested_files
+from app.jobs import JobManager
+from app.llm_client import (
+    get_llm_limiter,
+    hedging_stats,
+    llm_limiter_stats,
+    llm_response_cache_stats,
+    rate_limit_stats,
+    resilience_stats,
+    set_llm_cache_bypass,
+    start_json_repairs,
+    start_llm_cache_hits,
+    start_llm_hedges,
+    start_llm_models,
+    start_llm_usage,
+)
 from app.logging_setup import RequestContextMiddleware, configure_logging
 from app.models import AnalyzeRequest, AnalyzeResponse, HealthResponse
-from app.prompts import DEEP_MODULES, MODULES
-from app.retrieval import retrieve_context
-from app.reviewers import run_module_review, run_triage
+from app.prompts import DEEP_MODULES, MODULES, PROMPT_TEMPLATE_HASH
+from app.retrieval import (
+    retrieval_stats,
+    retrieve_context,
+    retrieve_module_contexts,
+    shutdown_retrieval_executor,
+)
+from app.reviewers import run_module_review, run_multi_module_review, run_triage
 from app.scoring import compute_overall
+from app.singleflight import SingleFlight
+from app.store import clear_vectorstores, get_collection_version, vectorstore_stats
+from app.tokens import preload_encodings
 
 settings = get_settings()
 configure_logging(settings.log_level)
 logger = logging.getLogger("app")
 RETRIEVAL_SEMAPHORE = asyncio.Semaphore(settings.retrieval_concurrency)
+RECOMMENDATION_COUNTS: Counter[str] = Counter()
+AnalysisEventHandler = Callable[[str, dict], Awaitable[None]]
+ANALYSIS_CACHE = build_tiered_cache(
+    max_entries=settings.analysis_cache_max_entries,
+    ttl_seconds=settings.analysis_cache_ttl_seconds,
+    disk_path=settings.analysis_cache_path,
+)
+ANALYSIS_FLIGHTS: SingleFlight[AnalyzeResponse] = SingleFlight()
+
+
+async def _run_job_analysis(payload: AnalyzeRequest, job_id: str, on_event: AnalysisEventHandler) -> AnalyzeResponse:
+    return await _run_analysis_cached(payload, request_id=job_id, on_event=on_event)
+
+
+JOB_MANAGER = JobManager(
+    db_path=settings.jobs_db_path,
+    worker_count=settings.jobs_worker_count,
+    queue_depth=settings.jobs_queue_depth,
+    runner=_run_job_analysis,
+    ttl_seconds=settings.jobs_ttl_seconds,
+    cleanup_interval_seconds=settings.jobs_cleanup_interval_seconds,
+)
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    stage_models = [settings.triage_model, settings.module_model, settings.repair_model, settings.llm_cascade_model]
+    models = [settings.model_name, *(m for m in stage_models if m), *settings.module_models.values()]
+    await asyncio.to_thread(preload_encodings, models)
+    if settings.repair_model and settings.llm_output_mode == "json_schema":
+        # Structured calls carry no schema text for a repair model to follow, so they repair on their own model.
+        logger.warning("repair_model_unused_in_json_schema_mode", extra={"model_name": settings.repair_model})
+    await JOB_MANAGER.start()
+    try:
+        yield
+    finally:
+        await JOB_MANAGER.stop()
+        shutdown_retrieval_executor()
+        await close_embedding_batcher()
+        clear_vectorstores()
+        await close_clients()
+
 
-app = FastAPI(title="System Design Reviewer", version="1.0.0")
+app = FastAPI(title="System Design Reviewer", version="1.0.0", lifespan=lifespan)
 app.add_middleware(RequestContextMiddleware)
 STATIC_DIR = Path(__file__).parent / "static"
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
@@ -53,6 +127,18 @@ def _request_latency_ms(request: Request) -> float:
     return round((time.perf_counter() - start) * 1000, 2)
 
 
+def _internal_error_payload(request_id: str) -> dict:
+    return {
+        "ok": False,
+        "request_id": request_id,
+        "error": {
+            "code": "INTERNAL_ERROR",
+            "message": "Internal server error",
+            "retryable": False,
+        },
+    }
+
+
 @app.exception_handler(Exception)
 async def unhandled_exception_handler(request: Request, exc: Exception):
     logger.exception(
@@ -67,18 +153,7 @@ async def unhandled_exception_handler(request: Request, exc: Exception):
         },
     )
     request_id = getattr(request.state, "request_id", "unknown")
-    return JSONResponse(
-        status_code=500,
-        content={
-            "ok": False,
-            "request_id": request_id,
-            "error": {
-                "code": "INTERNAL_ERROR",
-                "message": "Internal server error",
-                "retryable": False,
-            },
-        },
-    )
+    return JSONResponse(status_code=500, content=_internal_error_payload(request_id))
 
 
 @app.exception_handler(DomainError)
@@ -134,35 +209,175 @@ async def _retrieve_context_with_limit(
     top_k: int,
     file_filter: str | None,
     timeout_seconds: float,
+    retrieval_mode: str = "vector",
+    stats: dict | None = None,
+    modules: list[str] | None = None,
+    module_contexts: dict | None = None,
 ) -> tuple[list[dict], str]:
-    await RETRIEVAL_SEMAPHORE.acquire()
-    task = asyncio.create_task(
-        asyncio.to_thread(
-            retrieve_context,
+    async def _retrieve() -> tuple[list[dict], str]:
+        shared = retrieve_context(
             collection=collection,
             query=query,
             top_k=top_k,
             file_filter=file_filter,
+            mode=retrieval_mode,
+            stats=stats,
+        )
+        if not modules or module_contexts is None:
+            return await shared
+        module_stats: dict = {}
+        result, focused = await asyncio.gather(
+            shared,
+            retrieve_module_contexts(
+                collection=collection,
+                query=query,
+                modules=modules,
+                top_k=top_k,
+                file_filter=file_filter,
+                mode=retrieval_mode,
+                stats=module_stats,
+            ),
+        )
+        module_contexts.update(focused)
+        if stats is not None:
+            stats.setdefault("modules", {}).update(module_stats)
+        return result
+
+    # Retrieval is natively async, so a timeout really cancels it and frees the slot right away.
+    async with RETRIEVAL_SEMAPHORE:
+        return await asyncio.wait_for(_retrieve(), timeout=timeout_seconds)
+
+
+async def _retrieve_module_contexts_with_limit(
+    *,
+    collection: str,
+    query: str,
+    modules: list[str],
+    top_k: int,
+    file_filter: str | None,
+    timeout_seconds: float,
+    retrieval_mode: str,
+    stats: dict,
+    module_contexts: dict,
+) -> None:
+    if not modules:
+        return
+    module_stats: dict = {}
+    async with RETRIEVAL_SEMAPHORE:
+        focused = await asyncio.wait_for(
+            retrieve_module_contexts(
+                collection=collection,
+                query=query,
+                modules=modules,
+                top_k=top_k,
+                file_filter=file_filter,
+                mode=retrieval_mode,
+                stats=module_stats,
+            ),
+            timeout=timeout_seconds,
         )
+    module_contexts.update(focused)
+    stats.setdefault("modules", {}).update(module_stats)
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+# Each model call takes one slot of the process-wide LLM limiter inside llm_client; these wrappers only time the stage.
+async def _timed_triage(*, context_text: str, user_query: str) -> tuple[dict, int, bool, float]:
+    start = time.perf_counter()
+    triage, retries, repaired = await run_triage(context_text=context_text, user_query=user_query)
+    return triage, retries, repaired, _elapsed_ms(start)
+
+
+async def _timed_module(*, module: str, context_text: str, user_query: str) -> tuple[dict, int, bool, float]:
+    start = time.perf_counter()
+    result, retries, repaired = await run_module_review(
+        module_name=module, context_text=context_text, user_query=user_query
     )
-    release_state = {"released": False}
+    return result, retries, repaired, _elapsed_ms(start)
+
+
+async def _timed_combined(
+    *, modules: list[str], context_text: str, user_query: str
+) -> dict[str, tuple[dict, int, bool, float]]:
+    start = time.perf_counter()
+    results = await run_multi_module_review(module_names=modules, context_text=context_text, user_query=user_query)
+    latency = _elapsed_ms(start)
+    return {module: (*run, latency) for module, run in results.items()}
+
+
+def _module_context_text(module: str, context_text: str, module_contexts: dict | None) -> str:
+    items, focused_text = (module_contexts or {}).get(module, ([], ""))
+    # Modules whose focused search found nothing still get the shared context.
+    return focused_text if items else context_text
+
+
+def _start_module_tasks(
+    *,
+    modules: list[str],
+    context_text: str,
+    user_query: str,
+    module_contexts: dict | None = None,
+    review_strategy: str = "per_module",
+) -> dict[str, asyncio.Task]:
+    if review_strategy == "combined" and modules:
+        # One LLM call reviews the whole batch; each module gets a task that picks its own section out of it.
+        combined = asyncio.create_task(
+            _timed_combined(modules=modules, context_text=context_text, user_query=user_query)
+        )
+
+        async def _module_section(module: str) -> tuple[dict, int, bool, float]:
+            return (await combined)[module]
+
+        return {module: asyncio.create_task(_module_section(module)) for module in modules}
+    return {
+        module: asyncio.create_task(
+            _timed_module(
+                module=module,
+                context_text=_module_context_text(module, context_text, module_contexts),
+                user_query=user_query,
+            )
+        )
+        for module in modules
+    }
+
+
+async def _cancel_tasks(tasks: list[asyncio.Task]) -> None:
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
 
-    def _release_once() -> None:
-        if not release_state["released"]:
-            RETRIEVAL_SEMAPHORE.release()
-            release_state["released"] = True
 
+async def _collect_module_tasks(
+    tasks: dict[str, asyncio.Task],
+    on_result: Callable[[str, tuple[dict, int, bool, float]], Awaitable[None]] | None = None,
+) -> dict[str, tuple[dict, int, bool, float]]:
+    module_by_task = {task: module for module, task in tasks.items()}
+    pending = set(tasks.values())
     try:
-        result = await asyncio.wait_for(task, timeout=timeout_seconds)
-        _release_once()
-        return result
-    except asyncio.TimeoutError:
-        # If timeout happens, the thread may still run. Release only when it actually completes.
-        task.add_done_callback(lambda _fut: _release_once())
-        raise
-    except Exception:
-        _release_once()
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                run = task.result()
+                if on_result is not None:
+                    await on_result(module_by_task[task], run)
+    except BaseException:
+        # One failed (or the request was cancelled): stop the siblings instead of paying for them.
+        await _cancel_tasks(list(tasks.values()))
         raise
+    return {module: task.result() for module, task in tasks.items()}
+
+
+def _speculative_modules(budget: int) -> list[str]:
+    count = min(settings.speculative_module_count, budget)
+    if count <= 0:
+        return []
+    ranked = [module for module, _ in RECOMMENDATION_COUNTS.most_common() if module in MODULES]
+    # Until triage history exists, fall back to the core deep-review modules.
+    ranked += [module for module in DEEP_MODULES if module not in ranked]
+    return ranked[:count]
 
 
 @app.get("/health", response_model=HealthResponse)
@@ -170,6 +385,25 @@ def health() -> HealthResponse:
     return HealthResponse(status="ok")
 
 
+@app.get("/metrics")
+def metrics(request: Request):
+    return {
+        "ok": True,
+        "request_id": request.state.request_id,
+        "analysis_cache": ANALYSIS_CACHE.stats(),
+        "singleflight": ANALYSIS_FLIGHTS.stats(),
+        "vectorstores": vectorstore_stats(),
+        "embedding_cache": embedding_cache_stats(),
+        "llm_response_cache": llm_response_cache_stats(),
+        "retrieval": retrieval_stats(),
+        "llm_limiter": llm_limiter_stats(),
+        "llm_rate_limits": rate_limit_stats(),
+        "llm_resilience": resilience_stats(),
+        "llm_hedging": hedging_stats(),
+        "jobs": {"queue_size": JOB_MANAGER.queue_size(), "workers": JOB_MANAGER.worker_count},
+    }
+
+
 @app.get("/")
 def frontend() -> FileResponse:
     return FileResponse(STATIC_DIR / "index.html")
@@ -219,22 +453,54 @@ def files(
     }
 
 
-@app.post("/analyze", response_model=AnalyzeResponse)
-async def analyze(request: Request, payload: AnalyzeRequest):
-    _ensure_openai_configured()
+def _resolve_limits(payload: AnalyzeRequest) -> tuple[int, int]:
+    return payload.top_k or settings.default_top_k, payload.budget_modules or settings.default_budget_modules
+
+
+async def _emit(on_event: AnalysisEventHandler | None, event: str, data: dict) -> None:
+    if on_event is not None:
+        await on_event(event, data)
+
+
+async def _run_analysis(
+    payload: AnalyzeRequest,
+    *,
+    request_id: str,
+    state: Any | None = None,
+    on_event: AnalysisEventHandler | None = None,
+) -> AnalyzeResponse:
+    state = state if state is not None else SimpleNamespace()
     start = time.perf_counter()
+    llm_usage = start_llm_usage()
+    llm_hedges = start_llm_hedges()
+    llm_cache_hits = start_llm_cache_hits()
+    json_repairs = start_json_repairs()
+    llm_models = start_llm_models()
+    set_llm_cache_bypass(payload.cache == "bypass")
     total_retry_count = 0
     json_repair_used = False
 
-    top_k = payload.top_k or settings.default_top_k
-    budget = payload.budget_modules or settings.default_budget_modules
-    request.state.collection = payload.collection
-    request.state.mode = payload.mode
-    request.state.top_k = top_k
-    request.state.budget_modules = budget
-    request.state.selected_modules = []
-    request.state.context_chars_used = 0
-    request.state.retry_count = 0
+    top_k, budget = _resolve_limits(payload)
+    state.collection = payload.collection
+    state.mode = payload.mode
+    state.top_k = top_k
+    state.budget_modules = budget
+    state.selected_modules = []
+    state.context_chars_used = 0
+    state.retry_count = 0
+    retrieval_info: dict = {}
+    module_contexts: dict[str, tuple[list[dict], str]] = {}
+    # Deep mode does not depend on triage, and targeted mode may speculate on the usual picks,
+    # so module reviews start alongside triage instead of after it.
+    speculative: list[str] = []
+    if payload.mode == "deep":
+        early_modules = DEEP_MODULES[:6]
+    elif payload.mode == "targeted" and payload.review_strategy == "per_module":
+        early_modules = speculative = _speculative_modules(budget)
+    else:
+        early_modules = []
+    # A combined review sends the shared context, so focused searches would never be used.
+    focused_retrieval = settings.module_retrieval_enabled and payload.review_strategy != "combined"
     try:
         context_items, context_text = await _retrieve_context_with_limit(
             collection=payload.collection,
@@ -242,6 +508,11 @@ async def analyze(request: Request, payload: AnalyzeRequest):
             top_k=top_k,
             file_filter=payload.file_filter,
             timeout_seconds=settings.retrieval_timeout_seconds,
+            retrieval_mode=payload.retrieval_mode,
+            stats=retrieval_info,
+            # Only modules that start before triage are searched up front; the rest wait for triage's picks.
+            modules=early_modules if focused_retrieval else [],
+            module_contexts=module_contexts,
         )
     except asyncio.TimeoutError as exc:
         raise UpstreamTimeoutError("Retrieval/embedding request timed out") from exc
@@ -251,43 +522,123 @@ async def analyze(request: Request, payload: AnalyzeRequest):
             raise FileFilterNoMatchError("No context found for provided file_filter")
         raise CollectionEmptyError("No context found in collection")
 
-    request.state.context_chars_used = len(context_text)
-    triage, triage_retries, triage_repaired = await run_triage(context_text=context_text, user_query=payload.query)
+    state.context_chars_used = len(context_text)
+    await _emit(
+        on_event,
+        "retrieval",
+        {
+            "context_items": len(context_items),
+            "context_chars_used": len(context_text),
+            "context_tokens_used": retrieval_info.get("context_tokens_used"),
+            "sources": [
+                {"source_file": item.get("source_file", "unknown"), "page": item.get("page", 0)}
+                for item in context_items
+            ],
+        },
+    )
+
+    module_tasks = _start_module_tasks(
+        modules=early_modules,
+        context_text=context_text,
+        user_query=payload.query,
+        module_contexts=module_contexts,
+        review_strategy=payload.review_strategy,
+    )
+
+    try:
+        triage, triage_retries, triage_repaired, triage_latency_ms = await _timed_triage(
+            context_text=context_text, user_query=payload.query
+        )
+    except BaseException:
+        await _cancel_tasks(list(module_tasks.values()))
+        raise
     total_retry_count += triage_retries
     json_repair_used = json_repair_used or triage_repaired
+    recommended = [m for m in triage.get("recommended_modules_to_run", []) if m in MODULES]
+    RECOMMENDATION_COUNTS.update(dict.fromkeys(recommended, 1))
+
     modules: dict = {}
+    module_latency_ms: dict[str, float] = {}
     selected_modules: list[str] = []
 
-    if payload.mode == "triage":
-        modules = {}
-    elif payload.mode == "targeted":
-        recommended = triage.get("recommended_modules_to_run", [])
-        selected_modules = [m for m in recommended if m in MODULES][:budget]
-        for module in selected_modules:
-            module_result, module_retries, module_repaired = await run_module_review(
-                module_name=module, context_text=context_text, user_query=payload.query
-            )
-            total_retry_count += module_retries
-            json_repair_used = json_repair_used or module_repaired
-            modules[module] = module_result
-    else:
-        selected_modules = DEEP_MODULES[:6]
-        for module in selected_modules:
-            module_result, module_retries, module_repaired = await run_module_review(
-                module_name=module, context_text=context_text, user_query=payload.query
+    if payload.mode == "targeted":
+        selected_modules = list(dict.fromkeys(recommended))[:budget]
+    elif payload.mode == "deep":
+        selected_modules = early_modules
+    state.selected_modules = selected_modules
+
+    speculative_cancelled = [m for m in module_tasks if m not in selected_modules]
+    await _cancel_tasks([module_tasks.pop(m) for m in speculative_cancelled])
+    pending = [m for m in selected_modules if m not in module_tasks]
+    if focused_retrieval:
+        try:
+            await _retrieve_module_contexts_with_limit(
+                collection=payload.collection,
+                query=payload.query,
+                modules=pending,
+                top_k=top_k,
+                file_filter=payload.file_filter,
+                timeout_seconds=settings.retrieval_timeout_seconds,
+                retrieval_mode=payload.retrieval_mode,
+                stats=retrieval_info,
+                module_contexts=module_contexts,
             )
+        except BaseException as exc:
+            await _cancel_tasks(list(module_tasks.values()))
+            if isinstance(exc, asyncio.TimeoutError):
+                raise UpstreamTimeoutError("Retrieval/embedding request timed out") from exc
+            raise
+    module_tasks.update(
+        _start_module_tasks(
+            modules=pending,
+            context_text=context_text,
+            user_query=payload.query,
+            module_contexts=module_contexts,
+            review_strategy=payload.review_strategy,
+        )
+    )
+
+    await _emit(
+        on_event,
+        "triage",
+        {"triage": triage, "selected_modules": selected_modules, "latency_ms": triage_latency_ms},
+    )
+
+    async def _on_module_done(module: str, run: tuple[dict, int, bool, float]) -> None:
+        module_result, _, _, latency = run
+        await _emit(on_event, "module", {"module": module, "result": module_result, "latency_ms": latency})
+
+    if selected_modules:
+        module_runs = await _collect_module_tasks(
+            {m: module_tasks[m] for m in selected_modules}, on_result=_on_module_done
+        )
+        for module, (module_result, module_retries, module_repaired, latency) in module_runs.items():
             total_retry_count += module_retries
             json_repair_used = json_repair_used or module_repaired
             modules[module] = module_result
+            module_latency_ms[module] = latency
 
-    request.state.selected_modules = selected_modules
-    request.state.retry_count = total_retry_count
+    state.retry_count = total_retry_count
     overall = compute_overall(modules)
     latency_ms = round((time.perf_counter() - start) * 1000, 2)
+    # Cancelled speculative modules may have finished a call; only the selected ones are reported.
+    stage_models = {
+        "triage": llm_models["triage"],
+        "modules": {module: llm_models["modules"].get(module) for module in selected_modules},
+        "repairs": dict(llm_models["repairs"]),
+        "escalations": {
+            module: reason for module, reason in llm_models["escalations"].items() if module in selected_modules
+        },
+    }
+    speculative_stats = {
+        "launched": speculative,
+        "used": [m for m in speculative if m in selected_modules],
+        "cancelled": speculative_cancelled,
+    }
     logger.info(
         "analysis_complete",
         extra={
-            "request_id": request.state.request_id,
+            "request_id": request_id,
             "latency_ms": latency_ms,
             "collection": payload.collection,
             "mode": payload.mode,
@@ -295,20 +646,284 @@ async def analyze(request: Request, payload: AnalyzeRequest):
             "budget_modules": budget,
             "selected_modules": selected_modules,
             "context_chars_used": len(context_text),
+            "context_tokens_used": retrieval_info.get("context_tokens_used"),
             "retry_count": total_retry_count,
             "retrieval_concurrency": settings.retrieval_concurrency,
+            "llm_limit": round(get_llm_limiter().limit, 2),
+            "module_latency_ms": module_latency_ms,
+            "speculative_modules": speculative_stats,
+            "llm_models": stage_models,
         },
     )
 
-    return AnalyzeResponse(
+    response = AnalyzeResponse(
         overall=overall,
         triage=triage,
         modules=modules,
         meta={
-            "request_id": request.state.request_id,
+            "request_id": request_id,
             "retry_count": total_retry_count,
             "json_repaired": json_repair_used,
+            "json_repairs": dict(json_repairs),
             "context_chars_used": len(context_text),
+            "context_tokens_used": retrieval_info.get("context_tokens_used"),
+            "context_tokens_remaining": retrieval_info.get("context_tokens_remaining"),
+            "context_dedup": retrieval_info.get("dedup"),
+            "module_context": {
+                module: (
+                    {**retrieval_info["modules"][module], "shared_context": False}
+                    if module_contexts.get(module, ([], ""))[0]
+                    else {
+                        "context_items": len(context_items),
+                        "context_tokens_used": retrieval_info.get("context_tokens_used"),
+                        "shared_context": True,
+                    }
+                )
+                for module in selected_modules
+            },
+            "retrieval_mode": payload.retrieval_mode,
+            "review_strategy": payload.review_strategy,
+            "llm_usage": dict(llm_usage),
+            "llm_hedges": dict(llm_hedges),
+            "llm_models": stage_models,
+            "llm_cache": {
+                "triage": llm_cache_hits.get("triage", False),
+                "modules": {module: llm_cache_hits.get(module, False) for module in selected_modules},
+            },
             "latency_ms": latency_ms,
+            "triage_latency_ms": triage_latency_ms,
+            "module_latency_ms": module_latency_ms,
+            "speculative_modules": speculative_stats,
+        },
+    )
+    return response
+
+
+def _analysis_cache_key(payload: AnalyzeRequest) -> str:
+    top_k, budget = _resolve_limits(payload)
+    return make_cache_key(
+        "analysis",
+        payload.collection,
+        get_collection_version(payload.collection),
+        " ".join(payload.query.split()),
+        payload.mode,
+        top_k,
+        payload.file_filter,
+        payload.retrieval_mode,
+        payload.review_strategy,
+        budget,
+        settings.model_name,
+        settings.triage_model,
+        settings.module_model,
+        settings.module_models,
+        settings.repair_model,
+        settings.llm_cascade_model,
+        settings.llm_cascade_min_evidence_ratio,
+        settings.llm_output_mode,
+        PROMPT_TEMPLATE_HASH,
+    )
+
+
+def _apply_response_state(state: Any | None, payload: AnalyzeRequest, response: AnalyzeResponse) -> None:
+    # Requests answered without running the pipeline still get their request_complete log fields.
+    if state is None:
+        return
+    top_k, budget = _resolve_limits(payload)
+    state.collection = payload.collection
+    state.mode = payload.mode
+    state.top_k = top_k
+    state.budget_modules = budget
+    state.selected_modules = list(response.modules)
+    state.context_chars_used = response.meta.get("context_chars_used", 0)
+    state.retry_count = 0
+
+
+async def _replay_events(on_event: AnalysisEventHandler | None, response: AnalyzeResponse) -> None:
+    # Cached and coalesced results ran no pipeline for this caller, so its progress events are replayed.
+    await _emit(
+        on_event,
+        "triage",
+        {
+            "triage": response.triage,
+            "selected_modules": list(response.modules),
+            "latency_ms": response.meta.get("triage_latency_ms"),
         },
     )
+    module_latency_ms = response.meta.get("module_latency_ms", {})
+    for module, module_result in response.modules.items():
+        await _emit(
+            on_event,
+            "module",
+            {"module": module, "result": module_result, "latency_ms": module_latency_ms.get(module)},
+        )
+
+
+async def _run_analysis_cached(
+    payload: AnalyzeRequest,
+    *,
+    request_id: str,
+    state: Any | None = None,
+    on_event: AnalysisEventHandler | None = None,
+) -> AnalyzeResponse:
+    start = time.perf_counter()
+    # The collection version is part of the key, so ingesting into a collection invalidates its entries.
+    # Reading the version and the cache's disk tier are file I/O, so both run off the event loop.
+    cache_key = await asyncio.to_thread(_analysis_cache_key, payload)
+    use_cache = settings.analysis_cache_enabled and payload.cache == "use"
+    cached = await asyncio.to_thread(ANALYSIS_CACHE.get, cache_key) if use_cache else None
+    if cached is not None:
+        response = AnalyzeResponse.model_validate(cached)
+        _apply_response_state(state, payload, response)
+        response.meta.update(
+            {
+                "request_id": request_id,
+                "cache": "hit",
+                "coalesced": False,
+                "cached_latency_ms": response.meta.get("latency_ms"),
+                "latency_ms": _elapsed_ms(start),
+            }
+        )
+        logger.info(
+            "analysis_cache_hit",
+            extra={
+                "request_id": request_id,
+                "latency_ms": response.meta["latency_ms"],
+                "collection": payload.collection,
+                "mode": payload.mode,
+            },
+        )
+        await _replay_events(on_event, response)
+        await _emit(on_event, "complete", {"overall": response.overall, "meta": response.meta})
+        return response
+
+    async def _execute() -> AnalyzeResponse:
+        result = await _run_analysis(payload, request_id=request_id, state=state, on_event=on_event)
+        if settings.analysis_cache_enabled:
+            # A bypass skips the lookup but still refreshes the entry with the fresh result.
+            await asyncio.to_thread(ANALYSIS_CACHE.set, cache_key, result.model_dump())
+        return result
+
+    # Only the caller that starts the run receives live progress; callers that join it get a replay.
+    # A bypass must not join a run that may answer from the LLM response cache, so the mode is part of the key.
+    shared_response, coalesced = await ANALYSIS_FLIGHTS.do(f"{cache_key}:{payload.cache}", _execute)
+    response = shared_response.model_copy(deep=True)
+    if coalesced:
+        _apply_response_state(state, payload, response)
+        await _replay_events(on_event, response)
+        response.meta["latency_ms"] = _elapsed_ms(start)
+        logger.info(
+            "analysis_coalesced",
+            extra={
+                "request_id": request_id,
+                "latency_ms": response.meta["latency_ms"],
+                "collection": payload.collection,
+                "mode": payload.mode,
+            },
+        )
+    response.meta["request_id"] = request_id
+    response.meta["coalesced"] = coalesced
+    if not settings.analysis_cache_enabled:
+        response.meta["cache"] = "disabled"
+    else:
+        response.meta["cache"] = "miss" if payload.cache == "use" else "bypass"
+    await _emit(on_event, "complete", {"overall": response.overall, "meta": response.meta})
+    return response
+
+
+def _format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/analyze", response_model=AnalyzeResponse)
+async def analyze(request: Request, payload: AnalyzeRequest):
+    _ensure_openai_configured()
+    return await _run_analysis_cached(payload, request_id=request.state.request_id, state=request.state)
+
+
+@app.post("/analyze/stream")
+async def analyze_stream(request: Request, payload: AnalyzeRequest):
+    _ensure_openai_configured()
+    request_id = request.state.request_id
+    start = time.perf_counter()
+    queue: asyncio.Queue[tuple[str, dict] | None] = asyncio.Queue()
+
+    async def _on_event(event: str, data: dict) -> None:
+        await queue.put((event, {"request_id": request_id, **data}))
+
+    async def _run() -> None:
+        try:
+            await _run_analysis_cached(payload, request_id=request_id, state=request.state, on_event=_on_event)
+        except DomainError as exc:
+            logger.warning(
+                "service_error",
+                extra={
+                    "request_id": request_id,
+                    "latency_ms": _elapsed_ms(start),
+                    "status_code": exc.http_status,
+                    "error_code": exc.code,
+                    "retryable": exc.retryable,
+                    "error_message": exc.message,
+                    "error_class": exc.__class__.__name__,
+                },
+            )
+            await queue.put(("error", exc.to_error_payload(request_id=request_id)))
+        except Exception as exc:
+            logger.exception(
+                "unhandled_error",
+                extra={
+                    "request_id": request_id,
+                    "latency_ms": _elapsed_ms(start),
+                    "error_class": exc.__class__.__name__,
+                    "error_code": "INTERNAL_ERROR",
+                    "retryable": False,
+                    "error_message": "Internal server error",
+                },
+            )
+            await queue.put(("error", _internal_error_payload(request_id)))
+        finally:
+            await queue.put(None)
+
+    async def _events():
+        task = asyncio.create_task(_run())
+        try:
+            while (item := await queue.get()) is not None:
+                event, data = item
+                yield _format_sse(event, data)
+        finally:
+            # Client went away mid-stream: stop paying for the remaining model calls.
+            await _cancel_tasks([task])
+
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/analyze/jobs", status_code=202)
+async def submit_analyze_job(request: Request, payload: AnalyzeRequest):
+    _ensure_openai_configured()
+    job = await JOB_MANAGER.submit(payload)
+    return {
+        "ok": True,
+        "request_id": request.state.request_id,
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "status_url": f"/analyze/jobs/{job['job_id']}",
+    }
+
+
+@app.get("/analyze/jobs/{job_id}")
+async def get_analyze_job(request: Request, job_id: str):
+    job = await JOB_MANAGER.get(job_id)
+    return {
+        "ok": True,
+        "request_id": request.state.request_id,
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "result": job["result"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
@@ -43,6 +43,20 @@ class ModuleReviewOutput(BaseModel):
     assumptions: list[str] = Field(default_factory=list)
 
 
+class CitedFindingItem(FindingItem):
+    evidence: list[str] = Field(default_factory=list)
+
+
+class CitedRecommendationItem(RecommendationItem):
+    evidence: list[str] = Field(default_factory=list)
+
+
+# What the model returns: evidence is a list of context IDs, expanded into EvidenceItem server-side.
+class CitedModuleReviewOutput(ModuleReviewOutput):
+    findings: list[CitedFindingItem] = Field(default_factory=list)
+    recommendations: list[CitedRecommendationItem] = Field(default_factory=list)
+
+
 class AnalyzeRequest(BaseModel):
     collection: str = "default"
     query: str = "Review this design for production readiness"
@@ -50,6 +64,9 @@ class AnalyzeRequest(BaseModel):
     top_k: int = Field(default=6, ge=1, le=20)
     file_filter: str | None = None
     budget_modules: int = Field(default=3, ge=1, le=9)
+    retrieval_mode: Literal["vector", "lexical", "hybrid"] = "vector"
+    review_strategy: Literal["per_module", "combined"] = "per_module"
+    cache: Literal["use", "bypass"] = "use"
 
 
 class HealthResponse(BaseModel):
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import re
+
+from langchain_core.documents import Document
+
+from app.ingest import _stable_chunk_id
+from app.lexical import tokenize
+from app.tokens import count_tokens, truncate_to_tokens
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+_HEADER_RE = re.compile(r"^\[id=(\S+) source_file=(.*) page=(-?\d+)\]\n(.*)$", re.MULTILINE)
+EVIDENCE_ID_LENGTH = 6
+
+
+def _split_sentences(text: str) -> list[str]:
+    return [sentence.strip() for sentence in _SENTENCE_RE.split(text) if sentence.strip()]
+
+
+def trim_to_relevant_span(text: str, query: str, max_tokens: int, model_name: str) -> str:
+    sentences = _split_sentences(text)
+    if not sentences:
+        return ""
+    if count_tokens(" ".join(sentences), model_name) <= max_tokens:
+        return " ".join(sentences)
+
+    query_terms = set(tokenize(query))
+    overlaps = [len(query_terms.intersection(tokenize(sentence))) for sentence in sentences]
+    best = max(range(len(sentences)), key=lambda index: overlaps[index])
+    sizes = [count_tokens(sentence, model_name) for sentence in sentences]
+    if sizes[best] > max_tokens:
+        return truncate_to_tokens(sentences[best], max_tokens, model_name)
+
+    # Grow whole sentences around the best match, preferring the more relevant neighbour, then the next one.
+    start, end, used = best, best + 1, sizes[best]
+    while True:
+        options = []
+        if start > 0 and used + sizes[start - 1] <= max_tokens:
+            options.append((overlaps[start - 1], 0, start - 1))
+        if end < len(sentences) and used + sizes[end] <= max_tokens:
+            options.append((overlaps[end], 1, end))
+        if not options:
+            break
+        _, _, index = max(options)
+        used += sizes[index]
+        if index < start:
+            start = index
+        else:
+            end = index + 1
+    return " ".join(sentences[start:end])
+
+
+def evidence_id(doc: Document, taken: set[str]) -> str:
+    # Short enough to cite cheaply; lengthened only if two chunks in one context share a prefix.
+    chunk_id = doc.id or _stable_chunk_id(
+        doc.metadata.get("source_file", "unknown"), int(doc.metadata.get("page", 0)), doc.page_content
+    )
+    digest = chunk_id.replace("-", "")
+    for size in range(EVIDENCE_ID_LENGTH, len(digest) + 1, 2):
+        candidate = f"E{digest[:size]}"
+        if candidate not in taken:
+            return candidate
+    return f"E{digest}{len(taken)}"
+
+
+def _render(item: dict) -> str:
+    return f"[id={item['id']} source_file={item['source_file']} page={item['page']}]\n{item['quote']}"
+
+
+def context_evidence(context_text: str) -> dict[str, dict]:
+    # Quotes never contain newlines (they are re-joined sentences), so each rendered item is two lines.
+    return {
+        match.group(1): {"source_file": match.group(2), "page": int(match.group(3)), "quote": match.group(4)}
+        for match in _HEADER_RE.finditer(context_text)
+    }
+
+
+def pack_context(
+    docs: list[Document],
+    *,
+    query: str,
+    max_items: int,
+    max_chunk_tokens: int,
+    max_context_tokens: int,
+    model_name: str,
+) -> tuple[list[dict], str, int]:
+    items: list[dict] = []
+    tokens_used = 0
+    separator_tokens = count_tokens("\n\n", model_name)
+
+    # Candidates arrive best first; a chunk that does not fit is skipped rather than ending the pack.
+    for doc in docs:
+        if len(items) >= max_items:
+            break
+        quote = trim_to_relevant_span(doc.page_content, query, max_chunk_tokens, model_name)
+        if not quote:
+            continue
+        item = {
+            "id": evidence_id(doc, {item["id"] for item in items}),
+            "source_file": doc.metadata.get("source_file", "unknown"),
+            "page": int(doc.metadata.get("page", 0)),
+            "quote": quote,
+        }
+        item_tokens = count_tokens(_render(item), model_name) + (separator_tokens if items else 0)
+        if tokens_used + item_tokens > max_context_tokens:
+            continue
+        items.append(item)
+        tokens_used += item_tokens
+
+    return items, "\n\n".join(_render(item) for item in items), tokens_used
@@ -1,3 +1,5 @@
+import hashlib
+
 MODULES = [
     "security",
     "reliability",
@@ -19,11 +21,15 @@ DEEP_MODULES = [
     "deployment_rollout",
 ]
 
-TRIAGE_PROMPT = """
+# Instructions and schema text are kept apart: in json_schema output mode the provider enforces the
+# schema, so only the instructions are sent.
+TRIAGE_INSTRUCTIONS = """
 You are a production-readiness triage auditor. You are not a chatbot.
 Use ONLY the provided context and do not invent missing details.
 If information is missing, add it to missing_info.
-Return JSON ONLY with this schema:
+"""
+
+TRIAGE_SCHEMA_TEXT = """Return JSON ONLY with this schema:
 {
   "high_risk_areas": [""],
   "missing_info": [""],
@@ -32,21 +38,66 @@ Return JSON ONLY with this schema:
 }
 """
 
-MODULE_PROMPT_TEMPLATE = """
+TRIAGE_PROMPT = TRIAGE_INSTRUCTIONS + TRIAGE_SCHEMA_TEXT
+
+MODULE_INSTRUCTIONS_TEMPLATE = """
 You are a strict system design reviewer for module: {module_name}.
 Use ONLY the provided context and never invent details.
-All evidence must cite source_file and page from context.
+Cite evidence by the id in each context item's header (for example E1a2b3c), never by quoting it.
+If unknown, include in missing_info.
+"""
+
+MODULE_SCHEMA_TEXT = """Return JSON ONLY with schema:
+{{
+  "score": 0,
+  "risk": "low|medium|high",
+  "findings":[{{"title":"","severity":"low|medium|high","details":"","impact":"",
+                "evidence":["<context id>"]}}],
+  "recommendations":[{{"title":"","effort":"low|medium|high","steps":[""],
+                     "evidence":["<context id>"]}}],
+  "questions_for_author":[""],
+  "missing_info":[""],
+  "assumptions":[""]
+}}
+"""
+
+MODULE_PROMPT_TEMPLATE = MODULE_INSTRUCTIONS_TEMPLATE + MODULE_SCHEMA_TEXT
+
+MULTI_MODULE_INSTRUCTIONS_TEMPLATE = """
+You are a strict system design reviewer. Review each of these modules separately: {module_names}.
+Use ONLY the provided context and never invent details.
+Cite evidence by the id in each context item's header (for example E1a2b3c), never by quoting it.
 If unknown, include in missing_info.
-Return JSON ONLY with schema:
+"""
+
+MULTI_MODULE_SCHEMA_TEXT = """Return JSON ONLY: one top-level key per module name listed above, each value with schema:
 {{
   "score": 0,
   "risk": "low|medium|high",
   "findings":[{{"title":"","severity":"low|medium|high","details":"","impact":"",
-                "evidence":[{{"source_file":"","page":0,"quote":""}}]}}],
+                "evidence":["<context id>"]}}],
   "recommendations":[{{"title":"","effort":"low|medium|high","steps":[""],
-                     "evidence":[{{"source_file":"","page":0,"quote":""}}]}}],
+                     "evidence":["<context id>"]}}],
   "questions_for_author":[""],
   "missing_info":[""],
   "assumptions":[""]
 }}
 """
+
+MULTI_MODULE_PROMPT_TEMPLATE = MULTI_MODULE_INSTRUCTIONS_TEMPLATE + MULTI_MODULE_SCHEMA_TEXT
+
+MODULE_RETRIEVAL_QUERIES = {
+    "security": "authentication authorization encryption secrets access control threat model PII audit logging",
+    "reliability": "failure modes retries timeouts failover redundancy SLO availability backups disaster recovery",
+    "scalability": "throughput load capacity sharding partitioning caching horizontal scaling bottlenecks p99 latency",
+    "api_contracts": "API endpoints request response schema versioning backward compatibility pagination errors",
+    "data_consistency": "transactions consistency idempotency key replication ordering duplicates outbox schema migration",
+    "deployment_rollout": "deployment rollout canary feature flags rollback migration release CI/CD environments",
+    "cost": "cost budget instance sizing storage egress pricing autoscaling reserved capacity spend",
+    "testing": "testing unit integration load tests contract tests test environments coverage chaos",
+    "tradeoffs": "tradeoffs alternatives considered decisions rationale constraints risks limitations",
+}
+
+PROMPT_TEMPLATE_HASH = hashlib.sha256(
+    (TRIAGE_PROMPT + MODULE_PROMPT_TEMPLATE + MULTI_MODULE_PROMPT_TEMPLATE + repr(sorted(MODULE_RETRIEVAL_QUERIES.items()))).encode("utf-8")
+).hexdigest()[:16]
@@ -1,35 +1,268 @@
 from __future__ import annotations
 
+import asyncio
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Literal, TypeVar
+
 from langchain_core.documents import Document
 
 from app.config import get_settings
-from app.store import get_vectorstore
+from app.dedup import mmr_order, suppress_duplicates
+from app.embeddings import aembed_queries_cached, aembed_query_cached
+from app.lexical import backfill_lexical_index, get_lexical_index, lexical_search
+from app.packing import pack_context
+from app.prompts import MODULE_RETRIEVAL_QUERIES
+from app.tokens import count_tokens
+from app.store import get_vectorstore, stored_chunks
 
+T = TypeVar("T")
+RetrievalMode = Literal["vector", "lexical", "hybrid"]
+
+RRF_K = 60
+
+_EXECUTOR_LOCK = threading.Lock()
+_EXECUTOR: ThreadPoolExecutor | None = None
+_STATS_LOCK = threading.Lock()
+_RETRIEVAL_STATS = {
+    "started": 0,
+    "completed": 0,
+    "abandoned": 0,
+    "blocking_in_flight": 0,
+    "abandoned_still_running": 0,
+}
+
+
+def _executor() -> ThreadPoolExecutor:
+    # Blocking vector queries get their own bounded pool instead of the loop's shared default executor.
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(
+                max_workers=get_settings().retrieval_executor_workers,
+                thread_name_prefix="retrieval",
+            )
+        return _EXECUTOR
+
+
+def shutdown_retrieval_executor() -> None:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        executor, _EXECUTOR = _EXECUTOR, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _bump(stat: str, delta: int = 1) -> None:
+    with _STATS_LOCK:
+        _RETRIEVAL_STATS[stat] += delta
 
-def retrieve_context(collection: str, query: str, top_k: int, file_filter: str | None = None) -> tuple[list[dict], str]:
-    settings = get_settings()
-    vectorstore = get_vectorstore(collection, require_embeddings=True)
 
+def retrieval_stats() -> dict:
+    with _STATS_LOCK:
+        stats = dict(_RETRIEVAL_STATS)
+    stats["executor_workers"] = get_settings().retrieval_executor_workers
+    return stats
+
+
+async def _run_blocking(fn: Callable[..., T], *args: Any) -> T:
+    state = {"started": False, "finished": False, "abandoned": False}
+
+    def _tracked() -> T:
+        with _STATS_LOCK:
+            state["started"] = True
+            _RETRIEVAL_STATS["blocking_in_flight"] += 1
+        try:
+            return fn(*args)
+        finally:
+            with _STATS_LOCK:
+                _RETRIEVAL_STATS["blocking_in_flight"] -= 1
+
+    def _finished(_future: Future) -> None:
+        # Settled when the future resolves, so a cancel landing between fn returning and the result
+        # being set is either seen as finished or undone here; it never stays counted as running.
+        with _STATS_LOCK:
+            state["finished"] = True
+            if state["abandoned"]:
+                _RETRIEVAL_STATS["abandoned_still_running"] -= 1
+
+    future = _executor().submit(_tracked)
+    future.add_done_callback(_finished)
+    try:
+        return await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+        # A query that already started cannot be interrupted; it finishes on the retrieval pool.
+        with _STATS_LOCK:
+            if state["started"] and not state["finished"]:
+                state["abandoned"] = True
+                _RETRIEVAL_STATS["abandoned_still_running"] += 1
+        raise
+
+
+def _search_by_vector(
+    collection: str, query_embedding: list[float], top_k: int, file_filter: str | None
+) -> list[Document]:
+    vectorstore = get_vectorstore(collection, require_embeddings=True)
     filters = {"source_file": file_filter} if file_filter else None
-    docs: list[Document] = vectorstore.similarity_search(query=query, k=top_k, filter=filters)
-
-    context_items: list[dict] = []
-    total_chars = 0
-
-    for doc in docs:
-        quote = doc.page_content[: settings.max_chunk_chars]
-        if total_chars + len(quote) > settings.max_context_chars:
-            break
-        total_chars += len(quote)
-        context_items.append(
-            {
-                "source_file": doc.metadata.get("source_file", "unknown"),
-                "page": int(doc.metadata.get("page", 0)),
-                "quote": quote,
-            }
+    return vectorstore.similarity_search_by_vector(embedding=query_embedding, k=top_k, filter=filters)
+
+
+async def _vector_docs(
+    collection: str,
+    query: str,
+    top_k: int,
+    file_filter: str | None,
+    query_embedding: list[float] | None = None,
+) -> list[Document]:
+    if query_embedding is None:
+        query_embedding = await aembed_query_cached(query)
+    return await _run_blocking(_search_by_vector, collection, query_embedding, top_k, file_filter)
+
+
+def _search_lexical(
+    collection: str, query: str, top_k: int, file_filter: str | None
+) -> list[tuple[Document, float]]:
+    if get_lexical_index(collection) is None:
+        vectorstore = get_vectorstore(collection, require_embeddings=False)
+        backfill_lexical_index(collection, lambda: stored_chunks(vectorstore))
+    return lexical_search(collection, query, top_k, file_filter)
+
+
+async def _lexical_docs(collection: str, query: str, top_k: int, file_filter: str | None) -> list[Document]:
+    results = await _run_blocking(_search_lexical, collection, query, top_k, file_filter)
+    return [doc for doc, _score in results]
+
+
+def _doc_key(doc: Document) -> str | tuple:
+    return doc.id or (doc.metadata.get("source_file"), doc.metadata.get("page"), doc.page_content)
+
+
+def reciprocal_rank_fusion(rankings: list[list[Document]], top_k: int) -> list[Document]:
+    scores: dict[str | tuple, float] = {}
+    docs: dict[str | tuple, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            key = _doc_key(doc)
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1 / (RRF_K + rank + 1)
+    ranked = sorted(scores, key=lambda key: scores[key], reverse=True)
+    return [docs[key] for key in ranked[:top_k]]
+
+
+async def _candidate_docs(
+    collection: str,
+    query: str,
+    candidates: int,
+    file_filter: str | None,
+    mode: RetrievalMode,
+    query_embedding: list[float] | None = None,
+) -> list[Document]:
+    if mode == "lexical":
+        return await _lexical_docs(collection, query, candidates, file_filter)
+    if mode == "hybrid":
+        vector_docs, lexical_docs = await asyncio.gather(
+            _vector_docs(collection, query, candidates, file_filter, query_embedding),
+            _lexical_docs(collection, query, candidates, file_filter),
         )
+        return reciprocal_rank_fusion([vector_docs, lexical_docs], candidates)
+    return await _vector_docs(collection, query, candidates, file_filter, query_embedding)
 
-    context_text = "\n\n".join(
-        f"[source_file={item['source_file']} page={item['page']}]\n{item['quote']}" for item in context_items
+
+def _build_context(
+    docs: list[Document], query: str, top_k: int, stats: dict, max_context_tokens: int | None = None
+) -> tuple[list[dict], str, int]:
+    settings = get_settings()
+    removed: list[str] = []
+    if settings.retrieval_dedup_enabled:
+        docs, removed = suppress_duplicates(docs, settings.retrieval_dedup_threshold)
+    if settings.retrieval_mmr_lambda is not None:
+        docs = mmr_order(docs, settings.retrieval_mmr_lambda)
+    # Sizes are of the removed candidate text, before trimming and budgeting, not of context actually saved.
+    stats["dedup"] = {
+        "chunks_removed": len(removed),
+        "candidate_chars_removed": sum(len(text) for text in removed),
+        "candidate_tokens_removed": sum(count_tokens(text, settings.model_name) for text in removed),
+    }
+    return pack_context(
+        docs,
+        query=query,
+        max_items=top_k,
+        max_chunk_tokens=settings.max_chunk_tokens,
+        max_context_tokens=max_context_tokens or settings.max_context_tokens,
+        model_name=settings.model_name,
     )
+
+
+async def retrieve_context(
+    collection: str,
+    query: str,
+    top_k: int,
+    file_filter: str | None = None,
+    mode: RetrievalMode = "vector",
+    stats: dict | None = None,
+) -> tuple[list[dict], str]:
+    settings = get_settings()
+    # Over-fetch so chunks that do not fit the token budget can be replaced by smaller ones.
+    candidates = top_k * max(settings.retrieval_overfetch_factor, 1)
+    _bump("started")
+    try:
+        docs = await _candidate_docs(collection, query, candidates, file_filter, mode)
+        build_stats: dict = {}
+        context_items, context_text, tokens_used = await _run_blocking(
+            _build_context, docs, query, top_k, build_stats
+        )
+    except asyncio.CancelledError:
+        _bump("abandoned")
+        raise
+    _bump("completed")
+    if stats is not None:
+        stats["context_tokens_used"] = tokens_used
+        stats["context_tokens_remaining"] = max(settings.max_context_tokens - tokens_used, 0)
+        stats["candidates_considered"] = len(docs)
+        stats.update(build_stats)
     return context_items, context_text
+
+
+def module_query(module: str, query: str) -> str:
+    return f"{query} {MODULE_RETRIEVAL_QUERIES.get(module, module.replace('_', ' '))}"
+
+
+async def retrieve_module_contexts(
+    collection: str,
+    query: str,
+    modules: list[str],
+    top_k: int,
+    file_filter: str | None = None,
+    mode: RetrievalMode = "vector",
+    stats: dict | None = None,
+) -> dict[str, tuple[list[dict], str]]:
+    settings = get_settings()
+    module_top_k = min(top_k, settings.module_context_top_k)
+    candidates = module_top_k * max(settings.retrieval_overfetch_factor, 1)
+    queries = [module_query(module, query) for module in modules]
+    _bump("started")
+    try:
+        # Every module query is embedded in one request; the per-module searches then run side by side.
+        embeddings = await aembed_queries_cached(queries) if mode != "lexical" else [None] * len(queries)
+        docs_by_module = await asyncio.gather(
+            *(
+                _candidate_docs(collection, module_text, candidates, file_filter, mode, embedding)
+                for module_text, embedding in zip(queries, embeddings)
+            )
+        )
+        contexts: dict[str, tuple[list[dict], str]] = {}
+        module_stats: dict[str, dict] = {}
+        for module, module_text, docs in zip(modules, queries, docs_by_module):
+            items, text, tokens_used = await _run_blocking(
+                _build_context, docs, module_text, module_top_k, {}, settings.module_context_tokens
+            )
+            contexts[module] = (items, text)
+            module_stats[module] = {"context_items": len(items), "context_tokens_used": tokens_used}
+    except asyncio.CancelledError:
+        _bump("abandoned")
+        raise
+    _bump("completed")
+    if stats is not None:
+        stats.update(module_stats)
+    return contexts
@@ -1,52 +1,270 @@
 from __future__ import annotations
 
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
 from langchain_openai import ChatOpenAI
+from openai import BadRequestError
 
+from app.clients import get_chat_model
 from app.config import get_settings
-from app.errors import PayloadValidationError
-from app.llm_client import invoke_json_with_retries
-from app.models import ModuleReviewOutput, TriageOutput
-from app.prompts import MODULE_PROMPT_TEMPLATE, TRIAGE_PROMPT
+from app.errors import ModelOutputError, PayloadValidationError, UpstreamModelError
+from app.llm_client import (
+    invoke_json_with_retries,
+    invoke_keyed_json_with_retries,
+    json_schema_response_format,
+    keyed_json_schema_response_format,
+    record_escalation,
+    record_stage_model,
+)
+from app.models import CitedModuleReviewOutput, ModuleReviewOutput, TriageOutput
+from app.packing import context_evidence
+from app.prompts import (
+    MODULES,
+    MODULE_INSTRUCTIONS_TEMPLATE,
+    MODULE_PROMPT_TEMPLATE,
+    MULTI_MODULE_INSTRUCTIONS_TEMPLATE,
+    MULTI_MODULE_PROMPT_TEMPLATE,
+    TRIAGE_INSTRUCTIONS,
+    TRIAGE_PROMPT,
+)
+
+logger = logging.getLogger(__name__)
+
+ReviewResult = TypeVar("ReviewResult")
+
+# Models that rejected a json_schema response_format; they stay on text mode for the life of the process.
+_JSON_SCHEMA_UNSUPPORTED: set[str] = set()
+
 
-def _build_llm() -> ChatOpenAI:
+def _build_llm(model_name: str | None = None) -> ChatOpenAI:
     settings = get_settings()
     if not settings.openai_api_key:
         raise PayloadValidationError("OPENAI_API_KEY is required for analysis operations")
-    return ChatOpenAI(model=settings.model_name, api_key=settings.openai_api_key, temperature=0, max_retries=0)
+    return get_chat_model(model_name or settings.model_name)
 
 
-async def run_triage(context_text: str, user_query: str) -> tuple[dict, int, bool]:
-    llm = _build_llm()
+def triage_model() -> str:
+    settings = get_settings()
+    return settings.triage_model or settings.model_name
+
+
+def module_model(module_name: str | None = None) -> str:
     settings = get_settings()
-    prompt = (
-        f"{TRIAGE_PROMPT}\n\n"
-        f"User query:\n{user_query}\n\n"
-        f"Retrieved context:\n{context_text}\n"
+    return settings.module_models.get(module_name or "") or settings.module_model or settings.model_name
+
+
+def _repair_llm() -> ChatOpenAI | None:
+    repair_model = get_settings().repair_model
+    return _build_llm(repair_model) if repair_model else None
+
+
+def _uses_json_schema(model_name: str) -> bool:
+    return get_settings().llm_output_mode == "json_schema" and model_name not in _JSON_SCHEMA_UNSUPPORTED
+
+
+def _rejected_response_format(exc: UpstreamModelError) -> bool:
+    cause = exc.__cause__
+    return isinstance(cause, BadRequestError) and "response_format" in str(cause)
+
+
+async def _with_output_mode(
+    model_name: str,
+    structured: Callable[[], Awaitable[ReviewResult]],
+    text: Callable[[], Awaitable[ReviewResult]],
+) -> ReviewResult:
+    if _uses_json_schema(model_name):
+        try:
+            return await structured()
+        except UpstreamModelError as exc:
+            if not _rejected_response_format(exc):
+                raise
+            _JSON_SCHEMA_UNSUPPORTED.add(model_name)
+            logger.warning("structured_output_unsupported", extra={"model_name": model_name})
+    # The repair model only sees the prompt, so only text mode, whose prompt carries the schema text, uses it.
+    return await text()
+
+
+async def _invoke_review(
+    *,
+    instructions: str,
+    text_prompt: str,
+    user_query: str,
+    context_text: str,
+    schema: type[TriageOutput] | type[CitedModuleReviewOutput],
+    cache_label: str,
+    model_name: str,
+    remote_repair: bool = True,
+    enums: dict[str, list[str]] | None = None,
+) -> tuple[dict, int, bool]:
+    llm = _build_llm(model_name)
+    settings = get_settings()
+    body = f"User query:\n{user_query}\n\nRetrieved context:\n{context_text}\n"
+    options = {
+        "schema": schema,
+        "timeout_seconds": settings.llm_timeout_seconds,
+        "max_retries": settings.llm_max_retries,
+        "base_backoff_seconds": settings.llm_retry_base_backoff_seconds,
+        "cache_label": cache_label,
+        "remote_repair": remote_repair,
+    }
+    return await _with_output_mode(
+        model_name,
+        lambda: invoke_json_with_retries(
+            llm=llm.bind(response_format=json_schema_response_format(schema, enums)),
+            prompt=f"{instructions}\n\n{body}",
+            **options,
+        ),
+        lambda: invoke_json_with_retries(
+            llm=llm, prompt=f"{text_prompt}\n\n{body}", repair_llm=_repair_llm(), **options
+        ),
     )
-    return await invoke_json_with_retries(
-        llm=llm,
-        prompt=prompt,
+
+
+async def run_triage(context_text: str, user_query: str) -> tuple[dict, int, bool]:
+    model_name = triage_model()
+    result = await _invoke_review(
+        instructions=TRIAGE_INSTRUCTIONS,
+        text_prompt=TRIAGE_PROMPT,
+        user_query=user_query,
+        context_text=context_text,
         schema=TriageOutput,
-        timeout_seconds=settings.llm_timeout_seconds,
-        max_retries=settings.llm_max_retries,
-        base_backoff_seconds=settings.llm_retry_base_backoff_seconds,
+        cache_label="triage",
+        model_name=model_name,
+        # The instructions alone do not name the modules; the schema enum is what lists them.
+        enums={"recommended_modules_to_run": MODULES},
+    )
+    record_stage_model("triage", model_name)
+    return result
+
+
+def _citation_key(raw: str) -> str:
+    return raw.strip().strip("[]").removeprefix("id=").strip()
+
+
+def expand_evidence(review: dict, evidence_by_id: dict[str, dict]) -> dict:
+    # Unknown IDs are dropped rather than guessed, so every returned quote really came from the context.
+    expanded = dict(review)
+    for section in ("findings", "recommendations"):
+        expanded[section] = [
+            {
+                **item,
+                "evidence": [
+                    evidence_by_id[key]
+                    for key in dict.fromkeys(_citation_key(raw) for raw in item.get("evidence", []))
+                    if key in evidence_by_id
+                ],
+            }
+            for item in review.get(section, [])
+        ]
+    return ModuleReviewOutput.model_validate(expanded).model_dump()
+
+
+def evidence_ratio(review: dict) -> float:
+    findings = review.get("findings", [])
+    if not findings:
+        return 1.0
+    return sum(1 for finding in findings if finding.get("evidence")) / len(findings)
+
+
+async def _review_module(
+    module_name: str, context_text: str, user_query: str, model_name: str, remote_repair: bool = True
+) -> tuple[dict, int, bool]:
+    return await _invoke_review(
+        instructions=MODULE_INSTRUCTIONS_TEMPLATE.format(module_name=module_name),
+        text_prompt=MODULE_PROMPT_TEMPLATE.format(module_name=module_name),
+        user_query=user_query,
+        context_text=context_text,
+        schema=CitedModuleReviewOutput,
+        cache_label=module_name,
+        model_name=model_name,
+        remote_repair=remote_repair,
     )
 
 
 async def run_module_review(module_name: str, context_text: str, user_query: str) -> tuple[dict, int, bool]:
-    llm = _build_llm()
     settings = get_settings()
-    module_prompt = MODULE_PROMPT_TEMPLATE.format(module_name=module_name)
-    prompt = (
-        f"{module_prompt}\n\n"
-        f"User query:\n{user_query}\n\n"
-        f"Retrieved context:\n{context_text}\n"
+    evidence_by_id = context_evidence(context_text)
+    model_name = module_model(module_name)
+    cascade_model = settings.llm_cascade_model
+    retries = 0
+    escalated_invalid = False
+    if cascade_model and cascade_model != model_name:
+        # The fast model's answer stands unless it is unusable or too thinly supported by cited evidence.
+        try:
+            review, retries, repaired = await _review_module(
+                module_name, context_text, user_query, cascade_model, remote_repair=False
+            )
+        except ModelOutputError:
+            reason = "invalid_output"
+            escalated_invalid = True
+        else:
+            review = expand_evidence(review, evidence_by_id)
+            if evidence_ratio(review) >= settings.llm_cascade_min_evidence_ratio:
+                record_stage_model(module_name, cascade_model)
+                return review, retries, repaired
+            reason = "low_evidence"
+        record_escalation(module_name, reason)
+        logger.info(
+            "cascade_escalated",
+            extra={
+                "module_name": module_name,
+                "cascade_model": cascade_model,
+                "model_name": model_name,
+                "escalation_reason": reason,
+            },
+        )
+    review, module_retries, repaired = await _review_module(module_name, context_text, user_query, model_name)
+    record_stage_model(module_name, model_name)
+    return expand_evidence(review, evidence_by_id), retries + module_retries, repaired or escalated_invalid
+
+
+async def run_multi_module_review(
+    module_names: list[str], context_text: str, user_query: str
+) -> dict[str, tuple[dict, int, bool]]:
+    # One call serves the whole batch, so it uses the shared module model rather than per-module overrides.
+    model_name = module_model()
+    llm = _build_llm(model_name)
+    settings = get_settings()
+    module_list = ", ".join(module_names)
+    body = f"User query:\n{user_query}\n\nRetrieved context:\n{context_text}\n"
+    options = {
+        "keys": module_names,
+        "schema": CitedModuleReviewOutput,
+        "timeout_seconds": settings.llm_timeout_seconds,
+        "max_retries": settings.llm_max_retries,
+        "base_backoff_seconds": settings.llm_retry_base_backoff_seconds,
+    }
+    valid, invalid, retries, repaired = await _with_output_mode(
+        model_name,
+        lambda: invoke_keyed_json_with_retries(
+            llm=llm.bind(response_format=keyed_json_schema_response_format(CitedModuleReviewOutput, module_names)),
+            prompt=f"{MULTI_MODULE_INSTRUCTIONS_TEMPLATE.format(module_names=module_list)}\n\n{body}",
+            **options,
+        ),
+        lambda: invoke_keyed_json_with_retries(
+            llm=llm,
+            prompt=f"{MULTI_MODULE_PROMPT_TEMPLATE.format(module_names=module_list)}\n\n{body}",
+            repair_llm=_repair_llm(),
+            **options,
+        ),
     )
-    return await invoke_json_with_retries(
-        llm=llm,
-        prompt=prompt,
-        schema=ModuleReviewOutput,
-        timeout_seconds=settings.llm_timeout_seconds,
-        max_retries=settings.llm_max_retries,
-        base_backoff_seconds=settings.llm_retry_base_backoff_seconds,
+    for module in valid:
+        record_stage_model(module, model_name)
+    # Only the sections that failed validation are asked for again, each on the per-module path.
+    rerun = await asyncio.gather(
+        *(run_module_review(module_name=module, context_text=context_text, user_query=user_query) for module in invalid)
     )
+    evidence_by_id = context_evidence(context_text)
+    results: dict[str, tuple[dict, int, bool]] = {
+        module: (expand_evidence(valid[module], evidence_by_id), 0, False) for module in valid
+    }
+    for module, (result, module_retries, _) in zip(invalid, rerun):
+        results[module] = (result, module_retries, True)
+    # The shared call's retries and repair are reported once, against the first module of the batch.
+    first = module_names[0]
+    result, module_retries, module_repaired = results[first]
+    results[first] = (result, module_retries + retries, module_repaired or repaired)
+    return {module: results[module] for module in module_names}
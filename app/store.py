@@ -1,23 +1,129 @@
 from __future__ import annotations
 
+import json
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
 from langchain_chroma import Chroma
+from langchain_core.documents import Document
 from langchain_openai import OpenAIEmbeddings
 
+from app.clients import get_embeddings_client
 from app.config import get_settings
+from app.lexical import delete_lexical_index
 
 
 def get_embeddings() -> OpenAIEmbeddings:
     settings = get_settings()
     if not settings.openai_api_key:
         raise ValueError("OPENAI_API_KEY is required for embedding operations")
-    return OpenAIEmbeddings(model=settings.embedding_model, api_key=settings.openai_api_key)
+    return get_embeddings_client()
+
+
+_VECTORSTORES: OrderedDict[tuple[str, str, bool], Chroma] = OrderedDict()
+_VECTORSTORES_LOCK = threading.Lock()
+_VECTORSTORE_STATS = {"opens": 0, "hits": 0, "evictions": 0, "invalidations": 0, "open_ms_total": 0.0}
 
 
 def get_vectorstore(collection: str, require_embeddings: bool = True) -> Chroma:
     settings = get_settings()
+    key = (str(settings.chroma_dir), collection, require_embeddings)
+    with _VECTORSTORES_LOCK:
+        vectorstore = _VECTORSTORES.get(key)
+        if vectorstore is not None:
+            _VECTORSTORES.move_to_end(key)
+            _VECTORSTORE_STATS["hits"] += 1
+            return vectorstore
+
+    start = time.perf_counter()
     embedding_fn = get_embeddings() if require_embeddings else None
-    return Chroma(
+    opened = Chroma(
         collection_name=collection,
         embedding_function=embedding_fn,
         persist_directory=str(settings.chroma_dir),
     )
+    open_ms = (time.perf_counter() - start) * 1000
+
+    with _VECTORSTORES_LOCK:
+        _VECTORSTORE_STATS["opens"] += 1
+        _VECTORSTORE_STATS["open_ms_total"] += open_ms
+        # Another thread may have opened the same collection meanwhile; keep the first one.
+        vectorstore = _VECTORSTORES.setdefault(key, opened)
+        _VECTORSTORES.move_to_end(key)
+        while len(_VECTORSTORES) > max(settings.vectorstore_cache_size, 1):
+            _VECTORSTORES.popitem(last=False)
+            _VECTORSTORE_STATS["evictions"] += 1
+    return vectorstore
+
+
+def invalidate_vectorstore(collection: str) -> None:
+    with _VECTORSTORES_LOCK:
+        for key in [key for key in _VECTORSTORES if key[1] == collection]:
+            del _VECTORSTORES[key]
+            _VECTORSTORE_STATS["invalidations"] += 1
+
+
+def clear_vectorstores() -> None:
+    with _VECTORSTORES_LOCK:
+        _VECTORSTORES.clear()
+
+
+def stored_chunks(vectorstore: Chroma) -> tuple[list[Document], list[str]]:
+    stored = vectorstore.get(include=["documents", "metadatas"])
+    docs = [
+        Document(page_content=text or "", metadata=metadata or {})
+        for text, metadata in zip(stored.get("documents") or [], stored.get("metadatas") or [])
+    ]
+    return docs, list(stored.get("ids") or [])
+
+
+def delete_collection(collection: str) -> None:
+    get_vectorstore(collection, require_embeddings=False).delete_collection()
+    invalidate_vectorstore(collection)
+    delete_lexical_index(collection)
+    bump_collection_version(collection)
+
+
+def vectorstore_stats() -> dict:
+    with _VECTORSTORES_LOCK:
+        stats = dict(_VECTORSTORE_STATS)
+        stats["cached"] = len(_VECTORSTORES)
+    avg_open_ms = stats["open_ms_total"] / stats["opens"] if stats["opens"] else 0.0
+    stats["open_ms_total"] = round(stats["open_ms_total"], 2)
+    stats["avg_open_ms"] = round(avg_open_ms, 2)
+    # Every hit skipped one open, so the saving is estimated from the observed open cost.
+    stats["setup_ms_saved"] = round(stats["hits"] * avg_open_ms, 2)
+    return stats
+
+
+_VERSIONS_LOCK = threading.Lock()
+
+
+def _versions_path() -> Path:
+    return get_settings().chroma_dir / "collection_versions.json"
+
+
+def _read_versions() -> dict[str, int]:
+    path = _versions_path()
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def get_collection_version(collection: str) -> int:
+    with _VERSIONS_LOCK:
+        return int(_read_versions().get(collection, 0))
+
+
+def bump_collection_version(collection: str) -> int:
+    # Content version of a collection; anything keyed on it goes stale once documents change.
+    with _VERSIONS_LOCK:
+        versions = _read_versions()
+        versions[collection] = int(versions.get(collection, 0)) + 1
+        path = _versions_path()
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(versions), encoding="utf-8")
+        tmp_path.replace(path)
+        return versions[collection]
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import logging
+import math
+import threading
+import time
+from collections.abc import Iterable
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# Rough OpenAI average for English prose, used when no tokenizer encoding is available locally.
+CHARS_PER_TOKEN = 4
+# A failed encoding load is retried after this long instead of being remembered for the process lifetime.
+ENCODING_RETRY_SECONDS = 300.0
+
+_ENCODINGS_LOCK = threading.Lock()
+_ENCODINGS: dict[str, Any] = {}
+_ENCODING_FAILURES: dict[str, float] = {}
+
+
+def _load_encoding(model_name: str) -> Any:
+    import tiktoken
+
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def _encoding(model_name: str) -> Any | None:
+    encoding = _ENCODINGS.get(model_name)
+    if encoding is not None:
+        return encoding
+    with _ENCODINGS_LOCK:
+        encoding = _ENCODINGS.get(model_name)
+        if encoding is not None:
+            return encoding
+        failed_at = _ENCODING_FAILURES.get(model_name)
+        if failed_at is not None and time.monotonic() - failed_at < ENCODING_RETRY_SECONDS:
+            return None
+        try:
+            encoding = _load_encoding(model_name)
+        except Exception as exc:
+            # tiktoken downloads encodings on first use; offline hosts fall back to the estimate for a while.
+            _ENCODING_FAILURES[model_name] = time.monotonic()
+            logger.warning("tokenizer_unavailable", extra={"error_class": exc.__class__.__name__})
+            return None
+        _ENCODING_FAILURES.pop(model_name, None)
+        _ENCODINGS[model_name] = encoding
+        return encoding
+
+
+def preload_encodings(model_names: Iterable[str]) -> None:
+    # Loading (and possibly downloading) an encoding is slow, so startup pays for it instead of a request.
+    for model_name in dict.fromkeys(model_names):
+        _encoding(model_name)
+
+
+def count_tokens(text: str, model_name: str) -> int:
+    encoding = _encoding(model_name)
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model_name: str) -> str:
+    if max_tokens <= 0:
+        return ""
+    encoding = _encoding(model_name)
+    if encoding is None:
+        return text[: max_tokens * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
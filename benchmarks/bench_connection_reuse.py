@@ -0,0 +1,65 @@
+"""Compare per-call ChatOpenAI construction with the shared pooled client.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_connection_reuse --calls 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import os
+import time
+
+from langchain_openai import ChatOpenAI
+
+from benchmarks.stub_server import StubOpenAIServer
+
+
+async def _fresh_client_per_call(base_url: str, calls: int) -> None:
+    for _ in range(calls):
+        llm = ChatOpenAI(model="stub", api_key="stub", base_url=base_url, temperature=0, max_retries=0)
+        await llm.ainvoke("ping")
+    # Let the discarded clients close their sockets while the loop is still running.
+    del llm
+    gc.collect()
+    await asyncio.sleep(0.1)
+
+
+async def _shared_client(calls: int) -> None:
+    from app.clients import close_clients, get_chat_model
+
+    try:
+        for _ in range(calls):
+            await get_chat_model("stub").ainvoke("ping")
+    finally:
+        await close_clients()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=50)
+    args = parser.parse_args()
+
+    with StubOpenAIServer() as server:
+        start = time.perf_counter()
+        asyncio.run(_fresh_client_per_call(server.base_url, args.calls))
+        fresh_ms = (time.perf_counter() - start) * 1000
+        fresh_connections = server.connections
+
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        start = time.perf_counter()
+        asyncio.run(_shared_client(args.calls))
+        shared_ms = (time.perf_counter() - start) * 1000
+        shared_connections = server.connections - fresh_connections
+
+    print(f"calls per mode:          {args.calls}")
+    print(f"fresh client per call:   {fresh_connections:4d} connections  {fresh_ms:8.1f} ms")
+    print(f"shared pooled client:    {shared_connections:4d} connections  {shared_ms:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Compare one embeddings request per query with cross-request micro-batching.
+
+Uses an in-process fake embeddings backend with a fixed per-request cost and a
+cap on concurrent upstream requests (standing in for the provider's request
+rate limit and the client connection pool), so no network is involved. Run from the repository root:
+
+    python -m benchmarks.bench_embedding_batching --queries 400 --concurrency 16
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+
+from app.embeddings import EmbeddingBatcher
+
+
+class FakeEmbeddingsBackend:
+    def __init__(self, request_ms: float, per_text_ms: float, upstream_concurrency: int):
+        self.request_ms = request_ms
+        self.per_text_ms = per_text_ms
+        self.upstream = asyncio.Semaphore(upstream_concurrency)
+        self.calls = 0
+
+    async def embed_many(self, texts: list[str]) -> list[list[float]]:
+        async with self.upstream:
+            self.calls += 1
+            await asyncio.sleep((self.request_ms + self.per_text_ms * len(texts)) / 1000)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    async def embed_one(self, text: str) -> list[float]:
+        return (await self.embed_many([text]))[0]
+
+
+async def _run_load(embed, queries: int, concurrency: int) -> float:
+    # Mirrors RETRIEVAL_CONCURRENCY: never more than `concurrency` retrievals in flight.
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _one(index: int) -> None:
+        async with semaphore:
+            await embed(f"design review query {index}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(_one(index) for index in range(queries)))
+    return time.perf_counter() - start
+
+
+async def _unbatched(args: argparse.Namespace) -> tuple[int, float]:
+    backend = FakeEmbeddingsBackend(args.request_ms, args.per_text_ms, args.upstream_concurrency)
+    elapsed = await _run_load(backend.embed_one, args.queries, args.concurrency)
+    return backend.calls, elapsed
+
+
+async def _batched(args: argparse.Namespace) -> tuple[int, float, dict]:
+    backend = FakeEmbeddingsBackend(args.request_ms, args.per_text_ms, args.upstream_concurrency)
+    batcher = EmbeddingBatcher(
+        backend.embed_many,
+        window_seconds=args.window_ms / 1000,
+        max_batch_size=args.max_batch,
+    )
+    elapsed = await _run_load(batcher.embed, args.queries, args.concurrency)
+    return backend.calls, elapsed, batcher.stats()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--upstream-concurrency", type=int, default=4)
+    parser.add_argument("--request-ms", type=float, default=40.0)
+    parser.add_argument("--per-text-ms", type=float, default=0.5)
+    parser.add_argument("--window-ms", type=float, default=5.0)
+    parser.add_argument("--max-batch", type=int, default=16)
+    args = parser.parse_args()
+
+    unbatched_calls, unbatched_s = asyncio.run(_unbatched(args))
+    batched_calls, batched_s, stats = asyncio.run(_batched(args))
+
+    print(
+        f"queries: {args.queries}  retrieval concurrency: {args.concurrency}  "
+        f"upstream concurrency: {args.upstream_concurrency}"
+    )
+    print(
+        f"one request per query: {unbatched_calls:4d} upstream calls  {unbatched_s:6.2f} s  "
+        f"{unbatched_calls / unbatched_s:7.1f} calls/s  {args.queries / unbatched_s:7.1f} queries/s"
+    )
+    print(
+        f"micro-batched:         {batched_calls:4d} upstream calls  {batched_s:6.2f} s  "
+        f"{batched_calls / batched_s:7.1f} calls/s  {args.queries / batched_s:7.1f} queries/s  "
+        f"(avg batch {stats['avg_batch_size']})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Compare module replies that copy evidence quotes with replies that cite context IDs.
+
+Packs a synthetic context, builds the same module review twice (evidence as full
+{source_file, page, quote} objects, and as context IDs expanded server-side), and serves
+each through the local stub server with the same fixed per-call latency. Output tokens are
+what a real model spends decoding time on, so they are reported as the headline figure; the
+measured latency covers the rest of the path (transfer, parsing, validation and, for cited
+replies, expanding IDs back into quotes), which the stub does not fake. Run from the
+repository root:
+
+    python -m benchmarks.bench_evidence_citations --calls 10 --findings 6 --latency-ms 150
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from langchain_core.documents import Document
+
+from app.config import get_settings
+from app.models import CitedModuleReviewOutput, ModuleReviewOutput
+from app.packing import context_evidence, pack_context
+from app.tokens import count_tokens
+from benchmarks.stub_server import StubOpenAIServer, chat_completion
+
+
+def _context(chunks: int) -> tuple[list[dict], str]:
+    docs = [
+        Document(
+            id=f"chunk-{index:04d}",
+            page_content=(
+                f"Section {index}: the checkout service writes orders to one Postgres primary in us-east-1, "
+                f"replicates asynchronously to a standby, and caches carts in Redis for {index * 5} minutes."
+            ),
+            metadata={"source_file": "checkout-design.pdf", "page": index},
+        )
+        for index in range(1, chunks + 1)
+    ]
+    items, context_text, _ = pack_context(
+        docs,
+        query="checkout failover",
+        max_items=chunks,
+        max_chunk_tokens=80,
+        max_context_tokens=4000,
+        model_name="stub",
+    )
+    return items, context_text
+
+
+def _p95(samples: list[float]) -> float:
+    return statistics.quantiles(samples, n=20)[-1] if len(samples) > 1 else samples[0]
+
+
+def _review(items: list[dict], findings: int, cites: int, by_id: bool) -> dict:
+    def _evidence(offset: int) -> list:
+        cited = [items[(offset + step) % len(items)] for step in range(cites)]
+        if by_id:
+            return [item["id"] for item in cited]
+        return [{key: item[key] for key in ("source_file", "page", "quote")} for item in cited]
+
+    return {
+        "score": 5,
+        "risk": "high",
+        "findings": [
+            {
+                "title": f"Finding {index}",
+                "severity": "high",
+                "details": "Writes depend on a single primary with manual failover.",
+                "impact": "A primary outage stops checkout until an operator promotes the standby.",
+                "evidence": _evidence(index),
+            }
+            for index in range(findings)
+        ],
+        "recommendations": [
+            {
+                "title": "Automate failover",
+                "effort": "medium",
+                "steps": ["Add health checks", "Promote the standby automatically"],
+                "evidence": _evidence(findings),
+            }
+        ],
+        "questions_for_author": ["What is the recovery point objective?"],
+    }
+
+
+async def _run_mode(schema: type, calls: int, context_text: str) -> list[float]:
+    from app.clients import close_clients, get_chat_model
+    from app.llm_client import invoke_json_with_retries
+    from app.reviewers import expand_evidence
+
+    llm = get_chat_model(get_settings().model_name)
+    latencies: list[float] = []
+    try:
+        for index in range(calls):
+            start = time.perf_counter()
+            review, _, _ = await invoke_json_with_retries(
+                llm,
+                f"Review variant {index}\n\n{context_text}",
+                schema,
+                timeout_seconds=30.0,
+                max_retries=0,
+                base_backoff_seconds=0,
+            )
+            if schema is CitedModuleReviewOutput:
+                expand_evidence(review, context_evidence(context_text))
+            latencies.append((time.perf_counter() - start) * 1000)
+    finally:
+        await close_clients()
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=10)
+    parser.add_argument("--chunks", type=int, default=12)
+    parser.add_argument("--findings", type=int, default=6)
+    parser.add_argument("--cites", type=int, default=2)
+    parser.add_argument("--latency-ms", type=float, default=150.0)
+    args = parser.parse_args()
+
+    settings = get_settings()
+    settings.openai_api_key = "stub"
+    settings.llm_response_cache_max_entries = 0
+    items, context_text = _context(args.chunks)
+
+    print(f"module reviews per mode: {args.calls}  findings: {args.findings}  citations per item: {args.cites}")
+    for mode, schema, by_id in (("quotes", ModuleReviewOutput, False), ("ids", CitedModuleReviewOutput, True)):
+        reply = json.dumps(_review(items, args.findings, args.cites, by_id))
+        output_tokens = count_tokens(reply, settings.model_name)
+
+        def _responder(_path: str, _body: dict, reply: str = reply, output_tokens: int = output_tokens):
+            return 200, {}, chat_completion(reply, completion_tokens=output_tokens)
+
+        with StubOpenAIServer(responder=_responder, latency_seconds=args.latency_ms / 1000) as server:
+            settings.openai_base_url = server.base_url
+            latencies = asyncio.run(_run_mode(schema, args.calls, context_text))
+        print(
+            f"{mode:7s} output tokens/call {output_tokens:6d}  reply bytes {len(reply):6d}  "
+            f"latency avg {statistics.mean(latencies):8.1f} ms  p95 {_p95(latencies):8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Measure how many malformed model replies the local JSON repair stage recovers.
+
+Builds a seeded fuzz corpus by applying the failure modes we see from chat models
+(trailing commas, Python-style dicts, raw newlines in strings, bare keys, prose and
+fences around the JSON, out-of-vocabulary severities, truncation) to valid triage and
+module outputs, then reports the local repair rate and cost per mutation against an
+assumed model round trip for the remote "Return JSON only" retry. Run from the repository root:
+
+    python -m benchmarks.bench_json_repair --size 400 --remote-ms 2500
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import time
+from collections.abc import Callable
+
+from app.json_repair import repair_structured_output
+from app.models import ModuleReviewOutput, TriageOutput
+
+SAMPLE_OUTPUTS = [
+    (
+        TriageOutput,
+        {
+            "high_risk_areas": ["single region database", "no retry budget"],
+            "missing_info": ["expected peak QPS"],
+            "recommended_modules_to_run": ["reliability", "scalability"],
+            "top_questions_for_author": ["How is failover tested?"],
+        },
+    ),
+    (
+        ModuleReviewOutput,
+        {
+            "score": 6.5,
+            "risk": "high",
+            "findings": [
+                {
+                    "title": "Primary database is a single point of failure",
+                    "severity": "high",
+                    "details": "All writes go to one instance.\nNo replica is promoted automatically.",
+                    "impact": "A zone outage stops checkout",
+                    "evidence": [{"source_file": "design.pdf", "page": 3, "quote": "one Postgres primary"}],
+                },
+                {
+                    "title": "Cache has no stampede protection",
+                    "severity": "medium",
+                    "details": "Hot keys expire together.",
+                    "impact": "Load spikes on the database",
+                    "evidence": [],
+                },
+            ],
+            "recommendations": [
+                {
+                    "title": "Add a synchronous replica",
+                    "effort": "medium",
+                    "steps": ["Provision replica", "Enable automatic failover"],
+                    "evidence": [],
+                }
+            ],
+            "questions_for_author": ["What is the RPO?"],
+            "missing_info": [],
+            "assumptions": ["Traffic is read heavy"],
+        },
+    ),
+]
+
+
+def _trailing_commas(text: str, _rng: random.Random) -> str:
+    return re.sub(r'(["\d\]}])(\s*[\]}])', r"\1,\2", text)
+
+
+def _python_repr(text: str, _rng: random.Random) -> str:
+    return repr(json.loads(text))
+
+
+def _raw_newlines(text: str, _rng: random.Random) -> str:
+    return text.replace("\\n", "\n")
+
+
+def _bare_keys(text: str, _rng: random.Random) -> str:
+    return re.sub(r'"(\w+)":', r"\1:", text)
+
+
+def _wrapped_in_prose(text: str, _rng: random.Random) -> str:
+    return f"Here is the review you asked for:\n```json\n{text}\n```\nLet me know if you need more."
+
+
+def _severity_synonyms(text: str, rng: random.Random) -> str:
+    synonyms = {"high": ["critical", "severe", "High"], "medium": ["moderate", "Medium"], "low": ["minor", "info"]}
+    return re.sub(
+        r'"(severity|risk|effort)": "(low|medium|high)"',
+        lambda match: f'"{match.group(1)}": "{rng.choice(synonyms[match.group(2)])}"',
+        text,
+    )
+
+
+def _score_as_text(text: str, _rng: random.Random) -> str:
+    return re.sub(r'"score": ([\d.]+)', r'"score": "\1/10"', text)
+
+
+def _truncated(text: str, rng: random.Random) -> str:
+    return text[: int(len(text) * rng.uniform(0.5, 0.95))]
+
+
+# Mutations whose repair must reproduce the original output exactly; truncation can only recover a prefix.
+LOSSLESS_MUTATIONS: dict[str, Callable[[str, random.Random], str]] = {
+    "trailing_commas": _trailing_commas,
+    "python_repr": _python_repr,
+    "raw_newlines": _raw_newlines,
+    "bare_keys": _bare_keys,
+    "wrapped_in_prose": _wrapped_in_prose,
+    "severity_synonyms": _severity_synonyms,
+    "score_as_text": _score_as_text,
+}
+MUTATIONS = {**LOSSLESS_MUTATIONS, "truncated": _truncated}
+STACKABLE_MUTATIONS = {
+    name: LOSSLESS_MUTATIONS[name]
+    for name in ("trailing_commas", "raw_newlines", "wrapped_in_prose", "severity_synonyms", "score_as_text")
+}
+
+
+def build_corpus(size: int, seed: int = 7) -> list[tuple[str, str, type, dict]]:
+    rng = random.Random(seed)
+    corpus = []
+    names = list(MUTATIONS)
+    for index in range(size):
+        schema, output = SAMPLE_OUTPUTS[index % len(SAMPLE_OUTPUTS)]
+        name = names[index % len(names)]
+        text = MUTATIONS[name](json.dumps(output, indent=rng.choice([None, 2])), rng)
+        # Stack a second failure mode on a third of the replies, as real outputs often combine them.
+        if rng.random() < 0.33:
+            text = STACKABLE_MUTATIONS[rng.choice(list(STACKABLE_MUTATIONS))](text, rng)
+        corpus.append((name, text, schema, schema.model_validate(output).model_dump()))
+    return corpus
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--remote-ms", type=float, default=2500.0, help="assumed latency of one repair round trip")
+    args = parser.parse_args()
+
+    results: dict[str, list[float]] = {}
+    repaired: dict[str, int] = {}
+    exact: dict[str, int] = {}
+    for name, text, schema, expected in build_corpus(args.size, args.seed):
+        start = time.perf_counter()
+        outcome = repair_structured_output(text, schema)
+        results.setdefault(name, []).append((time.perf_counter() - start) * 1000)
+        repaired[name] = repaired.get(name, 0) + (outcome is not None)
+        exact[name] = exact.get(name, 0) + (outcome == expected)
+
+    total = sum(len(times) for times in results.values())
+    local = sum(repaired.values())
+    print(f"corpus: {total} malformed replies  seed: {args.seed}")
+    for name, times in results.items():
+        print(
+            f"{name:18s} repaired locally {repaired[name]:4d}/{len(times):4d}  exact {exact[name]:4d}  "
+            f"avg {sum(times) / len(times):6.3f} ms  max {max(times):6.3f} ms"
+        )
+    local_ms = sum(sum(times) for times in results.values())
+    print(
+        f"local repair rate {local / total:6.1%}; remote retries avoided: {local}, "
+        f"~{local * args.remote_ms / 1000:.1f} s of model time saved for {local_ms:.1f} ms of local work"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Measure lexical index ingest and search cost on a large synthetic collection.
+
+Ingests a seeded corpus file by file through the same lexical index calls the ingest
+endpoint makes, timing the index write for each file, then times BM25 lookups with
+and without a source-file filter. The query set runs twice, so the second pass shows
+lookups whose terms were already merged across segments. Chunk text draws words from
+a Zipf-like vocabulary so posting lists have the skew of real documents. Run from the
+repository root:
+
+    python -m benchmarks.bench_lexical_index --files 200 --chunks-per-file 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from langchain_core.documents import Document
+
+from app.config import get_settings
+from app.lexical import add_to_lexical_index, lexical_search
+
+COLLECTION = "bench"
+
+
+def _vocabulary(size: int) -> tuple[list[str], list[float]]:
+    words = [f"term{index}" for index in range(size)]
+    weights = [1.0 / (rank + 1) for rank in range(size)]
+    return words, weights
+
+
+def _file_docs(
+    rng: random.Random, file_index: int, chunks: int, words: list[str], weights: list[float]
+) -> tuple[list[Document], list[str]]:
+    source_file = f"design-{file_index}.pdf"
+    docs = [
+        Document(
+            page_content=" ".join(rng.choices(words, weights, k=rng.randint(80, 140))),
+            metadata={"source_file": source_file, "page": chunk_index // 4},
+        )
+        for chunk_index in range(chunks)
+    ]
+    return docs, [f"{source_file}-{chunk_index}" for chunk_index in range(chunks)]
+
+
+def _p95(samples: list[float]) -> float:
+    return statistics.quantiles(samples, n=20)[-1] if len(samples) > 1 else samples[0]
+
+
+def _report(label: str, samples: list[float]) -> None:
+    print(
+        f"{label:<28} mean={statistics.fmean(samples):8.2f} ms  "
+        f"p50={statistics.median(samples):8.2f} ms  p95={_p95(samples):8.2f} ms"
+    )
+
+
+def run(files: int, chunks_per_file: int, vocabulary: int, queries: int, seed: int) -> None:
+    rng = random.Random(seed)
+    words, weights = _vocabulary(vocabulary)
+    settings = get_settings()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        settings.chroma_dir = Path(workdir)
+        ingest_ms: list[float] = []
+        for file_index in range(files):
+            docs, ids = _file_docs(rng, file_index, chunks_per_file, words, weights)
+            start = time.perf_counter()
+            add_to_lexical_index(COLLECTION, docs, ids)
+            ingest_ms.append((time.perf_counter() - start) * 1000)
+
+        query_texts = [" ".join(rng.choices(words, weights, k=rng.randint(6, 24))) for _ in range(queries)]
+        cold_ms: list[float] = []
+        for query in query_texts:
+            start = time.perf_counter()
+            lexical_search(COLLECTION, query, top_k=12)
+            cold_ms.append((time.perf_counter() - start) * 1000)
+        unfiltered_ms: list[float] = []
+        filtered_ms: list[float] = []
+        for query in query_texts:
+            start = time.perf_counter()
+            lexical_search(COLLECTION, query, top_k=12)
+            unfiltered_ms.append((time.perf_counter() - start) * 1000)
+            file_filter = f"design-{rng.randrange(files)}.pdf"
+            start = time.perf_counter()
+            lexical_search(COLLECTION, query, top_k=12, file_filter=file_filter)
+            filtered_ms.append((time.perf_counter() - start) * 1000)
+
+    print(f"collection: {files} files x {chunks_per_file} chunks = {files * chunks_per_file} chunks")
+    _report("index write (first file)", ingest_ms[:1])
+    _report("index write (last 10 files)", ingest_ms[-10:])
+    _report("search (first use of terms)", cold_ms)
+    _report("search (repeated terms)", unfiltered_ms)
+    _report("search with file filter", filtered_ms)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--chunks-per-file", type=int, default=500)
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    run(args.files, args.chunks_per_file, args.vocabulary, args.queries, args.seed)
+
+
+if __name__ == "__main__":
+    main()
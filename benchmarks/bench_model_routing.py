@@ -0,0 +1,134 @@
+"""Compare one model for every stage with per-stage routing and a fast-first cascade.
+
+Runs triage followed by concurrent module reviews through the real reviewer path against
+the local stub server. The stub answers per requested model: the strong model is slow, the
+fast model is quick but a configurable share of its module reviews cite IDs that are not in
+the context, which makes the cascade escalate them. Reports analysis latency, calls per
+model, and escalations for each configuration. Run from the repository root:
+
+    python -m benchmarks.bench_model_routing --analyses 10 --strong-ms 600 --fast-ms 150
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+
+from app.config import get_settings
+from benchmarks.stub_server import StubOpenAIServer, chat_completion
+
+_MODULES = ["reliability", "security", "scalability"]
+_CONTEXT = "\n\n".join(
+    f"[id=E{page:06d} source_file=design.pdf page={page}]\nThe checkout service keeps sessions in Redis "
+    f"and writes orders to one Postgres primary; section {page}."
+    for page in range(1, 9)
+)
+_TRIAGE = json.dumps(
+    {
+        "high_risk_areas": ["single database primary"],
+        "missing_info": [],
+        "recommended_modules_to_run": _MODULES,
+        "top_questions_for_author": [],
+    }
+)
+
+
+def _module_reply(evidence_id: str) -> str:
+    finding = {
+        "title": "Single primary",
+        "severity": "high",
+        "details": "All writes go to one Postgres primary.",
+        "impact": "A primary outage stops checkout.",
+        "evidence": [evidence_id],
+    }
+    return json.dumps({"score": 5, "risk": "high", "findings": [finding]})
+
+
+class _Responder:
+    def __init__(self, strong_model: str, strong_ms: float, fast_ms: float, weak_rate: float, seed: int):
+        self.strong_model = strong_model
+        self.strong_ms = strong_ms
+        self.fast_ms = fast_ms
+        self.weak_rate = weak_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls: Counter[str] = Counter()
+
+    def __call__(self, _path: str, body: dict) -> tuple[int, dict, dict]:
+        model = body["model"]
+        strong = model == self.strong_model
+        with self.lock:
+            self.calls[model] += 1
+            weak = not strong and self.rng.random() < self.weak_rate
+        time.sleep((self.strong_ms if strong else self.fast_ms) / 1000)
+        prompt = body["messages"][-1]["content"]
+        if "recommended_modules_to_run" in prompt:
+            return 200, {}, chat_completion(_TRIAGE)
+        return 200, {}, chat_completion(_module_reply("E999999" if weak else "E000001"))
+
+
+async def _run_analyses(analyses: int) -> tuple[list[float], Counter[str]]:
+    from app.clients import close_clients
+    from app.llm_client import start_llm_models
+    from app.reviewers import run_module_review, run_triage
+
+    latencies: list[float] = []
+    escalations: Counter[str] = Counter()
+    try:
+        for index in range(analyses):
+            models = start_llm_models()
+            query = f"Review checkout, variant {index}"
+            start = time.perf_counter()
+            await run_triage(_CONTEXT, query)
+            await asyncio.gather(*(run_module_review(module, _CONTEXT, query) for module in _MODULES))
+            latencies.append((time.perf_counter() - start) * 1000)
+            escalations.update(models["escalations"].values())
+    finally:
+        await close_clients()
+    return latencies, escalations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--analyses", type=int, default=10)
+    parser.add_argument("--strong-model", default="gpt-4o")
+    parser.add_argument("--fast-model", default="gpt-4o-mini")
+    parser.add_argument("--strong-ms", type=float, default=600.0)
+    parser.add_argument("--fast-ms", type=float, default=150.0)
+    parser.add_argument("--weak-rate", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    settings = get_settings()
+    settings.openai_api_key = "stub"
+    settings.llm_response_cache_max_entries = 0
+    settings.model_name = args.strong_model
+    configurations = {
+        "single": {},
+        "routed": {"triage_model": args.fast_model},
+        "cascade": {"triage_model": args.fast_model, "llm_cascade_model": args.fast_model},
+    }
+
+    print(f"analyses per configuration: {args.analyses}  modules: {len(_MODULES)}  weak fast replies: {args.weak_rate}")
+    for name, overrides in configurations.items():
+        settings.triage_model = overrides.get("triage_model")
+        settings.llm_cascade_model = overrides.get("llm_cascade_model")
+        responder = _Responder(args.strong_model, args.strong_ms, args.fast_ms, args.weak_rate, args.seed)
+        with StubOpenAIServer(responder=responder) as server:
+            settings.openai_base_url = server.base_url
+            latencies, escalations = asyncio.run(_run_analyses(args.analyses))
+        calls = "  ".join(f"{model} {count:3d}" for model, count in sorted(responder.calls.items()))
+        print(
+            f"{name:8s} latency avg {statistics.mean(latencies):7.1f} ms  "
+            f"calls {calls}  escalations {sum(escalations.values()):3d}"
+        )
+
+
+if __name__ == "__main__":
+    main()
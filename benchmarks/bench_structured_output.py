@@ -0,0 +1,131 @@
+"""Compare text-mode JSON prompts with provider-enforced json_schema output.
+
+Runs module reviews through the real reviewer path against the local stub server.
+In text mode the stub answers like a chat model asked for JSON in prose: some replies
+arrive fenced or with trailing commas (fixed locally), and a few are unusable and cost a
+second "Return JSON only" call. In json_schema mode the stub always returns schema-valid
+JSON, as a strict response_format guarantees. Stub latency grows with the prompt tokens
+sent in messages; providers may also count the response schema itself, which this
+benchmark reports separately as request bytes. Run from the repository root:
+
+    python -m benchmarks.bench_structured_output --calls 40 --latency-ms 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import threading
+import time
+
+from app.config import get_settings
+from app.tokens import count_tokens
+from benchmarks.bench_json_repair import SAMPLE_OUTPUTS
+from benchmarks.stub_server import StubOpenAIServer, chat_completion
+
+_MODULE_REPLY = json.dumps(
+    {
+        **SAMPLE_OUTPUTS[1][1],
+        # Module reviews cite context items by ID; the server expands them into evidence.
+        "findings": [{**item, "evidence": ["E000001"]} for item in SAMPLE_OUTPUTS[1][1]["findings"]],
+        "recommendations": [{**item, "evidence": []} for item in SAMPLE_OUTPUTS[1][1]["recommendations"]],
+    }
+)
+_CONTEXT = " ".join(
+    f"[id=E{page:06d} source_file=design.pdf page={page}]\nThe checkout service writes orders to one Postgres primary "
+    f"and caches carts in Redis with a fixed TTL of {page * 5} minutes."
+    for page in range(1, 13)
+)
+
+
+class _Responder:
+    def __init__(self, seed: int, fenced_rate: float, broken_rate: float, latency_ms: float, per_token_ms: float):
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.fenced_rate = fenced_rate
+        self.broken_rate = broken_rate
+        self.latency_ms = latency_ms
+        self.per_token_ms = per_token_ms
+
+    def __call__(self, _path: str, body: dict) -> tuple[int, dict, dict]:
+        prompt_tokens = sum(count_tokens(message["content"], "stub") for message in body["messages"])
+        time.sleep((self.latency_ms + self.per_token_ms * prompt_tokens) / 1000)
+        reply = _MODULE_REPLY
+        if "response_format" not in body:
+            with self.lock:
+                roll = self.rng.random()
+            if roll < self.broken_rate:
+                reply = "I reviewed the module; the main concern is the single database primary."
+            elif roll < self.broken_rate + self.fenced_rate:
+                reply = f"```json\n{reply.rstrip('}')},}}\n```"
+        return 200, {}, chat_completion(reply, prompt_tokens=prompt_tokens, completion_tokens=len(reply) // 4)
+
+
+def _p95(samples: list[float]) -> float:
+    return statistics.quantiles(samples, n=20)[-1] if len(samples) > 1 else samples[0]
+
+
+async def _run_mode(calls: int, concurrency: int) -> tuple[list[float], dict]:
+    from app.clients import close_clients
+    from app.llm_client import start_json_repairs
+    from app.reviewers import run_module_review
+
+    repairs = start_json_repairs()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def _one(index: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await run_module_review("reliability", _CONTEXT, f"Review checkout reliability, variant {index}")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    try:
+        await asyncio.gather(*(_one(index) for index in range(calls)))
+    finally:
+        await close_clients()
+    return latencies, repairs
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--per-token-ms", type=float, default=0.2)
+    parser.add_argument("--fenced-rate", type=float, default=0.2)
+    parser.add_argument("--broken-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    settings = get_settings()
+    settings.openai_api_key = "stub"
+    settings.llm_response_cache_max_entries = 0
+
+    print(f"module reviews per mode: {args.calls}  concurrency: {args.concurrency}")
+    for mode in ("text", "json_schema"):
+        settings.llm_output_mode = mode
+        responder = _Responder(args.seed, args.fenced_rate, args.broken_rate, args.latency_ms, args.per_token_ms)
+        with StubOpenAIServer(responder=responder) as server:
+            settings.openai_base_url = server.base_url
+            latencies, repairs = asyncio.run(_run_mode(args.calls, args.concurrency))
+        prompt_tokens = [
+            sum(count_tokens(message["content"], settings.model_name) for message in body["messages"])
+            for body in server.request_bodies
+        ]
+        request_bytes = [len(json.dumps(body)) for body in server.request_bodies]
+        print(
+            f"{mode:12s} requests {server.requests:4d}  "
+            f"prompt tokens/call {statistics.mean(prompt_tokens):7.1f}  "
+            f"request bytes/call {statistics.mean(request_bytes):7.0f}  "
+            f"latency avg {statistics.mean(latencies):7.1f} ms  "
+            f"p95 {_p95(latencies):7.1f} ms  "
+            f"repairs local {repairs['local']:3d} remote {repairs['remote']:3d}"
+        )
+
+
+if __name__ == "__main__":
+    main()
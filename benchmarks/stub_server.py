@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections.abc import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+Responder = Callable[[str, dict], tuple[int, dict, dict]]
+
+
+def chat_completion(content: str, prompt_tokens: int = 0, completion_tokens: int = 0) -> dict:
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "stub",
+        "choices": [
+            {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def embeddings_response(count: int, dimensions: int = 8) -> dict:
+    return {
+        "object": "list",
+        "data": [
+            {"object": "embedding", "index": index, "embedding": [0.1] * dimensions} for index in range(count)
+        ],
+        "model": "stub",
+        "usage": {"prompt_tokens": 0, "total_tokens": 0},
+    }
+
+
+def default_responder(path: str, body: dict) -> tuple[int, dict, dict]:
+    if path.endswith("/embeddings"):
+        inputs = body.get("input", [])
+        return 200, {}, embeddings_response(len(inputs) if isinstance(inputs, list) else 1)
+    return 200, {}, chat_completion('{"high_risk_areas": [], "missing_info": [], '
+                                    '"recommended_modules_to_run": [], "top_questions_for_author": []}')
+
+
+class StubOpenAIServer:
+    """Local OpenAI-compatible HTTP server that counts TCP connections and requests."""
+
+    def __init__(self, responder: Responder = default_responder, latency_seconds: float = 0.0):
+        self.responder = responder
+        self.latency_seconds = latency_seconds
+        self.connections = 0
+        self.requests = 0
+        self.request_bodies: list[dict] = []
+        self._lock = threading.Lock()
+        server = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Buffer headers and body into one write so delayed ACKs do not dominate timings.
+            wbufsize = 1 << 16
+            disable_nagle_algorithm = True
+
+            def setup(self) -> None:
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("content-length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with server._lock:
+                    server.requests += 1
+                    server.request_bodies.append(body)
+                if server.latency_seconds:
+                    time.sleep(server.latency_seconds)
+                status, headers, payload = server.responder(self.path, body)
+                raw = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(raw)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def log_message(self, *_args) -> None:
+                return
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self) -> StubOpenAIServer:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
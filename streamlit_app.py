@@ -12,7 +12,7 @@ st.set_page_config(page_title="System Design Reviewer Demo", layout="wide")
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
 DEFAULT_QUERY = "Review this design for production readiness"
 SEVERITY_ORDER = {"high": 0, "medium": 1, "low": 2, "unknown": 3}
-MAX_CONTEXT_CHARS = int(os.getenv("MAX_CONTEXT_CHARS", "6000"))
+MAX_CONTEXT_TOKENS = int(os.getenv("MAX_CONTEXT_TOKENS", "1500"))
 
 
 def risk_badge(risk: str) -> str:
@@ -131,7 +131,8 @@ def build_analysis_summary(payload: dict[str, Any], response: requests.Response,
         "top_k": payload.get("top_k", "n/a"),
         "budget_modules": payload.get("budget_modules", "n/a"),
         "context_chars_used": int(context_used) if context_used is not None else 0,
-        "context_chars_max": MAX_CONTEXT_CHARS,
+        "context_tokens_used": data.get("meta", {}).get("context_tokens_used"),
+        "context_tokens_max": MAX_CONTEXT_TOKENS,
         "latency_ms": round(response.elapsed.total_seconds() * 1000, 1),
     }
 
@@ -145,9 +146,13 @@ def render_analysis_summary(summary: dict[str, Any]) -> None:
         st.markdown(f"**Mode:** {summary.get('mode', 'n/a')}")
         st.markdown(f"**Top K:** {summary.get('top_k', 'n/a')}")
         st.markdown(f"**Modules Budget:** {summary.get('budget_modules', 'n/a')}")
-        st.markdown(
-            f"**Context Size:** {summary.get('context_chars_used', 0)} / {summary.get('context_chars_max', MAX_CONTEXT_CHARS)} chars"
-        )
+        context_tokens = summary.get("context_tokens_used")
+        if context_tokens is None:
+            st.markdown(f"**Context Size:** {summary.get('context_chars_used', 0)} chars")
+        else:
+            st.markdown(
+                f"**Context Size:** {context_tokens} / {summary.get('context_tokens_max', MAX_CONTEXT_TOKENS)} tokens"
+            )
         latency_ms = summary.get("latency_ms", 0.0)
         st.markdown(f"**Latency:** {latency_ms / 1000:.1f}s ({latency_ms} ms)")
 
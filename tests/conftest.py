@@ -1,6 +1,38 @@
 import sys
 from pathlib import Path
 
+import pytest
+
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
+
+
+def retrieval_result(items: list, context_text: str):
+    async def _retrieve(**_kwargs):
+        return items, context_text
+
+    return _retrieve
+
+
+@pytest.fixture(autouse=True)
+def _isolated_app_state(monkeypatch, tmp_path):
+    import app.llm_client as llm_client_module
+    import app.main as main_module
+    from app.config import get_settings
+
+    # Keep collection versions and cached analyses from leaking between tests or into data/.
+    monkeypatch.setattr(get_settings(), "chroma_dir", tmp_path / "chroma")
+    # Pipeline tests fake retrieve_context only; focused per-module retrieval is opted into where tested.
+    monkeypatch.setattr(get_settings(), "module_retrieval_enabled", False)
+    # The adaptive LLM limiter is process-wide; each test starts from its initial limit.
+    monkeypatch.setattr(llm_client_module, "_LLM_LIMITER", None)
+    monkeypatch.setattr(llm_client_module, "_RATE_SCHEDULERS", {})
+    monkeypatch.setattr(llm_client_module, "_CIRCUIT_BREAKER", None)
+    monkeypatch.setattr(llm_client_module, "_LATENCY_TRACKERS", {})
+    monkeypatch.setattr(llm_client_module, "_RESPONSE_CACHE", None)
+    monkeypatch.setattr(llm_client_module, "_RETRY_BUDGET", None)
+    (tmp_path / "chroma").mkdir()
+    main_module.ANALYSIS_CACHE.clear()
+    yield
+    main_module.ANALYSIS_CACHE.clear()
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+
+import httpx
+from fastapi.testclient import TestClient
+
+import app.main as main_module
+from app.cache import LRUCache, build_tiered_cache
+from app.main import app
+from app.store import bump_collection_version
+
+from conftest import retrieval_result
+
+
+def _payload(**overrides) -> dict:
+    payload = {
+        "collection": "default",
+        "query": "test",
+        "mode": "targeted",
+        "top_k": 2,
+        "file_filter": None,
+        "budget_modules": 1,
+    }
+    payload.update(overrides)
+    return payload
+
+
+def _patch_pipeline(monkeypatch) -> dict:
+    calls = {"triage": 0}
+
+    async def _triage(*_args, **_kwargs):
+        calls["triage"] += 1
+        return {"recommended_modules_to_run": ["security"]}, 0, False
+
+    async def _module_review(*_args, **_kwargs):
+        return {"score": 8.0, "risk": "low", "findings": [], "recommendations": []}, 0, False
+
+    monkeypatch.setattr(main_module, "_ensure_openai_configured", lambda: None)
+    monkeypatch.setattr(main_module, "retrieve_context", retrieval_result([{"x": 1}], "ctx"))
+    monkeypatch.setattr(main_module, "run_triage", _triage)
+    monkeypatch.setattr(main_module, "run_module_review", _module_review)
+    return calls
+
+
+def test_identical_request_is_served_from_cache(monkeypatch):
+    calls = _patch_pipeline(monkeypatch)
+    client = TestClient(app)
+
+    first = client.post("/analyze", json=_payload()).json()
+    second = client.post("/analyze", json=_payload()).json()
+
+    assert calls["triage"] == 1
+    assert first["meta"]["cache"] == "miss"
+    assert second["meta"]["cache"] == "hit"
+    assert second["meta"]["request_id"] != first["meta"]["request_id"]
+    assert second["meta"]["cached_latency_ms"] == first["meta"]["latency_ms"]
+    assert second["modules"] == first["modules"]
+
+
+def test_bypass_skips_lookup_and_other_parameters_miss(monkeypatch):
+    calls = _patch_pipeline(monkeypatch)
+    client = TestClient(app)
+
+    client.post("/analyze", json=_payload())
+    bypassed = client.post("/analyze", json=_payload(cache="bypass")).json()
+    other_query = client.post("/analyze", json=_payload(query="different")).json()
+
+    assert bypassed["meta"]["cache"] == "bypass"
+    assert other_query["meta"]["cache"] == "miss"
+    assert calls["triage"] == 3
+
+
+def test_ingest_version_bump_invalidates_collection_entries(monkeypatch):
+    calls = _patch_pipeline(monkeypatch)
+    client = TestClient(app)
+
+    client.post("/analyze", json=_payload())
+    bump_collection_version("default")
+    after_ingest = client.post("/analyze", json=_payload()).json()
+    bump_collection_version("other")
+    still_cached = client.post("/analyze", json=_payload()).json()
+
+    assert after_ingest["meta"]["cache"] == "miss"
+    assert still_cached["meta"]["cache"] == "hit"
+    assert calls["triage"] == 2
+
+
+def test_cache_and_collection_version_reads_run_off_the_event_loop(monkeypatch):
+    _patch_pipeline(monkeypatch)
+    threads = []
+
+    class _RecordingCache:
+        def get(self, _key):
+            threads.append(("get", threading.current_thread() is threading.main_thread()))
+            return None
+
+        def set(self, _key, _value):
+            threads.append(("set", threading.current_thread() is threading.main_thread()))
+
+        def clear(self):
+            pass
+
+    def _version(_collection):
+        threads.append(("version", threading.current_thread() is threading.main_thread()))
+        return 0
+
+    monkeypatch.setattr(main_module, "ANALYSIS_CACHE", _RecordingCache())
+    monkeypatch.setattr(main_module, "get_collection_version", _version)
+
+    async def _run():
+        # Drive the handler on this thread's loop, so "main thread" means "on the event loop".
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/analyze", json=_payload())
+
+    assert asyncio.run(_run()).status_code == 200
+    assert threads == [("version", False), ("get", False), ("set", False)]
+
+
+def test_lru_cache_evicts_oldest_and_expires_entries():
+    cache = LRUCache(max_entries=2, ttl_seconds=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.evictions == 1
+
+    time.sleep(0.06)
+    assert cache.get("a") is None
+
+
+def test_disk_tier_survives_memory_loss(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    cache = build_tiered_cache(max_entries=4, ttl_seconds=60, disk_path=path)
+    cache.set("key", {"overall": {"score": 7.5}})
+
+    restarted = build_tiered_cache(max_entries=4, ttl_seconds=60, disk_path=path)
+
+    assert restarted.get("key") == {"overall": {"score": 7.5}}
+    assert restarted.get("key") == {"overall": {"score": 7.5}}
+    assert restarted.stats()["disk_hits"] == 1
+    assert restarted.stats()["memory_hits"] == 1
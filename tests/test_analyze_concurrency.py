@@ -0,0 +1,114 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+import app.main as main_module
+from app.errors import UpstreamModelError
+from app.main import app
+
+from conftest import retrieval_result
+
+
+def _module_output(score: float = 7.0) -> dict:
+    return {
+        "score": score,
+        "risk": "low",
+        "findings": [],
+        "recommendations": [],
+        "questions_for_author": [],
+        "missing_info": [],
+        "assumptions": [],
+    }
+
+
+def _payload(mode: str = "deep", budget_modules: int = 3) -> dict:
+    return {
+        "collection": "default",
+        "query": "test",
+        "mode": mode,
+        "top_k": 2,
+        "file_filter": None,
+        "budget_modules": budget_modules,
+    }
+
+
+def _patch_common(monkeypatch):
+    async def _triage(*_args, **_kwargs):
+        return {"recommended_modules_to_run": ["security", "cost", "reliability"]}, 1, False
+
+    monkeypatch.setattr(main_module, "_ensure_openai_configured", lambda: None)
+    monkeypatch.setattr(main_module, "retrieve_context", retrieval_result([{"x": 1}], "ctx"))
+    monkeypatch.setattr(main_module, "run_triage", _triage)
+
+
+def test_deep_modules_run_concurrently(monkeypatch):
+    # Concurrency is capped per model call by the LLM limiter, not per stage, so all reviews start at once.
+    _patch_common(monkeypatch)
+    active = 0
+    max_active = 0
+
+    async def _module_review(module_name: str, **_kwargs):
+        nonlocal active, max_active
+        active += 1
+        max_active = max(max_active, active)
+        try:
+            await asyncio.sleep(0.02)
+        finally:
+            active -= 1
+        return _module_output(), 1 if module_name == "security" else 0, module_name == "reliability"
+
+    monkeypatch.setattr(main_module, "run_module_review", _module_review)
+
+    response = TestClient(app).post("/analyze", json=_payload("deep"))
+
+    assert response.status_code == 200
+    body = response.json()
+    assert list(body["modules"]) == main_module.DEEP_MODULES[:6]
+    assert max_active == 6
+    assert body["meta"]["retry_count"] == 2
+    assert body["meta"]["json_repaired"] is True
+    assert set(body["meta"]["module_latency_ms"]) == set(main_module.DEEP_MODULES[:6])
+    assert all(latency >= 0 for latency in body["meta"]["module_latency_ms"].values())
+    assert body["meta"]["triage_latency_ms"] >= 0
+
+
+def test_targeted_modules_respect_budget_and_order(monkeypatch):
+    _patch_common(monkeypatch)
+
+    async def _module_review(module_name: str, **_kwargs):
+        # Finish in reverse order to prove the response keeps triage order.
+        await asyncio.sleep(0.03 if module_name == "security" else 0.0)
+        return _module_output(), 0, False
+
+    monkeypatch.setattr(main_module, "run_module_review", _module_review)
+
+    response = TestClient(app).post("/analyze", json=_payload("targeted", budget_modules=2))
+
+    assert response.status_code == 200
+    body = response.json()
+    assert list(body["modules"]) == ["security", "cost"]
+    assert body["meta"]["retry_count"] == 1
+    assert body["meta"]["json_repaired"] is False
+
+
+def test_module_failure_cancels_sibling_reviews(monkeypatch):
+    _patch_common(monkeypatch)
+    cancelled: list[str] = []
+
+    async def _module_review(module_name: str, **_kwargs):
+        if module_name == "security":
+            raise UpstreamModelError("Model service is temporarily unavailable")
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(module_name)
+            raise
+        return _module_output(), 0, False
+
+    monkeypatch.setattr(main_module, "run_module_review", _module_review)
+
+    response = TestClient(app).post("/analyze", json=_payload("deep"))
+
+    assert response.status_code == 502
+    assert response.json()["error"]["code"] == "UPSTREAM_MODEL_ERROR"
+    assert sorted(cancelled) == sorted(main_module.DEEP_MODULES[1:6])
@@ -4,6 +4,8 @@ from app.errors import ModelOutputError, UpstreamModelError, UpstreamTimeoutErro
 from app.main import app
 import app.main as main_module
 
+from conftest import retrieval_result
+
 
 def _payload():
     return {
@@ -21,7 +23,7 @@ def test_analyze_maps_upstream_timeout_to_504(monkeypatch):
         raise UpstreamTimeoutError("Model request timed out")
 
     monkeypatch.setattr(main_module, "_ensure_openai_configured", lambda: None)
-    monkeypatch.setattr(main_module, "retrieve_context", lambda **_kwargs: ([{"x": 1}], "ctx"))
+    monkeypatch.setattr(main_module, "retrieve_context", retrieval_result([{"x": 1}], "ctx"))
     monkeypatch.setattr(main_module, "run_triage", _raise_timeout)
 
     client = TestClient(app)
@@ -40,7 +42,7 @@ def test_analyze_maps_model_output_invalid_to_502(monkeypatch):
         raise ModelOutputError("The model returned invalid structured output after repair attempt")
 
     monkeypatch.setattr(main_module, "_ensure_openai_configured", lambda: None)
-    monkeypatch.setattr(main_module, "retrieve_context", lambda **_kwargs: ([{"x": 1}], "ctx"))
+    monkeypatch.setattr(main_module, "retrieve_context", retrieval_result([{"x": 1}], "ctx"))
     monkeypatch.setattr(main_module, "run_triage", _raise_output_invalid)
 
     client = TestClient(app)
@@ -58,7 +60,7 @@ def test_analyze_maps_upstream_model_error_to_502(monkeypatch):
         raise UpstreamModelError("Model failed with non-retryable upstream error")
 
     monkeypatch.setattr(main_module, "_ensure_openai_configured", lambda: None)
-    monkeypatch.setattr(main_module, "retrieve_context", lambda **_kwargs: ([{"x": 1}], "ctx"))
+    monkeypatch.setattr(main_module, "retrieve_context", retrieval_result([{"x": 1}], "ctx"))
     monkeypatch.setattr(main_module, "run_triage", _raise_model_error)
 
     client = TestClient(app)
@@ -72,7 +74,7 @@ def test_analyze_maps_upstream_model_error_to_502(monkeypatch):
 
 def test_analyze_empty_collection_maps_to_collection_empty(monkeypatch):
     monkeypatch.setattr(main_module, "_ensure_openai_configured", lambda: None)
-    monkeypatch.setattr(main_module, "retrieve_context", lambda **_kwargs: ([], ""))
+    monkeypatch.setattr(main_module, "retrieve_context", retrieval_result([], ""))
 
     client = TestClient(app)
     response = client.post("/analyze", json=_payload())
@@ -85,7 +87,7 @@ def test_analyze_empty_collection_maps_to_collection_empty(monkeypatch):
 
 def test_analyze_file_filter_mismatch_maps_to_404(monkeypatch):
     monkeypatch.setattr(main_module, "_ensure_openai_configured", lambda: None)
-    monkeypatch.setattr(main_module, "retrieve_context", lambda **_kwargs: ([], ""))
+    monkeypatch.setattr(main_module, "retrieve_context", retrieval_result([], ""))
 
     client = TestClient(app)
     payload = _payload()
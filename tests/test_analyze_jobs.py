@@ -0,0 +1,170 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main_module
+from app.errors import JobNotFoundError, UpstreamModelError
+from app.jobs import JobManager, JobStore
+from app.main import app
+
+from conftest import retrieval_result
+
+
+def _payload(mode: str = "targeted") -> dict:
+    return {
+        "collection": "default",
+        "query": "test",
+        "mode": mode,
+        "top_k": 2,
+        "file_filter": None,
+        "budget_modules": 2,
+    }
+
+
+def _patch_pipeline(monkeypatch, tmp_path, module_review, queue_depth: int = 10, worker_count: int = 1):
+    async def _triage(*_args, **_kwargs):
+        return {"recommended_modules_to_run": ["security", "cost"]}, 0, False
+
+    monkeypatch.setattr(main_module, "_ensure_openai_configured", lambda: None)
+    monkeypatch.setattr(main_module, "retrieve_context", retrieval_result([{"x": 1}], "ctx"))
+    monkeypatch.setattr(main_module, "run_triage", _triage)
+    monkeypatch.setattr(main_module, "run_module_review", module_review)
+    monkeypatch.setattr(
+        main_module,
+        "JOB_MANAGER",
+        JobManager(
+            db_path=tmp_path / "jobs.sqlite3",
+            worker_count=worker_count,
+            queue_depth=queue_depth,
+            runner=main_module._run_job_analysis,
+        ),
+    )
+
+
+def _wait_for_status(client: TestClient, job_id: str, statuses: set[str]) -> dict:
+    for _ in range(200):
+        body = client.get(f"/analyze/jobs/{job_id}").json()
+        if body["status"] in statuses:
+            return body
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} never reached {statuses}")
+
+
+async def _ok_module(*_args, **_kwargs):
+    return {"score": 8.0, "risk": "low", "findings": [], "recommendations": []}, 0, False
+
+
+def test_job_runs_in_background_and_persists_result(monkeypatch, tmp_path):
+    _patch_pipeline(monkeypatch, tmp_path, _ok_module)
+
+    with TestClient(app) as client:
+        submitted = client.post("/analyze/jobs", json=_payload())
+        assert submitted.status_code == 202
+        job_id = submitted.json()["job_id"]
+        assert submitted.json()["status_url"] == f"/analyze/jobs/{job_id}"
+
+        body = _wait_for_status(client, job_id, {"succeeded", "failed"})
+
+    assert body["status"] == "succeeded"
+    assert body["progress"] == {"stage": "completed", "modules": {"security": "completed", "cost": "completed"}}
+    assert list(body["result"]["modules"]) == ["security", "cost"]
+    assert body["result"]["meta"]["request_id"] == job_id
+
+    # Results survive a restart: a fresh store over the same file still serves the job.
+    restored = JobStore(tmp_path / "jobs.sqlite3").get(job_id)
+    assert restored["status"] == "succeeded"
+    assert restored["result"] == body["result"]
+
+
+def test_job_failure_records_domain_error(monkeypatch, tmp_path):
+    async def _failing_module(*_args, **_kwargs):
+        raise UpstreamModelError("Model service is temporarily unavailable")
+
+    _patch_pipeline(monkeypatch, tmp_path, _failing_module)
+
+    with TestClient(app) as client:
+        job_id = client.post("/analyze/jobs", json=_payload()).json()["job_id"]
+        body = _wait_for_status(client, job_id, {"succeeded", "failed"})
+
+    assert body["status"] == "failed"
+    assert body["error"]["code"] == "UPSTREAM_MODEL_ERROR"
+    assert body["result"] is None
+
+
+def test_job_queue_full_returns_503(monkeypatch, tmp_path):
+    release = asyncio.Event()
+
+    async def _blocked_module(*_args, **_kwargs):
+        await release.wait()
+        return await _ok_module()
+
+    _patch_pipeline(monkeypatch, tmp_path, _blocked_module, queue_depth=1, worker_count=1)
+
+    with TestClient(app) as client:
+        first = client.post("/analyze/jobs", json=_payload()).json()["job_id"]
+        _wait_for_status(client, first, {"running"})
+        assert client.post("/analyze/jobs", json=_payload()).status_code == 202
+        rejected = client.post("/analyze/jobs", json=_payload())
+
+    assert rejected.status_code == 503
+    assert rejected.json()["error"]["code"] == "JOB_QUEUE_FULL"
+    assert rejected.json()["error"]["retryable"] is True
+
+
+def test_unknown_job_returns_404(monkeypatch, tmp_path):
+    _patch_pipeline(monkeypatch, tmp_path, _ok_module)
+
+    with TestClient(app) as client:
+        response = client.get("/analyze/jobs/does-not-exist")
+
+    assert response.status_code == 404
+    assert response.json()["error"]["code"] == "JOB_NOT_FOUND"
+
+
+def test_unfinished_jobs_are_marked_interrupted_on_restart(tmp_path):
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    store.create("job-1", {"mode": "deep"}, {"stage": "queued", "modules": {}})
+    store.close()
+
+    async def _restart():
+        manager = JobManager(db_path=tmp_path / "jobs.sqlite3", worker_count=1, queue_depth=1, runner=None)
+        await manager.start()
+        try:
+            return await manager.get("job-1")
+        finally:
+            await manager.stop()
+
+    job = asyncio.run(_restart())
+    assert job["status"] == "failed"
+    assert job["error"]["code"] == "JOB_INTERRUPTED"
+
+
+def test_finished_jobs_expire_after_the_ttl(tmp_path):
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    for job_id in ["old-done", "old-failed", "fresh-done"]:
+        store.create(job_id, {"mode": "deep"}, {"stage": "queued", "modules": {}})
+    store.update("old-done", status="succeeded")
+    store.update("old-failed", status="failed")
+    store._conn.execute("UPDATE jobs SET updated_at = updated_at - 120 WHERE job_id LIKE 'old-%'")
+    store._conn.commit()
+    store.update("fresh-done", status="succeeded")
+    store.close()
+
+    async def _run():
+        manager = JobManager(
+            db_path=tmp_path / "jobs.sqlite3", worker_count=1, queue_depth=1, runner=None, ttl_seconds=60
+        )
+        await manager.start()
+        try:
+            await asyncio.sleep(0.05)
+            with pytest.raises(JobNotFoundError):
+                await manager.get("old-done")
+            with pytest.raises(JobNotFoundError):
+                await manager.get("old-failed")
+            return await manager.get("fresh-done")
+        finally:
+            await manager.stop()
+
+    assert asyncio.run(_run())["status"] == "succeeded"
@@ -0,0 +1,162 @@
+import asyncio
+import json
+
+import httpx
+from fastapi.testclient import TestClient
+
+import app.main as main_module
+from app.errors import UpstreamModelError
+from app.main import app
+
+from conftest import retrieval_result
+
+
+def _payload(mode: str = "targeted") -> dict:
+    return {
+        "collection": "default",
+        "query": "test",
+        "mode": mode,
+        "top_k": 2,
+        "file_filter": None,
+        "budget_modules": 2,
+    }
+
+
+def _parse_events(raw: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in raw.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def _patch_common(monkeypatch):
+    async def _triage(*_args, **_kwargs):
+        return {"recommended_modules_to_run": ["security", "cost"]}, 0, False
+
+    monkeypatch.setattr(main_module, "_ensure_openai_configured", lambda: None)
+    monkeypatch.setattr(
+        main_module,
+        "retrieve_context",
+        retrieval_result([{"source_file": "a.pdf", "page": 1, "quote": "q"}], "ctx"),
+    )
+    monkeypatch.setattr(main_module, "run_triage", _triage)
+
+
+def test_stream_emits_retrieval_triage_modules_then_complete(monkeypatch):
+    _patch_common(monkeypatch)
+
+    async def _module_review(module_name: str, **_kwargs):
+        # security finishes last, so it must be streamed last.
+        await asyncio.sleep(0.03 if module_name == "security" else 0.0)
+        return {"score": 8.0, "risk": "low", "findings": [], "recommendations": []}, 0, False
+
+    monkeypatch.setattr(main_module, "run_module_review", _module_review)
+
+    response = TestClient(app).post("/analyze/stream", json=_payload())
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _parse_events(response.text)
+    assert [name for name, _ in events] == ["retrieval", "triage", "module", "module", "complete"]
+    assert events[0][1]["sources"] == [{"source_file": "a.pdf", "page": 1}]
+    assert events[1][1]["selected_modules"] == ["security", "cost"]
+    assert [data["module"] for name, data in events if name == "module"] == ["cost", "security"]
+    complete = events[-1][1]
+    assert complete["overall"]["score"] > 0
+    assert complete["meta"]["request_id"] == complete["request_id"]
+    assert len({data["request_id"] for _, data in events}) == 1
+
+
+def test_stream_reports_mid_stream_domain_error_as_typed_event(monkeypatch):
+    _patch_common(monkeypatch)
+
+    async def _module_review(*_args, **_kwargs):
+        raise UpstreamModelError("Model service is temporarily unavailable")
+
+    monkeypatch.setattr(main_module, "run_module_review", _module_review)
+
+    response = TestClient(app).post("/analyze/stream", json=_payload())
+
+    assert response.status_code == 200
+    events = _parse_events(response.text)
+    assert [name for name, _ in events] == ["retrieval", "triage", "error"]
+    error = events[-1][1]
+    assert error["ok"] is False
+    assert error["error"]["code"] == "UPSTREAM_MODEL_ERROR"
+    assert error["error"]["retryable"] is True
+
+
+def test_stream_unexpected_error_maps_to_internal_error_event(monkeypatch):
+    _patch_common(monkeypatch)
+
+    async def _triage(*_args, **_kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(main_module, "run_triage", _triage)
+
+    response = TestClient(app).post("/analyze/stream", json=_payload())
+
+    events = _parse_events(response.text)
+    assert events[-1][0] == "error"
+    assert events[-1][1]["error"]["code"] == "INTERNAL_ERROR"
+
+
+def test_stream_validates_before_opening_stream(monkeypatch):
+    monkeypatch.setattr(main_module.settings, "openai_api_key", None)
+
+    response = TestClient(app).post("/analyze/stream", json=_payload())
+
+    assert response.status_code == 400
+    assert response.json()["error"]["code"] == "PAYLOAD_VALIDATION_ERROR"
+
+
+def test_stream_replays_a_cached_analysis_as_events(monkeypatch):
+    _patch_common(monkeypatch)
+    calls = {"modules": 0}
+
+    async def _module_review(*_args, **_kwargs):
+        calls["modules"] += 1
+        return {"score": 8.0, "risk": "low", "findings": [], "recommendations": []}, 0, False
+
+    monkeypatch.setattr(main_module, "run_module_review", _module_review)
+    client = TestClient(app)
+
+    first = _parse_events(client.post("/analyze/stream", json=_payload()).text)
+    second = _parse_events(client.post("/analyze/stream", json=_payload()).text)
+
+    assert calls["modules"] == 2
+    assert [name for name, _ in second] == ["triage", "module", "module", "complete"]
+    assert second[0][1]["selected_modules"] == ["security", "cost"]
+    assert {data["module"] for name, data in second if name == "module"} == {"security", "cost"}
+    assert first[-1][1]["meta"]["cache"] == "miss"
+    assert second[-1][1]["meta"]["cache"] == "hit"
+    assert second[-1][1]["overall"] == first[-1][1]["overall"]
+
+
+def test_stream_joins_an_identical_analysis_in_flight(monkeypatch):
+    _patch_common(monkeypatch)
+    calls = {"modules": 0}
+
+    async def _module_review(*_args, **_kwargs):
+        calls["modules"] += 1
+        await asyncio.sleep(0.05)
+        return {"score": 8.0, "risk": "low", "findings": [], "recommendations": []}, 0, False
+
+    monkeypatch.setattr(main_module, "run_module_review", _module_review)
+
+    async def _run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(
+                client.post("/analyze", json=_payload()),
+                client.post("/analyze/stream", json=_payload()),
+            )
+
+    plain, streamed = asyncio.run(_run())
+
+    assert calls["modules"] == 2
+    events = _parse_events(streamed.text)
+    assert [name for name, _ in events].count("module") == 2
+    assert events[-1][0] == "complete"
+    assert sorted([plain.json()["meta"]["coalesced"], events[-1][1]["meta"]["coalesced"]]) == [False, True]
@@ -0,0 +1,50 @@
+import asyncio
+
+import app.clients as clients_module
+from app.config import get_settings
+
+
+def test_chat_models_and_embeddings_share_one_pooled_http_client(monkeypatch):
+    monkeypatch.setattr(get_settings(), "openai_api_key", "test-key")
+    monkeypatch.setattr(get_settings(), "llm_max_connections", 7)
+
+    first = clients_module.get_chat_model("gpt-4o-mini")
+    second = clients_module.get_chat_model("gpt-4o-mini")
+    other_model = clients_module.get_chat_model("gpt-4o")
+    embeddings = clients_module.get_embeddings_client()
+
+    try:
+        assert first is second
+        assert other_model is not first
+        async_client = clients_module.get_async_http_client()
+        assert first.http_async_client is async_client
+        assert other_model.http_async_client is async_client
+        assert embeddings.http_async_client is async_client
+        assert embeddings.http_client is clients_module.get_sync_http_client()
+        assert async_client._transport._pool._max_connections == 7
+    finally:
+        asyncio.run(clients_module.close_clients())
+
+
+def test_close_clients_closes_pool_and_rebuilds_lazily(monkeypatch):
+    monkeypatch.setattr(get_settings(), "openai_api_key", "test-key")
+    llm = clients_module.get_chat_model()
+    async_client = clients_module.get_async_http_client()
+
+    asyncio.run(clients_module.close_clients())
+
+    assert async_client.is_closed
+    rebuilt = clients_module.get_chat_model()
+    try:
+        assert rebuilt is not llm
+        assert clients_module.get_async_http_client() is not async_client
+    finally:
+        asyncio.run(clients_module.close_clients())
+
+
+def test_http2_requires_optional_h2_package(monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "llm_http2", True)
+    monkeypatch.setattr(clients_module.importlib.util, "find_spec", lambda _name: None)
+
+    assert clients_module._http2_enabled(settings) is False
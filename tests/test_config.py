@@ -1,3 +1,5 @@
+import pytest
+
 from app.config import Settings
 
 
@@ -5,3 +7,16 @@ def test_ingest_token_defaults_to_none(monkeypatch):
     monkeypatch.delenv("INGEST_TOKEN", raising=False)
     settings = Settings()
     assert settings.ingest_token is None
+
+
+def test_deprecated_char_budgets_are_converted_to_tokens(monkeypatch):
+    monkeypatch.setenv("MAX_CONTEXT_CHARS", "6000")
+    monkeypatch.setenv("MAX_CHUNK_CHARS", "220")
+    monkeypatch.setenv("MAX_CHUNK_TOKENS", "90")
+
+    with pytest.warns(FutureWarning) as caught:
+        settings = Settings()
+
+    assert settings.max_context_tokens == 1500
+    assert settings.max_chunk_tokens == 90
+    assert sorted(str(warning.message).split()[0] for warning in caught) == ["MAX_CHUNK_CHARS", "MAX_CONTEXT_CHARS"]
@@ -0,0 +1,79 @@
+from langchain_core.documents import Document
+
+import app.retrieval as retrieval_module
+import app.tokens as tokens_module
+from app.dedup import jaccard_similarity, mmr_order, shingles, suppress_duplicates
+
+BOILERPLATE = "Confidential draft. This document describes the payments platform owned by the core team."
+
+
+def _doc(text: str, page: int, source_file: str = "a.pdf") -> Document:
+    return Document(
+        id=f"{source_file}-{page}-{len(text)}",
+        page_content=text,
+        metadata={"source_file": source_file, "page": page},
+    )
+
+
+def test_jaccard_similarity_tracks_shared_shingles():
+    base = shingles(BOILERPLATE)
+
+    assert jaccard_similarity(base, shingles(BOILERPLATE + " Revision two.")) == 11 / 13
+    assert jaccard_similarity(base, shingles("Ledger writes are idempotent per request key.")) == 0.0
+
+
+def test_near_duplicate_boilerplate_is_dropped_across_pages():
+    docs = [_doc(BOILERPLATE, 1), _doc("Writes are retried with backoff.", 2), _doc(BOILERPLATE, 7, "b.pdf")]
+
+    kept, removed = suppress_duplicates(docs, threshold=0.8)
+
+    assert [doc.metadata["page"] for doc in kept] == [1, 2]
+    assert removed == [BOILERPLATE]
+
+
+def test_adjacent_splitter_overlap_is_collapsed_into_one_chunk():
+    shared = "the ledger service commits each transfer in a single transaction"
+    first = "Payments flow through the gateway and " + shared
+    second = shared + " before publishing an event to the outbox."
+
+    kept, removed = suppress_duplicates([_doc(second, 3), _doc(first, 3)], threshold=0.8)
+
+    assert len(kept) == 1
+    assert kept[0].page_content == "Payments flow through the gateway and " + second
+    assert kept[0].id == _doc(second, 3).id
+    assert removed == [shared]
+
+
+def test_overlap_on_different_pages_is_not_merged():
+    shared = "the ledger service commits each transfer in a single transaction"
+
+    kept, _ = suppress_duplicates([_doc("Intro " + shared, 1), _doc(shared + " and more.", 2)], threshold=0.95)
+
+    assert len(kept) == 2
+
+
+def test_mmr_pushes_redundant_chunks_down():
+    docs = [
+        _doc(BOILERPLATE, 1),
+        _doc(BOILERPLATE + " Appendix.", 2),
+        _doc("Writes are retried with exponential backoff and jitter.", 3),
+    ]
+
+    ordered = mmr_order(docs, lambda_mult=0.5)
+
+    assert [doc.metadata["page"] for doc in ordered] == [1, 3, 2]
+
+
+def test_build_context_reports_removed_candidate_text(monkeypatch):
+    monkeypatch.setattr(tokens_module, "_encoding", lambda _model_name: None)
+    docs = [_doc(BOILERPLATE, 1), _doc("Writes are retried with backoff.", 2), _doc(BOILERPLATE, 7, "b.pdf")]
+    stats: dict = {}
+
+    items, _, _ = retrieval_module._build_context(docs, "retried", top_k=3, stats=stats)
+
+    assert len(items) == 2
+    assert stats["dedup"] == {
+        "chunks_removed": 1,
+        "candidate_chars_removed": len(BOILERPLATE),
+        "candidate_tokens_removed": -(-len(BOILERPLATE) // 4),
+    }
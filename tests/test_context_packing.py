@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+from langchain_core.documents import Document
+
+import app.retrieval as retrieval_module
+import app.tokens as tokens_module
+from app.config import get_settings
+from app.packing import pack_context, trim_to_relevant_span
+
+# The autouse fixture below replaces the module attribute, so the real lookup is kept for its own test.
+_real_encoding = tokens_module._encoding
+
+
+@pytest.fixture(autouse=True)
+def _heuristic_tokenizer(monkeypatch):
+    # 4 chars per token keeps budgets predictable whether or not tiktoken encodings are cached locally.
+    monkeypatch.setattr(tokens_module, "_encoding", lambda _model_name: None)
+
+
+def _doc(text: str, page: int) -> Document:
+    return Document(page_content=text, metadata={"source_file": "a.pdf", "page": page})
+
+
+def test_trim_keeps_whole_sentences_around_query_span():
+    text = (
+        "The service has three regions. "
+        "Writes use an idempotency key stored for 24 hours. "
+        "Keys are scoped per tenant. "
+        "The dashboard is blue."
+    )
+
+    trimmed = trim_to_relevant_span(text, "idempotency key retention", max_tokens=22, model_name="m")
+
+    assert trimmed == "Writes use an idempotency key stored for 24 hours. Keys are scoped per tenant."
+
+
+def test_trim_hard_cuts_a_single_oversized_sentence():
+    assert trim_to_relevant_span("x" * 100, "x", max_tokens=5, model_name="m") == "x" * 20
+
+
+def test_packer_skips_oversized_chunk_instead_of_stopping():
+    docs = [_doc("a" * 40, 0), _doc("b" * 400, 1), _doc("c" * 40, 2)]
+
+    items, context_text, tokens_used = pack_context(
+        docs, query="q", max_items=3, max_chunk_tokens=200, max_context_tokens=50, model_name="m"
+    )
+
+    assert [item["page"] for item in items] == [0, 2]
+    assert tokens_used <= 50
+    assert context_text.count(" source_file=a.pdf") == 2
+
+
+def test_packer_respects_item_count():
+    docs = [_doc(f"chunk {index}.", index) for index in range(5)]
+
+    items, _, _ = pack_context(
+        docs, query="q", max_items=2, max_chunk_tokens=50, max_context_tokens=500, model_name="m"
+    )
+
+    assert [item["page"] for item in items] == [0, 1]
+
+
+def test_retrieval_overfetches_and_reports_token_budget(monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "max_context_tokens", 100)
+    monkeypatch.setattr(settings, "retrieval_overfetch_factor", 3)
+    requested: list[int] = []
+
+    class _Vectorstore:
+        def similarity_search_by_vector(self, embedding, k, filter=None):
+            requested.append(k)
+            return [_doc(f"Evidence sentence about region {page}.", page) for page in range(k)]
+
+    async def _embed(_text):
+        return [1.0]
+
+    monkeypatch.setattr(retrieval_module, "aembed_query_cached", _embed)
+    monkeypatch.setattr(retrieval_module, "get_vectorstore", lambda *_args, **_kwargs: _Vectorstore())
+    stats: dict = {}
+
+    items, _ = asyncio.run(retrieval_module.retrieve_context("default", "evidence", top_k=2, stats=stats))
+
+    assert requested == [6]
+    assert len(items) == 2
+    assert stats["candidates_considered"] == 6
+    assert stats["context_tokens_used"] > 0
+    assert stats["context_tokens_used"] + stats["context_tokens_remaining"] == 100
+
+
+def test_failed_encoding_load_is_retried_later(monkeypatch):
+    attempts = []
+
+    def _load(model_name):
+        attempts.append(model_name)
+        if len(attempts) == 1:
+            raise OSError("offline")
+        return "encoding"
+
+    clock = iter([100.0, 101.0, 100.0 + tokens_module.ENCODING_RETRY_SECONDS + 1])
+    monkeypatch.setattr(tokens_module, "_ENCODINGS", {})
+    monkeypatch.setattr(tokens_module, "_ENCODING_FAILURES", {})
+    monkeypatch.setattr(tokens_module, "_load_encoding", _load)
+    monkeypatch.setattr(tokens_module.time, "monotonic", lambda: next(clock))
+
+    assert _real_encoding("m") is None
+    assert _real_encoding("m") is None
+    assert _real_encoding("m") == "encoding"
+    assert _real_encoding("m") == "encoding"
+    assert attempts == ["m", "m"]
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+import app.embeddings as embeddings_module
+from app.cache import build_tiered_cache
+from app.embeddings import EmbeddingBatcher
+
+
+class _FakeBatchEmbeddings:
+    def __init__(self, fail: bool = False):
+        self.batches: list[list[str]] = []
+        self.fail = fail
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.batches.append(list(texts))
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise RuntimeError("embeddings down")
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def test_concurrent_queries_share_one_batched_request():
+    backend = _FakeBatchEmbeddings()
+
+    async def _run():
+        batcher = EmbeddingBatcher(backend.aembed_documents, window_seconds=0.02, max_batch_size=16)
+        vectors = await asyncio.gather(*(batcher.embed(text) for text in ["a", "bb", "ccc", "bb"]))
+        return vectors, batcher.stats()
+
+    vectors, stats = asyncio.run(_run())
+
+    assert backend.batches == [["a", "bb", "ccc"]]
+    assert vectors == [[1.0, 1.0], [2.0, 1.0], [3.0, 1.0], [2.0, 1.0]]
+    assert stats["requests"] == 4
+    assert stats["batches"] == 1
+
+
+def test_full_batch_flushes_before_window_expires():
+    backend = _FakeBatchEmbeddings()
+
+    async def _run():
+        batcher = EmbeddingBatcher(backend.aembed_documents, window_seconds=10.0, max_batch_size=2)
+        return await asyncio.wait_for(asyncio.gather(batcher.embed("a"), batcher.embed("b")), timeout=1.0)
+
+    asyncio.run(_run())
+
+    assert backend.batches == [["a", "b"]]
+
+
+def test_batch_failure_reaches_every_waiting_caller():
+    backend = _FakeBatchEmbeddings(fail=True)
+
+    async def _run():
+        batcher = EmbeddingBatcher(backend.aembed_documents, window_seconds=0.005, max_batch_size=16)
+        return await asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True)
+
+    results = asyncio.run(_run())
+
+    assert [str(result) for result in results] == ["embeddings down", "embeddings down"]
+
+
+def test_cancelled_caller_does_not_break_the_batch():
+    backend = _FakeBatchEmbeddings()
+
+    async def _run():
+        batcher = EmbeddingBatcher(backend.aembed_documents, window_seconds=0.01, max_batch_size=16)
+        abandoned = asyncio.create_task(batcher.embed("a"))
+        kept = asyncio.create_task(batcher.embed("b"))
+        await asyncio.sleep(0)
+        abandoned.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await abandoned
+        return await kept
+
+    assert asyncio.run(_run()) == [1.0, 1.0]
+
+
+def test_cached_async_embedding_goes_through_batcher(monkeypatch):
+    backend = _FakeBatchEmbeddings()
+    monkeypatch.setattr(embeddings_module, "get_embeddings", lambda: backend)
+    monkeypatch.setattr(
+        embeddings_module,
+        "_EMBEDDING_CACHE",
+        build_tiered_cache(max_entries=8, ttl_seconds=None, disk_path=None),
+    )
+    monkeypatch.setattr(embeddings_module, "_BATCHER", None)
+    monkeypatch.setattr(embeddings_module, "_EMBED_STATS", {"upstream_calls": 0, "upstream_ms_total": 0.0})
+
+    async def _run():
+        await asyncio.gather(*(embeddings_module.aembed_query_cached(f"query  {i}") for i in range(3)))
+        return await embeddings_module.aembed_query_cached("query 0")
+
+    assert asyncio.run(_run()) == [7.0, 1.0]
+    assert backend.batches == [["query 0", "query 1", "query 2"]]
+    stats = embeddings_module.embedding_cache_stats()
+    assert stats["upstream_calls"] == 1
+    assert stats["batching"]["avg_batch_size"] == 3.0
+
+
+def test_closing_the_batcher_cancels_queued_and_in_flight_batches():
+    backend = _FakeBatchEmbeddings()
+
+    async def _run():
+        batcher = EmbeddingBatcher(backend.aembed_documents, window_seconds=5.0, max_batch_size=2)
+        # Two texts fill a batch and go upstream; the third waits for the window.
+        tasks = [asyncio.create_task(batcher.embed(text)) for text in ["a", "b", "queued"]]
+        await asyncio.sleep(0.001)
+        await batcher.aclose()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = asyncio.run(_run())
+
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+    assert backend.batches == [["a", "b"]]
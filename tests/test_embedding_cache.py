@@ -0,0 +1,129 @@
+import asyncio
+import threading
+
+from langchain_core.documents import Document
+
+import app.embeddings as embeddings_module
+import app.retrieval as retrieval_module
+from app.cache import build_tiered_cache
+from app.config import get_settings
+
+
+class _FakeEmbeddings:
+    def __init__(self):
+        self.calls: list[str] = []
+
+    def embed_query(self, text: str) -> list[float]:
+        self.calls.append(text)
+        return [float(len(text)), 1.0]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return self.embed_query(text)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+class _FakeVectorstore:
+    def __init__(self):
+        self.vectors: list[list[float]] = []
+
+    def similarity_search_by_vector(self, embedding, k, filter=None):
+        self.vectors.append(embedding)
+        return [Document(page_content="Cache the query embedding.", metadata={"source_file": "a.pdf", "page": 2})]
+
+
+def _reset_cache(monkeypatch, disk_path=None) -> _FakeEmbeddings:
+    fake = _FakeEmbeddings()
+    monkeypatch.setattr(embeddings_module, "get_embeddings", lambda: fake)
+    monkeypatch.setattr(
+        embeddings_module,
+        "_EMBEDDING_CACHE",
+        build_tiered_cache(max_entries=8, ttl_seconds=None, disk_path=disk_path),
+    )
+    monkeypatch.setattr(embeddings_module, "_EMBED_STATS", {"upstream_calls": 0, "upstream_ms_total": 0.0})
+    return fake
+
+
+def _embed(text: str) -> list[float]:
+    return asyncio.run(embeddings_module.aembed_query_cached(text))
+
+
+def test_repeated_queries_are_embedded_once(monkeypatch):
+    fake = _reset_cache(monkeypatch)
+
+    first = _embed("Review this design")
+    second = _embed("  Review   this design ")
+
+    assert first == second
+    assert fake.calls == ["Review this design"]
+    stats = embeddings_module.embedding_cache_stats()
+    assert stats["memory_hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["upstream_calls"] == 1
+
+
+def test_cache_key_includes_embedding_model(monkeypatch):
+    fake = _reset_cache(monkeypatch)
+
+    _embed("same text")
+    monkeypatch.setattr(get_settings(), "embedding_model", "text-embedding-3-large")
+    _embed("same text")
+
+    assert len(fake.calls) == 2
+
+
+def test_disk_tier_serves_vectors_after_restart(monkeypatch, tmp_path):
+    path = tmp_path / "embeddings.sqlite3"
+    _reset_cache(monkeypatch, disk_path=path)
+    _embed("persist me")
+
+    fake = _reset_cache(monkeypatch, disk_path=path)
+    vector = _embed("persist me")
+
+    assert fake.calls == []
+    assert vector == [10.0, 1.0]
+    assert embeddings_module.embedding_cache_stats()["disk_hits"] == 1
+
+
+def test_retrieval_searches_by_cached_vector(monkeypatch):
+    fake = _reset_cache(monkeypatch)
+    vectorstore = _FakeVectorstore()
+    monkeypatch.setattr(retrieval_module, "get_vectorstore", lambda *_args, **_kwargs: vectorstore)
+
+    asyncio.run(retrieval_module.retrieve_context(collection="default", query="Review this design", top_k=1))
+    items, _ = asyncio.run(
+        retrieval_module.retrieve_context(collection="default", query="Review this design", top_k=1)
+    )
+
+    assert fake.calls == ["Review this design"]
+    assert vectorstore.vectors == [[18.0, 1.0], [18.0, 1.0]]
+    assert items[0]["source_file"] == "a.pdf"
+
+
+def test_cache_reads_and_writes_run_off_the_event_loop(monkeypatch):
+    _reset_cache(monkeypatch)
+    cache = embeddings_module._EMBEDDING_CACHE
+    threads: list[str] = []
+    original_get, original_set = cache.get, cache.set
+
+    def recording_get(key):
+        threads.append(threading.current_thread().name)
+        return original_get(key)
+
+    def recording_set(key, value):
+        threads.append(threading.current_thread().name)
+        original_set(key, value)
+
+    monkeypatch.setattr(cache, "get", recording_get)
+    monkeypatch.setattr(cache, "set", recording_set)
+
+    async def scenario():
+        await embeddings_module.aembed_query_cached("single query")
+        await embeddings_module.aembed_queries_cached(["first query", "second query"])
+        return threading.current_thread().name
+
+    loop_thread = asyncio.run(scenario())
+
+    assert len(threads) == 6
+    assert loop_thread not in threads
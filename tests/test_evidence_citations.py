@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+from langchain_core.documents import Document
+
+import app.reviewers as reviewers_module
+from app.packing import context_evidence, evidence_id, pack_context
+
+
+class _LLM:
+    temperature = 0.2
+
+    def __init__(self, reply: str):
+        self.reply = reply
+        self.prompts: list[str] = []
+
+    async def ainvoke(self, prompt):
+        self.prompts.append(prompt)
+        return type("Response", (), {"content": self.reply})()
+
+
+def _pack(docs: list[Document]) -> tuple[list[dict], str]:
+    items, context_text, _ = pack_context(
+        docs, query="failover", max_items=5, max_chunk_tokens=40, max_context_tokens=500, model_name="stub"
+    )
+    return items, context_text
+
+
+def test_evidence_ids_are_stable_and_lengthen_on_collision():
+    doc = Document(id="abc12345-6789", page_content="x", metadata={"source_file": "a.pdf", "page": 1})
+
+    assert evidence_id(doc, set()) == "Eabc123"
+    assert evidence_id(doc, {"Eabc123"}) == "Eabc12345"
+    unnamed = Document(page_content="x", metadata={"source_file": "a.pdf", "page": 1})
+    assert evidence_id(unnamed, set()) == evidence_id(unnamed, set())
+
+
+def test_context_evidence_round_trips_packed_items():
+    docs = [
+        Document(id="chunk-a", page_content="Failover is manual.", metadata={"source_file": "a.pdf", "page": 2}),
+        Document(id="chunk-b", page_content="Backups run nightly.", metadata={"source_file": "b pdf.pdf", "page": 0}),
+    ]
+    items, context_text = _pack(docs)
+
+    assert context_evidence(context_text) == {
+        item["id"]: {key: item[key] for key in ("source_file", "page", "quote")} for item in items
+    }
+
+
+def test_module_review_expands_cited_ids_into_quotes(monkeypatch):
+    docs = [
+        Document(id="chunk-a", page_content="Failover is manual.", metadata={"source_file": "a.pdf", "page": 2}),
+        Document(id="chunk-b", page_content="Backups run nightly.", metadata={"source_file": "b.pdf", "page": 5}),
+    ]
+    items, context_text = _pack(docs)
+    first, second = items[0]["id"], items[1]["id"]
+    reply = {
+        "score": 4,
+        "risk": "high",
+        "findings": [
+            {
+                "title": "Manual failover",
+                "severity": "high",
+                "details": "d",
+                "impact": "i",
+                "evidence": [first, f"[id={first}]", "E999999", second],
+            }
+        ],
+        "recommendations": [{"title": "Automate failover", "effort": "low", "steps": [], "evidence": []}],
+    }
+    llm = _LLM(json.dumps(reply))
+    monkeypatch.setattr(reviewers_module, "_build_llm", lambda _model_name=None: llm)
+
+    review, _, _ = asyncio.run(reviewers_module.run_module_review("reliability", context_text, "failover"))
+
+    assert review["findings"][0]["evidence"] == [
+        {"source_file": "a.pdf", "page": 2, "quote": "Failover is manual."},
+        {"source_file": "b.pdf", "page": 5, "quote": "Backups run nightly."},
+    ]
+    assert review["recommendations"][0]["evidence"] == []
+    assert f"[id={first} source_file=a.pdf page=2]" in llm.prompts[0]
+    assert '"evidence":["<context id>"]' in llm.prompts[0]
@@ -77,6 +77,9 @@ def test_ingest_same_filename_creates_unique_stored_paths(monkeypatch, tmp_path)
             _ = ids
             stored_metadatas.extend([doc.metadata for doc in docs])
 
+        def get(self, include):
+            return {"ids": [], "documents": [], "metadatas": []}
+
     monkeypatch.setattr(
         ingest_module,
         "get_settings",
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from app.json_repair import coerce_to_schema, repair_json_text, repair_structured_output
+from app.llm_client import invoke_json_with_retries, start_json_repairs
+from app.models import ModuleReviewOutput, TriageOutput
+from benchmarks.bench_json_repair import build_corpus
+
+
+class _LLM:
+    def __init__(self, replies: list[str]):
+        self.replies = replies
+        self.calls = 0
+
+    async def ainvoke(self, _prompt):
+        reply = self.replies[self.calls]
+        self.calls += 1
+        return type("Response", (), {"content": reply})()
+
+
+@pytest.mark.parametrize(
+    ("text", "expected"),
+    [
+        ('{"a": [1, 2,], "b": {"c": 3,},}', {"a": [1, 2], "b": {"c": 3}}),
+        ("{'a': 'it\\'s', 'b': True, 'c': None}", {"a": "it's", "b": True, "c": None}),
+        ('{"a": "line one\nline two"}', {"a": "line one\nline two"}),
+        ("{a: 1, b_c: 'x'}", {"a": 1, "b_c": "x"}),
+        ('Sure! ```json\n{"a": 1}\n``` Hope that helps.', {"a": 1}),
+        ('{"a": [{"b": 1}, {"b": 2', {"a": [{"b": 1}, {"b": 2}]}),
+        ('{"a": 1, "b": "unterminated', {"a": 1, "b": "unterminated"}),
+        ('{"a": 1, "b":', {"a": 1}),
+    ],
+)
+def test_repair_json_text_handles_common_breakage(text, expected):
+    assert repair_json_text(text) == expected
+
+
+def test_unrecoverable_text_returns_none():
+    assert repair_json_text("I could not review this design.") is None
+    assert repair_structured_output("not-json", TriageOutput) is None
+
+
+def test_schema_coercion_maps_near_misses_and_rejects_unknown_values():
+    coerced = coerce_to_schema(
+        {
+            "Score": "7/10",
+            "risk": "Critical",
+            "findings": {"title": "t", "severity": "minor", "details": "d", "impact": "i"},
+            "questions-for-author": "What is the RPO?",
+        },
+        ModuleReviewOutput,
+    )
+    assert coerced["score"] == 7.0
+    assert coerced["risk"] == "high"
+    assert coerced["findings"][0]["severity"] == "low"
+    assert coerced["questions_for_author"] == ["What is the RPO?"]
+
+    assert coerce_to_schema({"score": 5, "risk": "catastrophic"}, ModuleReviewOutput) is None
+    assert coerce_to_schema({"score": "unknown", "risk": "low"}, ModuleReviewOutput) is None
+
+
+def test_fuzz_corpus_repairs_locally():
+    corpus = build_corpus(size=160, seed=11)
+    for name, text, schema, expected in corpus:
+        repaired = repair_structured_output(text, schema)
+        assert repaired is not None, (name, text)
+        if name != "truncated":
+            assert repaired == expected, (name, text)
+
+
+def test_local_repair_skips_the_second_model_call():
+    llm = _LLM(["```json\n{'score': 6, 'risk': 'Moderate', 'findings': [],}\n```", "unused"])
+
+    async def _run():
+        repairs = start_json_repairs()
+        result = await invoke_json_with_retries(
+            llm, "prompt", ModuleReviewOutput, timeout_seconds=1.0, max_retries=0, base_backoff_seconds=0
+        )
+        return result, repairs
+
+    (parsed, _, repaired), repairs = asyncio.run(_run())
+
+    assert (parsed["score"], parsed["risk"], repaired) == (6.0, "medium", True)
+    assert llm.calls == 1
+    assert repairs == {"local": 1, "remote": 0}
+
+
+def test_unrepairable_reply_falls_back_to_the_model():
+    llm = _LLM(["I need more context.", '{"score": 4, "risk": "low"}'])
+
+    async def _run():
+        repairs = start_json_repairs()
+        result = await invoke_json_with_retries(
+            llm, "prompt", ModuleReviewOutput, timeout_seconds=1.0, max_retries=0, base_backoff_seconds=0
+        )
+        return result, repairs
+
+    (parsed, _, repaired), repairs = asyncio.run(_run())
+
+    assert (parsed["score"], repaired) == (4.0, True)
+    assert llm.calls == 2
+    assert repairs == {"local": 0, "remote": 1}
@@ -0,0 +1,200 @@
+import asyncio
+from io import BytesIO
+from types import SimpleNamespace
+
+import pytest
+from fastapi import UploadFile
+from langchain_core.documents import Document
+
+import app.ingest as ingest_module
+import app.retrieval as retrieval_module
+from app.lexical import LexicalIndex, add_to_lexical_index, delete_lexical_index, lexical_search
+
+
+def _docs() -> tuple[list[Document], list[str]]:
+    docs = [
+        Document(page_content="Every write carries an idempotency key.", metadata={"source_file": "a.pdf", "page": 1}),
+        Document(page_content="The p99 latency budget is 250 ms.", metadata={"source_file": "a.pdf", "page": 2}),
+        Document(page_content="Billing service retries on timeout.", metadata={"source_file": "b.pdf", "page": 0}),
+    ]
+    return docs, ["chunk-a1", "chunk-a2", "chunk-b0"]
+
+
+def _fail(*_args, **_kwargs):
+    raise AssertionError("lexical retrieval must not touch embeddings or Chroma")
+
+
+def test_index_ranks_exact_technical_terms():
+    index = LexicalIndex.from_chunks(
+        [
+            {"id": "1", "source_file": "a.pdf", "page": 0, "text": "retry policy for the payment service"},
+            {"id": "2", "source_file": "a.pdf", "page": 1, "text": "p99 latency p99 latency under load"},
+            {"id": "3", "source_file": "b.pdf", "page": 0, "text": "latency dashboards"},
+        ]
+    )
+
+    results = index.search("P99 latency?", top_k=2)
+
+    assert [doc.id for doc, _ in results] == ["2", "3"]
+    assert results[0][1] > results[1][1]
+    assert index.search("p99", top_k=5, file_filter="b.pdf") == []
+
+
+def test_index_is_persisted_per_collection_and_merged_on_reingest():
+    docs, ids = _docs()
+    add_to_lexical_index("designs", docs[:2], ids[:2])
+    add_to_lexical_index("designs", docs[1:], ids[1:])
+
+    results = lexical_search("designs", "billing timeout", top_k=3)
+
+    assert [doc.id for doc, _ in results] == ["chunk-b0"]
+    assert lexical_search("other", "billing", top_k=3) == []
+    delete_lexical_index("designs")
+    assert lexical_search("designs", "billing", top_k=3) == []
+
+
+def test_each_ingest_writes_only_its_own_file_segment(tmp_path):
+    docs, ids = _docs()
+    add_to_lexical_index("designs", docs[:2], ids[:2])
+    index_dir = next((tmp_path / "chroma" / "lexical").iterdir())
+    first_segments = {path.name: path.stat().st_mtime_ns for path in index_dir.glob("*.json")}
+    del first_segments["manifest.json"]
+
+    add_to_lexical_index("designs", docs[2:], ids[2:])
+
+    segments = {path.name: path.stat().st_mtime_ns for path in index_dir.glob("*.json")}
+    del segments["manifest.json"]
+    assert len(segments) == 2
+    assert all(segments[name] == mtime for name, mtime in first_segments.items())
+    assert [doc.id for doc, _ in lexical_search("designs", "billing latency", top_k=3, file_filter="a.pdf")] == [
+        "chunk-a2"
+    ]
+    # A file filter narrows the chunks but keeps collection-wide BM25 statistics.
+    unfiltered = lexical_search("designs", "latency", top_k=3)
+    filtered = lexical_search("designs", "latency", top_k=3, file_filter="a.pdf")
+    assert filtered[0][1] == pytest.approx(unfiltered[0][1], rel=1e-6)
+
+
+def test_lexical_mode_makes_no_embedding_or_vector_call(monkeypatch):
+    docs, ids = _docs()
+    add_to_lexical_index("default", docs, ids)
+    monkeypatch.setattr(retrieval_module, "aembed_query_cached", _fail)
+    monkeypatch.setattr(retrieval_module, "get_vectorstore", _fail)
+
+    items, context_text = asyncio.run(
+        retrieval_module.retrieve_context(collection="default", query="idempotency key", top_k=2, mode="lexical")
+    )
+
+    assert items == [
+        {"id": "Echunka", "source_file": "a.pdf", "page": 1, "quote": "Every write carries an idempotency key."}
+    ]
+    assert "idempotency key" in context_text
+
+
+def test_hybrid_mode_fuses_vector_and_lexical_rankings(monkeypatch):
+    docs, ids = _docs()
+    add_to_lexical_index("default", docs, ids)
+
+    class _Vectorstore:
+        def similarity_search_by_vector(self, embedding, k, filter=None):
+            return [
+                Document(id="chunk-b0", page_content=docs[2].page_content, metadata=docs[2].metadata),
+                Document(id="chunk-a2", page_content=docs[1].page_content, metadata=docs[1].metadata),
+            ]
+
+    async def _embed(_text):
+        return [1.0, 0.0]
+
+    monkeypatch.setattr(retrieval_module, "aembed_query_cached", _embed)
+    monkeypatch.setattr(retrieval_module, "get_vectorstore", lambda *_args, **_kwargs: _Vectorstore())
+
+    items, _ = asyncio.run(
+        retrieval_module.retrieve_context(collection="default", query="p99 latency", top_k=2, mode="hybrid")
+    )
+
+    # chunk-a2 ranks in both lists, so fusion puts it ahead of the vector-only top hit.
+    assert [(item["source_file"], item["page"]) for item in items] == [("a.pdf", 2), ("b.pdf", 0)]
+
+
+def test_similar_collection_names_keep_separate_indexes():
+    docs, ids = _docs()
+    add_to_lexical_index("team/a", docs[:1], ids[:1])
+    add_to_lexical_index("team_a", docs[2:], ids[2:])
+
+    assert [doc.id for doc, _ in lexical_search("team/a", "idempotency billing", top_k=3)] == ["chunk-a1"]
+    assert [doc.id for doc, _ in lexical_search("team_a", "idempotency billing", top_k=3)] == ["chunk-b0"]
+
+
+def test_missing_index_is_backfilled_from_the_stored_chunks(monkeypatch):
+    docs, ids = _docs()
+    reads = []
+
+    class _Vectorstore:
+        def get(self, include):
+            reads.append(include)
+            return {
+                "ids": ids,
+                "documents": [doc.page_content for doc in docs],
+                "metadatas": [doc.metadata for doc in docs],
+            }
+
+    monkeypatch.setattr(retrieval_module, "aembed_query_cached", _fail)
+    monkeypatch.setattr(retrieval_module, "get_vectorstore", lambda *_args, **_kwargs: _Vectorstore())
+
+    async def _run():
+        first = await retrieval_module.retrieve_context(
+            collection="legacy", query="billing timeout", top_k=1, mode="lexical"
+        )
+        second = await retrieval_module.retrieve_context(
+            collection="legacy", query="p99 latency", top_k=1, mode="lexical"
+        )
+        return first, second
+
+    (first_items, _), (second_items, _) = asyncio.run(_run())
+
+    assert first_items[0]["source_file"] == "b.pdf"
+    assert second_items[0]["page"] == 2
+    assert reads == [["documents", "metadatas"]]
+
+
+def test_first_ingest_into_a_legacy_collection_keeps_its_stored_chunks(monkeypatch, tmp_path):
+    docs, ids = _docs()
+    stored = {
+        "ids": list(ids),
+        "documents": [doc.page_content for doc in docs],
+        "metadatas": [doc.metadata for doc in docs],
+    }
+
+    class _Loader:
+        def __init__(self, _path):
+            pass
+
+        def load(self):
+            return [Document(page_content="Queue consumers ack after commit.", metadata={"page": 0})]
+
+    class _Vectorstore:
+        def add_documents(self, new_docs, ids):
+            stored["ids"].extend(ids)
+            stored["documents"].extend(doc.page_content for doc in new_docs)
+            stored["metadatas"].extend(doc.metadata for doc in new_docs)
+
+        def get(self, include):
+            return stored
+
+    monkeypatch.setattr(
+        ingest_module,
+        "get_settings",
+        lambda: SimpleNamespace(
+            uploads_dir=tmp_path, max_upload_bytes=1024 * 1024, allowed_upload_content_types="application/pdf"
+        ),
+    )
+    monkeypatch.setattr(ingest_module, "PyPDFLoader", _Loader)
+    monkeypatch.setattr(ingest_module, "get_vectorstore", lambda *_args, **_kwargs: _Vectorstore())
+    upload = UploadFile(
+        filename="queue.pdf", file=BytesIO(b"%PDF-1.4 queue"), headers={"content-type": "application/pdf"}
+    )
+
+    ingest_module.ingest_pdf(upload, "legacy")
+
+    assert [doc.id for doc, _ in lexical_search("legacy", "idempotency key", top_k=1)] == ["chunk-a1"]
+    assert lexical_search("legacy", "queue consumers", top_k=1)[0][0].page_content.startswith("Queue")
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+
+import httpx
+import pytest
+from openai import APIStatusError
+
+import app.circuit as circuit_module
+import app.llm_client as llm_client
+from app.circuit import CircuitBreaker, RetryBudget
+from app.errors import UpstreamModelError
+from app.limiter import AdaptiveLimiter
+
+
+def _fixed_limiter() -> AdaptiveLimiter:
+    return AdaptiveLimiter(initial_limit=4, min_limit=4, max_limit=4, max_wait_seconds=1.0)
+
+
+def _server_error() -> APIStatusError:
+    request = httpx.Request("POST", "http://llm.test/v1/chat/completions")
+    response = httpx.Response(500, request=request)
+    return APIStatusError("boom", response=response, body=None)
+
+
+class _FailingLLM:
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.calls = 0
+
+    async def ainvoke(self, _prompt):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise _server_error()
+        return type("Response", (), {"content": '{"ok": true}'})()
+
+
+def _invoke(llm, max_retries=0):
+    return asyncio.run(
+        llm_client._invoke_with_retry(llm, "ping", timeout_seconds=1.0, max_retries=max_retries, base_backoff_seconds=0)
+    )
+
+
+def test_breaker_opens_fails_fast_and_recovers_through_half_open(monkeypatch, caplog):
+    clock = {"now": 100.0}
+    monkeypatch.setattr(circuit_module.time, "monotonic", lambda: clock["now"])
+    monkeypatch.setattr(llm_client, "_LLM_LIMITER", None)
+    breaker = CircuitBreaker(failure_threshold=2, recovery_seconds=5.0)
+    monkeypatch.setattr(llm_client, "_CIRCUIT_BREAKER", breaker)
+    monkeypatch.setattr(llm_client, "get_llm_limiter", _fixed_limiter)
+    llm = _FailingLLM(failures=3)
+
+    with caplog.at_level(logging.WARNING, logger="app.circuit"):
+        for _ in range(2):
+            with pytest.raises(UpstreamModelError):
+                _invoke(llm)
+        assert breaker.state == "open"
+
+        with pytest.raises(UpstreamModelError, match="circuit open"):
+            _invoke(llm)
+        assert llm.calls == 2
+
+        clock["now"] += 5.0
+        with pytest.raises(UpstreamModelError):
+            _invoke(llm)
+        assert breaker.state == "open"
+        assert llm.calls == 3
+
+        clock["now"] += 5.0
+        content, _ = _invoke(llm)
+
+    assert content == '{"ok": true}'
+    assert breaker.state == "closed"
+    assert breaker.stats()["short_circuited"] == 1
+    transitions = [(r.previous_state, r.circuit_state) for r in caplog.records if r.msg == "circuit_state_change"]
+    assert transitions == [
+        ("closed", "open"),
+        ("open", "half_open"),
+        ("half_open", "open"),
+        ("open", "half_open"),
+        ("half_open", "closed"),
+    ]
+
+
+def test_retry_budget_caps_retries_relative_to_recent_requests(monkeypatch):
+    budget = RetryBudget(ratio=0.5, min_retries=1, window_seconds=10.0)
+    monkeypatch.setattr(llm_client, "_RETRY_BUDGET", budget)
+    monkeypatch.setattr(llm_client, "get_llm_limiter", _fixed_limiter)
+    monkeypatch.setattr(llm_client, "_CIRCUIT_BREAKER", CircuitBreaker(failure_threshold=100, recovery_seconds=1.0))
+
+    for _ in range(4):
+        budget.record_request()
+    # One retry of floor plus half of five recent requests allows four retries before the budget runs dry.
+    llm = _FailingLLM(failures=10)
+    with pytest.raises(UpstreamModelError):
+        _invoke(llm, max_retries=8)
+
+    assert llm.calls == 5
+    stats = budget.stats()
+    assert stats["retries_in_window"] == 4
+    assert stats["denied"] == 1
+
+
+def test_retry_budget_window_expires(monkeypatch):
+    clock = {"now": 0.0}
+    monkeypatch.setattr(circuit_module.time, "monotonic", lambda: clock["now"])
+    budget = RetryBudget(ratio=0.0, min_retries=1, window_seconds=10.0)
+
+    assert budget.try_spend()
+    assert not budget.try_spend()
+    clock["now"] += 11.0
+    assert budget.try_spend()
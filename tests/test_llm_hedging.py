@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+
+import app.llm_client as llm_client
+from app.config import get_settings
+from app.errors import UpstreamTimeoutError
+from app.limiter import AdaptiveLimiter, LatencyTracker
+
+
+class _ScriptedLLM:
+    model_name = "hedge-model"
+
+    def __init__(self, delays: list[float]):
+        self.delays = delays
+        self.calls = 0
+        self.cancelled = 0
+
+    async def ainvoke(self, _prompt):
+        delay = self.delays[min(self.calls, len(self.delays) - 1)]
+        self.calls += 1
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return type("Response", (), {"content": f"slept {delay}"})()
+
+
+def _primed_tracker(seconds: float) -> LatencyTracker:
+    tracker = LatencyTracker(window_size=50, min_samples=5)
+    for _ in range(10):
+        tracker.record(seconds)
+    return tracker
+
+
+def _invoke(llm):
+    async def _run():
+        hedges = llm_client.start_llm_hedges()
+        result = await llm_client._invoke_with_retry(
+            llm, "ping", timeout_seconds=2.0, max_retries=0, base_backoff_seconds=0
+        )
+        return result, hedges
+
+    return asyncio.run(_run())
+
+
+def test_slow_call_is_hedged_and_faster_duplicate_wins(monkeypatch):
+    monkeypatch.setattr(get_settings(), "llm_hedging_enabled", True)
+    tracker = _primed_tracker(0.02)
+    monkeypatch.setattr(llm_client, "_LATENCY_TRACKERS", {"hedge-model": tracker})
+    llm = _ScriptedLLM([1.0, 0.01])
+
+    (content, _), hedges = _invoke(llm)
+
+    assert content == "slept 0.01"
+    assert hedges == {"hedges_sent": 1, "hedges_won": 1}
+    assert llm.calls == 2
+    assert llm.cancelled == 1
+    assert tracker.stats(95.0)["hedges_won"] == 1
+
+
+def test_fast_call_and_disabled_hedging_send_one_request(monkeypatch):
+    tracker = _primed_tracker(0.02)
+    monkeypatch.setattr(llm_client, "_LATENCY_TRACKERS", {"hedge-model": tracker})
+
+    slow = _ScriptedLLM([0.2, 0.01])
+    _, hedges = _invoke(slow)
+    assert slow.calls == 1
+    assert hedges == {"hedges_sent": 0, "hedges_won": 0}
+
+    monkeypatch.setattr(get_settings(), "llm_hedging_enabled", True)
+    fast = _ScriptedLLM([0.0])
+    _, hedges = _invoke(fast)
+    assert fast.calls == 1
+    assert hedges["hedges_sent"] == 0
+
+
+def test_no_hedge_without_enough_samples_or_spare_limiter_capacity(monkeypatch):
+    monkeypatch.setattr(get_settings(), "llm_hedging_enabled", True)
+    cold = LatencyTracker(window_size=50, min_samples=5)
+    monkeypatch.setattr(llm_client, "_LATENCY_TRACKERS", {"hedge-model": cold})
+    llm = _ScriptedLLM([0.1, 0.01])
+    _, hedges = _invoke(llm)
+    assert hedges["hedges_sent"] == 0
+
+    monkeypatch.setattr(llm_client, "_LATENCY_TRACKERS", {"hedge-model": _primed_tracker(0.01)})
+    saturated = AdaptiveLimiter(initial_limit=1, min_limit=1, max_limit=1, max_wait_seconds=1.0)
+    monkeypatch.setattr(llm_client, "_LLM_LIMITER", saturated)
+    llm = _ScriptedLLM([0.1, 0.01])
+    _, hedges = _invoke(llm)
+    assert llm.calls == 1
+    assert hedges["hedges_sent"] == 0
+
+
+def test_latency_tracker_percentile():
+    tracker = LatencyTracker(window_size=100, min_samples=3)
+    assert tracker.percentile(95.0) is None
+    for value in range(1, 101):
+        tracker.record(value / 1000)
+    assert tracker.percentile(50.0) == 0.051
+    assert tracker.percentile(95.0) == 0.096
+
+
+def test_timed_out_calls_are_recorded_at_the_timeout(monkeypatch):
+    tracker = LatencyTracker(window_size=50, min_samples=1)
+    monkeypatch.setattr(llm_client, "_LATENCY_TRACKERS", {"hedge-model": tracker})
+
+    async def _run():
+        llm_client.start_llm_hedges()
+        return await llm_client._invoke_with_retry(
+            _ScriptedLLM([1.0]), "ping", timeout_seconds=0.05, max_retries=0, base_backoff_seconds=0
+        )
+
+    with pytest.raises(UpstreamTimeoutError):
+        asyncio.run(_run())
+
+    assert tracker.percentile(50.0) == 0.05
+
+
+def test_cancelled_hedge_losers_are_not_recorded(monkeypatch):
+    monkeypatch.setattr(get_settings(), "llm_hedging_enabled", True)
+    tracker = _primed_tracker(0.02)
+    monkeypatch.setattr(llm_client, "_LATENCY_TRACKERS", {"hedge-model": tracker})
+    llm = _ScriptedLLM([1.0, 0.01])
+
+    _invoke(llm)
+
+    assert llm.cancelled == 1
+    # Ten primed samples plus the winning hedge; the cut-short primary adds nothing.
+    assert tracker.stats(95.0)["samples"] == 11
+    assert tracker.percentile(100.0) < 0.5
@@ -0,0 +1,236 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+from langchain_openai import ChatOpenAI
+from openai import RateLimitError
+
+import app.llm_client as llm_client
+from app.errors import UpstreamOverloadedError
+from app.limiter import AdaptiveLimiter, retry_after_seconds
+from benchmarks.stub_server import StubOpenAIServer, chat_completion
+
+
+def _rate_limit_error(headers: dict | None = None) -> RateLimitError:
+    request = httpx.Request("POST", "http://llm.test/v1/chat/completions")
+    response = httpx.Response(429, headers=headers or {}, request=request)
+    return RateLimitError("rate limited", response=response, body=None)
+
+
+def _limiter(**overrides) -> AdaptiveLimiter:
+    options = {"initial_limit": 4, "min_limit": 1, "max_limit": 8, "max_wait_seconds": 1.0}
+    options.update(overrides)
+    return AdaptiveLimiter(**options)
+
+
+def test_retry_after_header_forms():
+    assert retry_after_seconds(_rate_limit_error({"retry-after": "2"})) == 2.0
+    assert retry_after_seconds(_rate_limit_error({"retry-after-ms": "250"})) == 0.25
+    assert retry_after_seconds(_rate_limit_error()) is None
+    assert retry_after_seconds(RuntimeError("no response")) is None
+
+
+def test_limit_grows_additively_and_halves_once_per_congestion_window():
+    limiter = _limiter()
+
+    async def _ok():
+        return "ok"
+
+    async def _rate_limited():
+        await asyncio.sleep(0.01)
+        raise _rate_limit_error()
+
+    async def _run():
+        for _ in range(4):
+            await limiter.run(_ok)
+        grown = limiter.limit
+        # Three calls hit the same congestion event; only the first cut applies.
+        await asyncio.gather(*(limiter.run(_rate_limited) for _ in range(3)), return_exceptions=True)
+        return grown
+
+    grown = asyncio.run(_run())
+
+    assert 4.9 < grown < 5.0
+    assert limiter.limit == pytest.approx(grown / 2)
+    assert limiter.stats()["overloads"] == 3
+
+
+def test_adaptive_limit_is_not_capped_by_llm_concurrency(monkeypatch):
+    settings = llm_client.get_settings()
+    monkeypatch.setattr(settings, "llm_concurrency", 2)
+    monkeypatch.setattr(settings, "llm_adaptive_limit_max", 8)
+    active = 0
+    max_active = 0
+
+    async def _call():
+        nonlocal active, max_active
+        active += 1
+        max_active = max(max_active, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+
+    async def _run():
+        limiter = llm_client.get_llm_limiter()
+        for _ in range(40):
+            await limiter.run(_call)
+        await asyncio.gather(*(limiter.run(_call) for _ in range(8)))
+
+    asyncio.run(_run())
+
+    assert llm_client.get_llm_limiter().limit == 8
+    assert max_active == 8
+
+
+def test_disabled_adaptation_holds_a_fixed_llm_concurrency_cap(monkeypatch):
+    settings = llm_client.get_settings()
+    monkeypatch.setattr(settings, "llm_adaptive_limit_enabled", False)
+    monkeypatch.setattr(settings, "llm_concurrency", 2)
+
+    async def _ok():
+        return "ok"
+
+    async def _run():
+        limiter = llm_client.get_llm_limiter()
+        for _ in range(10):
+            await limiter.run(_ok)
+        return limiter.limit
+
+    assert asyncio.run(_run()) == 2
+
+
+def test_retry_after_pauses_new_calls_and_saturation_is_rejected():
+    limiter = _limiter(max_wait_seconds=0.05)
+
+    async def _rate_limited():
+        raise _rate_limit_error({"retry-after": "0.3"})
+
+    async def _ok():
+        return "ok"
+
+    async def _run():
+        with pytest.raises(RateLimitError):
+            await limiter.run(_rate_limited)
+        with pytest.raises(UpstreamOverloadedError):
+            await limiter.run(_ok)
+        limiter.max_wait_seconds = 1.0
+        start = time.monotonic()
+        await limiter.run(_ok)
+        return time.monotonic() - start
+
+    waited = asyncio.run(_run())
+
+    assert waited >= 0.15
+    stats = limiter.stats()
+    assert stats["rejections"] == 1
+    assert stats["retry_after_honored"] == 1
+    assert stats["max_queue_wait_ms"] >= 150
+
+
+def test_waiters_get_slots_in_arrival_order_without_barging():
+    limiter = _limiter(initial_limit=1, max_limit=1)
+    order: list[str] = []
+    release = asyncio.Event()
+
+    async def _hold():
+        await release.wait()
+
+    def _record(name: str):
+        async def _call():
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+        return _call
+
+    async def _run():
+        holder = asyncio.create_task(limiter.run(_hold))
+        await asyncio.sleep(0)
+        waiters = []
+        for name in ["first", "second", "third"]:
+            waiters.append(asyncio.create_task(limiter.run(_record(name))))
+            await asyncio.sleep(0.005)
+        # Waiting well past any internal re-check interval must not reshuffle the queue.
+        await asyncio.sleep(0.08)
+        queued = limiter.stats()["queued"]
+        release.set()
+        await asyncio.sleep(0)
+        # Arrives while the queue drains, so it must line up behind the earlier waiters.
+        waiters.append(asyncio.create_task(limiter.run(_record("late"))))
+        await asyncio.gather(holder, *waiters)
+        return queued
+
+    assert asyncio.run(_run()) == 3
+    assert order == ["first", "second", "third", "late"]
+    assert limiter.in_flight == 0
+
+
+def test_cancelled_waiters_never_strand_a_slot():
+    limiter = _limiter(initial_limit=1, max_limit=1)
+
+    async def _ok():
+        return "ok"
+
+    async def _run():
+        await limiter._acquire()
+        queued = asyncio.create_task(limiter.run(_ok))
+        handed = asyncio.create_task(limiter.run(_ok))
+        behind = asyncio.create_task(limiter.run(_ok))
+        await asyncio.sleep(0)
+        queued.cancel()
+        await asyncio.sleep(0)
+        # The release hands the slot to the next waiter, which is cancelled before it gets to run.
+        limiter._release(None, time.monotonic())
+        handed.cancel()
+        results = await asyncio.gather(queued, handed, behind, return_exceptions=True)
+        return results, limiter.stats()
+
+    results, stats = asyncio.run(_run())
+
+    assert isinstance(results[0], asyncio.CancelledError)
+    assert results[2] == "ok"
+    assert limiter.in_flight == 0
+    assert stats["queued"] == 0
+
+
+def test_limiter_converges_under_local_rate_limited_server(monkeypatch):
+    window_seconds = 0.2
+    allowed_per_window = 4
+    lock = threading.Lock()
+    window = {"start": time.monotonic(), "count": 0}
+
+    def _responder(_path, _body):
+        with lock:
+            now = time.monotonic()
+            if now - window["start"] >= window_seconds:
+                window.update(start=now, count=0)
+            window["count"] += 1
+            if window["count"] > allowed_per_window:
+                remaining_ms = int((window["start"] + window_seconds - now) * 1000) + 1
+                return 429, {"retry-after-ms": str(remaining_ms)}, {"error": {"message": "rate limited"}}
+        return 200, {}, chat_completion('{"ok": true}')
+
+    limiter = _limiter(initial_limit=16, max_limit=16, max_wait_seconds=10.0)
+    monkeypatch.setattr(llm_client, "_LLM_LIMITER", limiter)
+
+    with StubOpenAIServer(responder=_responder, latency_seconds=0.02) as server:
+        llm = ChatOpenAI(model="stub", api_key="stub", base_url=server.base_url, max_retries=0)
+
+        async def _run():
+            return await asyncio.gather(
+                *(
+                    llm_client._invoke_with_retry(
+                        llm, "ping", timeout_seconds=5.0, max_retries=8, base_backoff_seconds=0.01
+                    )
+                    for _ in range(24)
+                )
+            )
+
+        results = asyncio.run(_run())
+
+    assert all(content == '{"ok": true}' for content, _ in results)
+    stats = limiter.stats()
+    assert stats["successes"] == 24
+    assert stats["overloads"] > 0
+    assert stats["retry_after_honored"] > 0
+    assert stats["limit"] < 16
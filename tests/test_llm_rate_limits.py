@@ -0,0 +1,115 @@
+import asyncio
+import time
+
+import pytest
+
+import app.llm_client as llm_client
+import app.tokens as tokens_module
+from app.config import get_settings
+from app.errors import UpstreamModelError, UpstreamOverloadedError
+from app.limiter import RateLimitScheduler
+
+
+class _Resp:
+    def __init__(self, total_tokens: int):
+        self.content = "{}"
+        self.usage_metadata = {"input_tokens": total_tokens - 10, "output_tokens": 10, "total_tokens": total_tokens}
+
+
+class _LLM:
+    model_name = "tiny-model"
+    max_tokens = 100
+
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, _prompt: str):
+        self.calls += 1
+        return _Resp(total_tokens=150)
+
+
+def test_token_budget_makes_calls_wait_while_request_budget_is_fine():
+    scheduler = RateLimitScheduler(rpm=600, tpm=6000, max_wait_seconds=5.0)
+
+    async def _run():
+        await scheduler.acquire(6000)
+        start = time.monotonic()
+        await scheduler.acquire(50)
+        return time.monotonic() - start
+
+    waited = asyncio.run(_run())
+
+    # 6000 TPM refills 100 tokens per second, so 50 tokens take about half a second.
+    assert 0.4 <= waited < 1.0
+    stats = scheduler.stats()
+    assert stats["waited"] == 1
+    assert stats["rpm"]["fill"] > 0.99
+    assert stats["tpm"]["available"] < 60
+
+
+def test_wait_longer_than_budget_is_rejected_without_sending():
+    scheduler = RateLimitScheduler(rpm=None, tpm=600, max_wait_seconds=0.5)
+
+    async def _run():
+        await scheduler.acquire(600)
+        await scheduler.acquire(100)
+
+    with pytest.raises(UpstreamOverloadedError):
+        asyncio.run(_run())
+    assert scheduler.stats()["rejections"] == 1
+
+
+def test_calls_reserve_prompt_plus_output_estimate_and_settle_on_usage(monkeypatch):
+    monkeypatch.setattr(tokens_module, "_encoding", lambda _model_name: None)
+    monkeypatch.setattr(get_settings(), "llm_rate_limits", {"tiny-model": {"rpm": 60, "tpm": 10_000}})
+    reserved: list[int] = []
+    original_acquire = RateLimitScheduler.acquire
+
+    async def _spy_acquire(self, tokens):
+        reserved.append(tokens)
+        return await original_acquire(self, tokens)
+
+    monkeypatch.setattr(RateLimitScheduler, "acquire", _spy_acquire)
+    llm = _LLM()
+
+    asyncio.run(
+        llm_client._invoke_with_retry(llm, "x" * 400, timeout_seconds=1.0, max_retries=0, base_backoff_seconds=0.0)
+    )
+
+    # 400 chars is ~100 prompt tokens, plus the model's max_tokens for the reply.
+    assert reserved == [200]
+    stats = llm_client.rate_limit_stats()["tiny-model"]
+    assert stats["tpm"]["available"] == pytest.approx(10_000 - 150, abs=1)
+    assert stats["rpm"]["available"] == pytest.approx(59, abs=0.1)
+
+
+class _FailingLLM(_LLM):
+    async def ainvoke(self, _prompt: str):
+        self.calls += 1
+        raise RuntimeError("upstream broke")
+
+
+def test_failed_calls_settle_their_reservation_to_the_prompt(monkeypatch):
+    monkeypatch.setattr(tokens_module, "_encoding", lambda _model_name: None)
+    monkeypatch.setattr(get_settings(), "llm_rate_limits", {"tiny-model": {"rpm": 60, "tpm": 10_000}})
+
+    with pytest.raises(UpstreamModelError):
+        asyncio.run(
+            llm_client._invoke_with_retry(
+                _FailingLLM(), "x" * 400, timeout_seconds=1.0, max_retries=0, base_backoff_seconds=0.0
+            )
+        )
+
+    # The 100-token output allowance comes back; the ~100 prompt tokens stay spent.
+    stats = llm_client.rate_limit_stats()["tiny-model"]
+    assert stats["tpm"]["available"] == pytest.approx(10_000 - 100, abs=1)
+
+
+def test_models_without_configured_limits_are_not_scheduled(monkeypatch):
+    monkeypatch.setattr(get_settings(), "llm_rate_limits", {"other-model": {"rpm": 1}})
+
+    asyncio.run(
+        llm_client._invoke_with_retry(_LLM(), "hi", timeout_seconds=1.0, max_retries=0, base_backoff_seconds=0.0)
+    )
+
+    assert llm_client.rate_limit_stats() == {}
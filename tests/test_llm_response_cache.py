@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+from pydantic import BaseModel
+
+import app.llm_client as llm_client
+from app.config import get_settings
+from app.errors import ModelOutputError
+
+
+class _Verdict(BaseModel):
+    verdict: str
+
+
+class _CountingLLM:
+    model_name = "cache-model"
+
+    def __init__(self, replies: list[str], temperature: float | None = 0):
+        self.replies = replies
+        self.temperature = temperature
+        self.calls = 0
+
+    async def ainvoke(self, _prompt):
+        reply = self.replies[min(self.calls, len(self.replies) - 1)]
+        self.calls += 1
+        return type("Response", (), {"content": reply})()
+
+
+def _invoke(llm, prompt, label="triage"):
+    async def _run():
+        hits = llm_client.start_llm_cache_hits()
+        result = await llm_client.invoke_json_with_retries(
+            llm,
+            prompt,
+            _Verdict,
+            timeout_seconds=1.0,
+            max_retries=0,
+            base_backoff_seconds=0,
+            cache_label=label,
+        )
+        return result, hits
+
+    return asyncio.run(_run())
+
+
+def test_identical_prompt_is_served_from_cache():
+    llm = _CountingLLM(['{"verdict": "ok"}'])
+
+    (first, _, _), hits = _invoke(llm, "review the cache layer", label="caching")
+    assert hits == {"caching": False}
+    (second, retries, repaired), hits = _invoke(llm, "review the cache layer", label="caching")
+    assert hits == {"caching": True}
+    assert second == first == {"verdict": "ok"}
+    assert (retries, repaired) == (0, False)
+    assert llm.calls == 1
+
+    _invoke(llm, "review the queue layer", label="queues")
+    assert llm.calls == 2
+    assert llm_client.llm_response_cache_stats()["memory_hits"] == 1
+
+
+def test_invalid_output_and_nonzero_temperature_are_not_cached():
+    broken = _CountingLLM(["not json"])
+    for _ in range(2):
+        with pytest.raises(ModelOutputError):
+            _invoke(broken, "review the cache layer")
+    assert broken.calls == 4
+
+    sampled = _CountingLLM(['{"verdict": "ok"}'], temperature=0.7)
+    _invoke(sampled, "review the cache layer")
+    _, hits = _invoke(sampled, "review the cache layer")
+    assert sampled.calls == 2
+    assert hits == {}
+
+
+def test_repaired_output_is_not_cached():
+    llm = _CountingLLM(["not json", '{"verdict": "fixed"}', '{"verdict": "fresh"}'])
+
+    (result, _, repaired), _ = _invoke(llm, "review the cache layer")
+    assert (result, repaired) == ({"verdict": "fixed"}, True)
+    (fresh, _, repaired), hits = _invoke(llm, "review the cache layer")
+    assert (fresh, repaired, hits) == ({"verdict": "fresh"}, False, {"triage": False})
+    assert llm.calls == 3
+
+
+def test_bypass_skips_the_lookup_but_refreshes_the_entry():
+    llm = _CountingLLM(['{"verdict": "old"}', '{"verdict": "new"}'])
+    _invoke(llm, "review the cache layer")
+
+    async def _bypassed():
+        llm_client.set_llm_cache_bypass(True)
+        return await llm_client.invoke_json_with_retries(
+            llm, "review the cache layer", _Verdict, timeout_seconds=1.0, max_retries=0, base_backoff_seconds=0
+        )
+
+    assert asyncio.run(_bypassed())[0] == {"verdict": "new"}
+    (cached, _, _), hits = _invoke(llm, "review the cache layer")
+    assert (cached, hits, llm.calls) == ({"verdict": "new"}, {"triage": True}, 2)
+
+
+def test_disk_tier_survives_a_fresh_memory_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(get_settings(), "llm_response_cache_path", tmp_path / "llm.sqlite")
+    llm = _CountingLLM(['{"verdict": "ok"}'])
+    _invoke(llm, "review the cache layer")
+
+    monkeypatch.setattr(llm_client, "_RESPONSE_CACHE", None)
+    (result, _, _), hits = _invoke(llm, "review the cache layer")
+
+    assert result == {"verdict": "ok"}
+    assert hits == {"triage": True}
+    assert llm.calls == 1
+    assert llm_client.llm_response_cache_stats()["disk_hits"] == 1
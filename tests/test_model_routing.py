@@ -0,0 +1,132 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+import app.main as main_module
+import app.reviewers as reviewers_module
+from app.config import get_settings
+from app.llm_client import start_llm_models
+from app.main import app
+
+_TRIAGE = json.dumps({"recommended_modules_to_run": ["security"]})
+_CONTEXT = "[id=Eaaaaaa source_file=a.pdf page=1]\nTokens never expire."
+
+
+def _review(evidence: list[str]) -> str:
+    finding = {"title": "t", "severity": "high", "details": "d", "impact": "i", "evidence": evidence}
+    return json.dumps({"score": 4, "risk": "high", "findings": [finding]})
+
+
+class _LLM:
+    temperature = 0.2
+
+    def __init__(self, replies: list[str]):
+        self.replies = replies
+        self.prompts: list[str] = []
+
+    async def ainvoke(self, prompt):
+        self.prompts.append(prompt)
+        return type("Response", (), {"content": self.replies[len(self.prompts) - 1]})()
+
+
+def _route(monkeypatch, llms: dict[str, _LLM], **overrides):
+    for key, value in overrides.items():
+        monkeypatch.setattr(get_settings(), key, value)
+    for model_name, llm in llms.items():
+        llm.model_name = model_name
+    monkeypatch.setattr(reviewers_module, "_build_llm", lambda model_name=None: llms[model_name])
+
+
+def _run(coro_factory):
+    async def _inner():
+        models = start_llm_models()
+        return await coro_factory(), models
+
+    return asyncio.run(_inner())
+
+
+def test_each_stage_uses_its_configured_model(monkeypatch):
+    llms = {"fast": _LLM([_TRIAGE]), "strong": _LLM([_review(["Eaaaaaa"])]), "mid": _LLM([_review([])])}
+    _route(monkeypatch, llms, triage_model="fast", module_model="mid", module_models={"security": "strong"})
+
+    async def _stages():
+        await reviewers_module.run_triage(_CONTEXT, "q")
+        await reviewers_module.run_module_review("security", _CONTEXT, "q")
+        await reviewers_module.run_module_review("cost", _CONTEXT, "q")
+
+    _, models = _run(_stages)
+
+    assert models["triage"] == "fast"
+    assert models["modules"] == {"security": "strong", "cost": "mid"}
+    assert [len(llm.prompts) for llm in llms.values()] == [1, 1, 1]
+
+
+def test_cascade_keeps_a_well_cited_fast_answer(monkeypatch):
+    llms = {"fast": _LLM([_review(["Eaaaaaa"])]), "strong": _LLM([])}
+    _route(monkeypatch, llms, module_model="strong", llm_cascade_model="fast")
+
+    (review, _, _), models = _run(lambda: reviewers_module.run_module_review("security", _CONTEXT, "q"))
+
+    assert review["findings"][0]["evidence"][0]["quote"] == "Tokens never expire."
+    assert models["modules"] == {"security": "fast"}
+    assert models["escalations"] == {}
+    assert llms["strong"].prompts == []
+
+
+def test_cascade_escalates_on_unsupported_findings(monkeypatch):
+    llms = {"fast": _LLM([_review(["E999999"])]), "strong": _LLM([_review(["Eaaaaaa"])])}
+    _route(monkeypatch, llms, module_model="strong", llm_cascade_model="fast")
+
+    (review, _, repaired), models = _run(lambda: reviewers_module.run_module_review("security", _CONTEXT, "q"))
+
+    assert review["findings"][0]["evidence"][0]["source_file"] == "a.pdf"
+    assert repaired is False
+    assert models["modules"] == {"security": "strong"}
+    assert models["escalations"] == {"security": "low_evidence"}
+
+
+def test_cascade_escalates_invalid_output_without_a_repair_call(monkeypatch):
+    llms = {"fast": _LLM(["I cannot review this.", "unused"]), "strong": _LLM([_review(["Eaaaaaa"])])}
+    _route(monkeypatch, llms, module_model="strong", llm_cascade_model="fast")
+
+    (_, _, repaired), models = _run(lambda: reviewers_module.run_module_review("security", _CONTEXT, "q"))
+
+    assert len(llms["fast"].prompts) == 1
+    assert repaired is True
+    assert models["escalations"] == {"security": "invalid_output"}
+
+
+def test_repair_model_handles_the_remote_repair(monkeypatch):
+    llms = {"gpt-4o-mini": _LLM(["Here is my triage."]), "repairer": _LLM([_TRIAGE])}
+    _route(monkeypatch, llms, repair_model="repairer")
+
+    triage, models = _run(lambda: reviewers_module.run_triage(_CONTEXT, "q"))
+
+    assert triage[0]["recommended_modules_to_run"] == ["security"]
+    assert llms["repairer"].prompts[0].endswith("Return JSON only, no markdown.")
+    assert models["triage"] == "gpt-4o-mini"
+    assert models["repairs"] == {"triage": "repairer"}
+
+
+def test_analysis_meta_reports_stage_models(monkeypatch):
+    llms = {"fast": _LLM([_TRIAGE]), "strong": _LLM([_review(["Eaaaaaa"])])}
+    _route(monkeypatch, llms, triage_model="fast", module_model="strong")
+
+    async def _retrieve(**_kwargs):
+        return [{"id": "Eaaaaaa", "source_file": "a.pdf", "page": 1, "quote": "Tokens never expire."}], _CONTEXT
+
+    monkeypatch.setattr(main_module, "_ensure_openai_configured", lambda: None)
+    monkeypatch.setattr(main_module, "retrieve_context", _retrieve)
+
+    response = TestClient(app).post(
+        "/analyze", json={"collection": "default", "query": "q", "mode": "targeted", "budget_modules": 1}
+    )
+
+    assert response.status_code == 200
+    assert response.json()["meta"]["llm_models"] == {
+        "triage": "fast",
+        "modules": {"security": "strong"},
+        "repairs": {},
+        "escalations": {},
+    }
@@ -0,0 +1,134 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+from langchain_core.documents import Document
+
+import app.embeddings as embeddings_module
+import app.main as main_module
+import app.retrieval as retrieval_module
+from app.cache import build_tiered_cache
+from app.main import app
+from app.prompts import MODULE_RETRIEVAL_QUERIES
+
+
+class _BatchEmbeddings:
+    def __init__(self):
+        self.batches: list[list[str]] = []
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.batches.append(list(texts))
+        return [[float(index), 1.0] for index, _ in enumerate(texts)]
+
+
+def test_module_queries_share_one_embedding_request(monkeypatch):
+    backend = _BatchEmbeddings()
+    monkeypatch.setattr(embeddings_module, "get_embeddings", lambda: backend)
+    monkeypatch.setattr(
+        embeddings_module,
+        "_EMBEDDING_CACHE",
+        build_tiered_cache(max_entries=32, ttl_seconds=None, disk_path=None),
+    )
+    searched: list[tuple[list[float], int]] = []
+
+    class _Vectorstore:
+        def similarity_search_by_vector(self, embedding, k, filter=None):
+            searched.append((embedding, k))
+            return [
+                Document(
+                    page_content=f"Evidence for query vector {embedding[0]:.0f} part {rank}.",
+                    metadata={"source_file": "a.pdf", "page": rank},
+                )
+                for rank in range(k)
+            ]
+
+    monkeypatch.setattr(retrieval_module, "get_vectorstore", lambda *_args, **_kwargs: _Vectorstore())
+    modules = ["security", "cost", "testing"]
+    stats: dict = {}
+
+    contexts = asyncio.run(
+        retrieval_module.retrieve_module_contexts("default", "review", modules, top_k=6, stats=stats)
+    )
+
+    assert backend.batches == [[f"review {MODULE_RETRIEVAL_QUERIES[module]}" for module in modules]]
+    assert sorted(embedding[0] for embedding, _ in searched) == [0.0, 1.0, 2.0]
+    assert list(contexts) == modules
+    # Focused contexts are capped at MODULE_CONTEXT_TOP_K chunks even when the request asks for more.
+    assert all(len(items) == 4 for items, _ in contexts.values())
+    assert "vector 1 part" in contexts["cost"][1]
+    assert set(stats) == set(modules)
+    assert all(entry["context_tokens_used"] > 0 for entry in stats.values())
+
+
+def test_each_module_reviews_its_own_context(monkeypatch):
+    monkeypatch.setattr(main_module.settings, "module_retrieval_enabled", True)
+    monkeypatch.setattr(main_module, "_ensure_openai_configured", lambda: None)
+    requested_modules: list[list[str]] = []
+
+    async def _retrieve(**_kwargs):
+        return [{"source_file": "a.pdf", "page": 0, "quote": "q"}], "shared"
+
+    async def _module_contexts(*, modules, stats, **_kwargs):
+        requested_modules.append(list(modules))
+        stats["security"] = {"context_items": 1, "context_tokens_used": 12}
+        stats["cost"] = {"context_items": 0, "context_tokens_used": 0}
+        return {"security": ([{"x": 1}], "security context"), "cost": ([], "")}
+
+    async def _triage(*_args, **_kwargs):
+        return {"recommended_modules_to_run": ["security", "cost"]}, 0, False
+
+    seen: dict[str, str] = {}
+
+    async def _module_review(module_name: str, context_text: str, **_kwargs):
+        seen[module_name] = context_text
+        return {"score": 7.0, "risk": "low", "findings": [], "recommendations": []}, 0, False
+
+    monkeypatch.setattr(main_module, "retrieve_context", _retrieve)
+    monkeypatch.setattr(main_module, "retrieve_module_contexts", _module_contexts)
+    monkeypatch.setattr(main_module, "run_triage", _triage)
+    monkeypatch.setattr(main_module, "run_module_review", _module_review)
+
+    response = TestClient(app).post(
+        "/analyze",
+        json={"collection": "default", "query": "test", "mode": "targeted", "top_k": 6, "budget_modules": 2},
+    )
+
+    assert response.status_code == 200
+    # Targeted mode searches after triage, and only for the modules it selected.
+    assert requested_modules == [["security", "cost"]]
+    assert seen == {"security": "security context", "cost": "shared"}
+    module_context = response.json()["meta"]["module_context"]
+    assert module_context["security"] == {"context_items": 1, "context_tokens_used": 12, "shared_context": False}
+    assert module_context["cost"] == {"context_items": 1, "context_tokens_used": None, "shared_context": True}
+
+
+def test_combined_reviews_skip_focused_retrieval(monkeypatch):
+    monkeypatch.setattr(main_module.settings, "module_retrieval_enabled", True)
+    monkeypatch.setattr(main_module, "_ensure_openai_configured", lambda: None)
+
+    async def _retrieve(**_kwargs):
+        return [{"source_file": "a.pdf", "page": 0, "quote": "q"}], "shared"
+
+    async def _module_contexts(**_kwargs):
+        raise AssertionError("combined reviews send the shared context")
+
+    async def _triage(*_args, **_kwargs):
+        return {"recommended_modules_to_run": []}, 0, False
+
+    async def _multi_review(module_names, context_text, user_query):
+        assert context_text == "shared"
+        return {module: ({"score": 7.0, "risk": "low"}, 0, False) for module in module_names}
+
+    monkeypatch.setattr(main_module, "retrieve_context", _retrieve)
+    monkeypatch.setattr(main_module, "retrieve_module_contexts", _module_contexts)
+    monkeypatch.setattr(main_module, "run_triage", _triage)
+    monkeypatch.setattr(main_module, "run_multi_module_review", _multi_review)
+
+    response = TestClient(app).post(
+        "/analyze",
+        json={"collection": "default", "query": "test", "mode": "deep", "review_strategy": "combined"},
+    )
+
+    assert response.status_code == 200
+    module_context = response.json()["meta"]["module_context"]
+    assert set(module_context) == set(main_module.DEEP_MODULES[:6])
+    assert all(entry["shared_context"] and entry["context_items"] == 1 for entry in module_context.values())
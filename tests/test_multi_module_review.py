@@ -0,0 +1,141 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+import app.llm_client as llm_client_module
+import app.main as main_module
+import app.reviewers as reviewers_module
+from app.limiter import AdaptiveLimiter
+from app.llm_client import start_llm_cache_hits, start_llm_usage
+from app.main import app
+
+
+def _section(score: float = 7.0) -> dict:
+    return {"score": score, "risk": "low", "findings": [], "recommendations": []}
+
+
+class _Resp:
+    def __init__(self, content: str):
+        self.content = content
+        self.usage_metadata = {"input_tokens": 100, "output_tokens": 20}
+
+
+class _LLM:
+    def __init__(self, outputs: list[str]):
+        self.outputs = outputs
+        self.prompts: list[str] = []
+
+    async def ainvoke(self, prompt: str):
+        self.prompts.append(prompt)
+        return _Resp(self.outputs[len(self.prompts) - 1])
+
+
+def test_only_invalid_module_sections_are_requested_again(monkeypatch):
+    combined = {"security": _section(8.0), "cost": {"risk": "low"}, "testing": _section(6.0)}
+    llm = _LLM([json.dumps(combined), json.dumps(_section(5.0))])
+    monkeypatch.setattr(reviewers_module, "_build_llm", lambda _model_name=None: llm)
+
+    async def _run():
+        usage = start_llm_usage()
+        results = await reviewers_module.run_multi_module_review(
+            module_names=["security", "cost", "testing"], context_text="ctx", user_query="q"
+        )
+        return results, usage
+
+    results, usage = asyncio.run(_run())
+
+    assert len(llm.prompts) == 2
+    assert "security, cost, testing" in llm.prompts[0]
+    assert "module: cost" in llm.prompts[1]
+    assert results["security"][0]["score"] == 8.0
+    assert results["cost"] == ({**results["cost"][0], "score": 5.0}, 0, True)
+    assert results["testing"][1:] == (0, False)
+    assert usage == {"calls": 2, "input_tokens": 200, "output_tokens": 40}
+
+
+def test_combined_strategy_reviews_deep_modules_in_one_call(monkeypatch):
+    calls: list[list[str]] = []
+
+    async def _retrieve(**_kwargs):
+        return [{"source_file": "a.pdf", "page": 0, "quote": "q"}], "ctx"
+
+    async def _triage(*_args, **_kwargs):
+        return {"recommended_modules_to_run": []}, 0, False
+
+    async def _multi_review(module_names, context_text, user_query):
+        calls.append(list(module_names))
+        return {module: (_section(), 1 if module == module_names[0] else 0, False) for module in module_names}
+
+    async def _module_review(*_args, **_kwargs):
+        raise AssertionError("combined strategy must not review modules one by one")
+
+    monkeypatch.setattr(main_module, "_ensure_openai_configured", lambda: None)
+    monkeypatch.setattr(main_module, "retrieve_context", _retrieve)
+    monkeypatch.setattr(main_module, "run_triage", _triage)
+    monkeypatch.setattr(main_module, "run_multi_module_review", _multi_review)
+    monkeypatch.setattr(main_module, "run_module_review", _module_review)
+
+    response = TestClient(app).post(
+        "/analyze",
+        json={"collection": "default", "query": "q", "mode": "deep", "review_strategy": "combined"},
+    )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert calls == [main_module.DEEP_MODULES[:6]]
+    assert list(body["modules"]) == main_module.DEEP_MODULES[:6]
+    assert body["meta"]["review_strategy"] == "combined"
+    assert body["meta"]["retry_count"] == 1
+    assert body["meta"]["llm_usage"] == {"calls": 0, "input_tokens": 0, "output_tokens": 0}
+
+
+def test_section_reruns_share_the_llm_concurrency_cap(monkeypatch):
+    active = {"now": 0, "max": 0}
+
+    class _CountingLLM(_LLM):
+        async def ainvoke(self, prompt: str):
+            active["now"] += 1
+            active["max"] = max(active["max"], active["now"])
+            try:
+                await asyncio.sleep(0.01)
+                return await super().ainvoke(prompt)
+            finally:
+                active["now"] -= 1
+
+    modules = ["security", "cost", "testing"]
+    llm = _CountingLLM([json.dumps({}), *(json.dumps(_section()) for _ in modules)])
+    monkeypatch.setattr(reviewers_module, "_build_llm", lambda _model_name=None: llm)
+    limiter = AdaptiveLimiter(initial_limit=1, min_limit=1, max_limit=1, max_wait_seconds=5.0)
+    monkeypatch.setattr(llm_client_module, "_LLM_LIMITER", limiter)
+
+    results = asyncio.run(
+        reviewers_module.run_multi_module_review(module_names=modules, context_text="ctx", user_query="q")
+    )
+
+    assert len(llm.prompts) == 4
+    assert active["max"] == 1
+    assert all(repaired for _, _, repaired in results.values())
+
+
+def test_fully_valid_combined_reply_is_served_from_the_response_cache(monkeypatch):
+    combined = {"security": _section(8.0), "cost": _section(6.0)}
+    llm = _LLM([json.dumps(combined)])
+    llm.temperature = 0
+    llm.model_name = "combined-model"
+    monkeypatch.setattr(reviewers_module, "_build_llm", lambda _model_name=None: llm)
+
+    async def _run():
+        hits = start_llm_cache_hits()
+        results = await reviewers_module.run_multi_module_review(
+            module_names=["security", "cost"], context_text="ctx", user_query="q"
+        )
+        return results, hits
+
+    first, first_hits = asyncio.run(_run())
+    second, second_hits = asyncio.run(_run())
+
+    assert len(llm.prompts) == 1
+    assert second == first
+    assert first_hits == {"security": False, "cost": False}
+    assert second_hits == {"security": True, "cost": True}
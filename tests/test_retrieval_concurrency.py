@@ -1,26 +1,27 @@
 import asyncio
 import threading
-import time
+from concurrent.futures import Future
+
+import pytest
+from langchain_core.documents import Document
 
 import app.main as main_module
+import app.retrieval as retrieval_module
 
 
 def test_retrieval_concurrency_is_bounded(monkeypatch):
     active = 0
     max_active = 0
-    lock = threading.Lock()
 
-    def _fake_retrieve_context(*_args, **_kwargs):
+    async def _fake_retrieve_context(*_args, **_kwargs):
         nonlocal active, max_active
-        with lock:
-            active += 1
-            max_active = max(max_active, active)
+        active += 1
+        max_active = max(max_active, active)
         try:
-            time.sleep(0.05)
+            await asyncio.sleep(0.05)
             return [{"source_file": "x.pdf", "page": 0, "quote": "q"}], "ctx"
         finally:
-            with lock:
-                active -= 1
+            active -= 1
 
     monkeypatch.setattr(main_module, "retrieve_context", _fake_retrieve_context)
     monkeypatch.setattr(main_module, "RETRIEVAL_SEMAPHORE", asyncio.Semaphore(2))
@@ -42,3 +43,117 @@ def test_retrieval_concurrency_is_bounded(monkeypatch):
 
     asyncio.run(_run_many())
     assert max_active <= 2
+
+
+class _SlowVectorstore:
+    def __init__(self, release: threading.Event):
+        self.release = release
+        self.thread_names: list[str] = []
+
+    def similarity_search_by_vector(self, embedding, k, filter=None):
+        self.thread_names.append(threading.current_thread().name)
+        self.release.wait(timeout=2.0)
+        return [Document(page_content="q", metadata={"source_file": "a.pdf", "page": 1})]
+
+
+def _patch_retrieval(monkeypatch, vectorstore):
+    async def _embed(_text):
+        return [1.0, 0.0]
+
+    monkeypatch.setattr(retrieval_module, "aembed_query_cached", _embed)
+    monkeypatch.setattr(retrieval_module, "get_vectorstore", lambda *_args, **_kwargs: vectorstore)
+    monkeypatch.setattr(
+        retrieval_module,
+        "_RETRIEVAL_STATS",
+        {"started": 0, "completed": 0, "abandoned": 0, "blocking_in_flight": 0, "abandoned_still_running": 0},
+    )
+
+
+def test_timeout_releases_slot_and_counts_abandoned_search(monkeypatch):
+    release = threading.Event()
+    vectorstore = _SlowVectorstore(release)
+    _patch_retrieval(monkeypatch, vectorstore)
+    monkeypatch.setattr(main_module, "retrieve_context", retrieval_module.retrieve_context)
+    semaphore = asyncio.Semaphore(1)
+    monkeypatch.setattr(main_module, "RETRIEVAL_SEMAPHORE", semaphore)
+
+    async def _run():
+        with pytest.raises(asyncio.TimeoutError):
+            await main_module._retrieve_context_with_limit(
+                collection="default", query="q", top_k=1, file_filter=None, timeout_seconds=0.05
+            )
+        # The slot is free even though the abandoned search is still blocked in its thread.
+        assert not semaphore.locked()
+        return retrieval_module.retrieval_stats()
+
+    stats = asyncio.run(_run())
+    assert stats["abandoned"] == 1
+    assert stats["abandoned_still_running"] == 1
+    assert stats["blocking_in_flight"] == 1
+
+    release.set()
+    retrieval_module.shutdown_retrieval_executor()
+    for _ in range(100):
+        if retrieval_module.retrieval_stats()["blocking_in_flight"] == 0:
+            break
+        threading.Event().wait(0.01)
+    stats = retrieval_module.retrieval_stats()
+    assert stats["abandoned_still_running"] == 0
+    assert stats["completed"] == 0
+
+
+class _HeldExecutor:
+    # Runs the job, then holds its future unresolved until released: the window a late cancel can land in.
+    def __init__(self):
+        self.ran = threading.Event()
+        self.release = threading.Event()
+        self.thread: threading.Thread | None = None
+
+    def submit(self, fn):
+        future = Future()
+
+        def _run():
+            future.set_running_or_notify_cancel()
+            result = fn()
+            self.ran.set()
+            self.release.wait()
+            future.set_result(result)
+
+        self.thread = threading.Thread(target=_run)
+        self.thread.start()
+        return future
+
+
+def test_cancel_after_search_returns_is_not_left_counted_as_running(monkeypatch):
+    executor = _HeldExecutor()
+    monkeypatch.setattr(retrieval_module, "_executor", lambda: executor)
+    _patch_retrieval(monkeypatch, _SlowVectorstore(threading.Event()))
+
+    async def _run():
+        task = asyncio.create_task(retrieval_module._run_blocking(lambda: "done"))
+        await asyncio.to_thread(executor.ran.wait)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        executor.release.set()
+        await asyncio.to_thread(executor.thread.join)
+
+    asyncio.run(_run())
+
+    stats = retrieval_module.retrieval_stats()
+    assert stats["abandoned_still_running"] == 0
+    assert stats["blocking_in_flight"] == 0
+
+
+def test_vector_search_runs_on_dedicated_retrieval_pool(monkeypatch):
+    release = threading.Event()
+    release.set()
+    vectorstore = _SlowVectorstore(release)
+    _patch_retrieval(monkeypatch, vectorstore)
+
+    items, context_text = asyncio.run(retrieval_module.retrieve_context(collection="default", query="q", top_k=1))
+
+    assert vectorstore.thread_names[0].startswith("retrieval")
+    assert items == [{"id": items[0]["id"], "source_file": "a.pdf", "page": 1, "quote": "q"}]
+    assert context_text.startswith(f"[id={items[0]['id']} source_file=a.pdf page=1]")
+    assert retrieval_module.retrieval_stats()["completed"] == 1
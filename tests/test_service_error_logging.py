@@ -5,10 +5,12 @@ from fastapi.testclient import TestClient
 import app.main as main_module
 from app.main import app
 
+from conftest import retrieval_result
+
 
 def test_service_error_log_includes_structured_fields(monkeypatch, caplog):
     monkeypatch.setattr(main_module, "_ensure_openai_configured", lambda: None)
-    monkeypatch.setattr(main_module, "retrieve_context", lambda **_kwargs: ([], ""))
+    monkeypatch.setattr(main_module, "retrieve_context", retrieval_result([], ""))
 
     client = TestClient(app)
     payload = {
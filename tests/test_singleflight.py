@@ -0,0 +1,167 @@
+import asyncio
+
+import httpx
+import pytest
+
+import app.main as main_module
+from app.llm_client import LLM_CACHE_BYPASS
+from app.main import app
+from app.singleflight import SingleFlight
+
+from conftest import retrieval_result
+
+
+def test_concurrent_calls_share_one_execution():
+    flights: SingleFlight[int] = SingleFlight()
+    executions = 0
+
+    async def _work():
+        nonlocal executions
+        executions += 1
+        await asyncio.sleep(0.02)
+        return 42
+
+    async def _run():
+        return await asyncio.gather(*(flights.do("key", _work) for _ in range(5)))
+
+    results = asyncio.run(_run())
+
+    assert executions == 1
+    assert [value for value, _ in results] == [42] * 5
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert flights.stats() == {"executions": 1, "coalesced": 4, "in_flight": 0}
+
+
+def test_cancelling_one_waiter_keeps_shared_work_running():
+    flights: SingleFlight[str] = SingleFlight()
+
+    async def _work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def _run():
+        first = asyncio.create_task(flights.do("key", _work))
+        second = asyncio.create_task(flights.do("key", _work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(_run()) == ("done", True)
+
+
+def test_work_is_cancelled_when_every_waiter_leaves():
+    flights: SingleFlight[str] = SingleFlight()
+    cancelled = asyncio.Event()
+
+    async def _work():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return "never"
+
+    async def _run():
+        waiter = asyncio.create_task(flights.do("key", _work))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+        await asyncio.sleep(0)
+        return flights.stats()["in_flight"]
+
+    assert asyncio.run(_run()) == 0
+
+
+def test_caller_arriving_after_the_last_waiter_leaves_starts_fresh_work():
+    flights: SingleFlight[str] = SingleFlight()
+    started = 0
+
+    async def _work():
+        nonlocal started
+        started += 1
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def _run():
+        waiter = asyncio.create_task(flights.do("key", _work))
+        await asyncio.sleep(0.005)
+        waiter.cancel()
+        # Join before the cancelled task has finished and run its done callback.
+        late = asyncio.create_task(flights.do("key", _work))
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return await late
+
+    assert asyncio.run(_run()) == ("done", False)
+    assert started == 2
+
+
+def test_identical_analyze_requests_are_coalesced(monkeypatch):
+    calls = {"triage": 0}
+
+    async def _triage(*_args, **_kwargs):
+        calls["triage"] += 1
+        await asyncio.sleep(0.05)
+        return {"recommended_modules_to_run": []}, 0, False
+
+    monkeypatch.setattr(main_module, "_ensure_openai_configured", lambda: None)
+    monkeypatch.setattr(main_module, "retrieve_context", retrieval_result([{"x": 1}], "ctx"))
+    monkeypatch.setattr(main_module, "run_triage", _triage)
+    monkeypatch.setattr(main_module, "RETRIEVAL_SEMAPHORE", asyncio.Semaphore(4))
+    monkeypatch.setattr(main_module, "ANALYSIS_FLIGHTS", SingleFlight())
+    payload = {"collection": "default", "query": "  same   query ", "mode": "triage", "top_k": 2}
+
+    async def _run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            responses = await asyncio.gather(
+                client.post("/analyze", json=payload),
+                client.post("/analyze", json={**payload, "query": "same query"}),
+                client.post("/analyze", json=payload),
+            )
+            metrics = await client.get("/metrics")
+        return responses, metrics
+
+    responses, metrics = asyncio.run(_run())
+
+    assert calls["triage"] == 1
+    assert all(response.status_code == 200 for response in responses)
+    request_ids = {response.json()["meta"]["request_id"] for response in responses}
+    assert request_ids == {response.headers["x-request-id"] for response in responses}
+    assert len(request_ids) == 3
+    assert sorted(response.json()["meta"]["coalesced"] for response in responses) == [False, True, True]
+    assert metrics.json()["singleflight"]["coalesced"] == 2
+
+
+def test_bypass_requests_do_not_join_a_cached_run(monkeypatch):
+    bypass_flags = []
+
+    async def _triage(*_args, **_kwargs):
+        bypass_flags.append(LLM_CACHE_BYPASS.get())
+        await asyncio.sleep(0.05)
+        return {"recommended_modules_to_run": []}, 0, False
+
+    monkeypatch.setattr(main_module, "_ensure_openai_configured", lambda: None)
+    monkeypatch.setattr(main_module, "retrieve_context", retrieval_result([{"x": 1}], "ctx"))
+    monkeypatch.setattr(main_module, "run_triage", _triage)
+    monkeypatch.setattr(main_module, "RETRIEVAL_SEMAPHORE", asyncio.Semaphore(4))
+    monkeypatch.setattr(main_module, "ANALYSIS_FLIGHTS", SingleFlight())
+    payload = {"collection": "default", "query": "same query", "mode": "triage", "top_k": 2}
+
+    async def _run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(
+                client.post("/analyze", json=payload),
+                client.post("/analyze", json={**payload, "cache": "bypass"}),
+                client.post("/analyze", json={**payload, "cache": "bypass"}),
+            )
+
+    cached, *bypassed = [response.json()["meta"] for response in asyncio.run(_run())]
+
+    assert sorted(bypass_flags) == [False, True]
+    assert cached["coalesced"] is False
+    assert [meta["cache"] for meta in bypassed] == ["bypass", "bypass"]
+    assert sorted(meta["coalesced"] for meta in bypassed) == [False, True]
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+from collections import Counter
+
+from fastapi.testclient import TestClient
+
+import app.main as main_module
+from app.llm_client import get_llm_limiter
+from app.main import app
+
+from conftest import retrieval_result
+
+
+def _module_output() -> dict:
+    return {"score": 7.0, "risk": "low", "findings": [], "recommendations": []}
+
+
+def _payload(mode: str) -> dict:
+    return {
+        "collection": "default",
+        "query": "test",
+        "mode": mode,
+        "top_k": 2,
+        "file_filter": None,
+        "budget_modules": 2,
+    }
+
+
+def _patch_common(monkeypatch):
+    monkeypatch.setattr(main_module, "_ensure_openai_configured", lambda: None)
+    monkeypatch.setattr(main_module, "retrieve_context", retrieval_result([{"x": 1}], "ctx"))
+    monkeypatch.setattr(main_module, "RECOMMENDATION_COUNTS", Counter())
+
+
+def test_deep_modules_start_before_triage_finishes(monkeypatch):
+    _patch_common(monkeypatch)
+    started: list[str] = []
+
+    async def _triage(*_args, **_kwargs):
+        # Triage only returns once every deep module is already running.
+        for _ in range(100):
+            if len(started) == 6:
+                break
+            await asyncio.sleep(0.005)
+        return {"recommended_modules_to_run": ["cost"], "modules_running_at_triage_end": len(started)}, 0, False
+
+    async def _module_review(module_name: str, **_kwargs):
+        started.append(module_name)
+        await asyncio.sleep(0.01)
+        return _module_output(), 0, False
+
+    monkeypatch.setattr(main_module, "run_triage", _triage)
+    monkeypatch.setattr(main_module, "run_module_review", _module_review)
+
+    response = TestClient(app).post("/analyze", json=_payload("deep"))
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["triage"]["modules_running_at_triage_end"] == 6
+    assert list(body["modules"]) == main_module.DEEP_MODULES[:6]
+
+
+def test_targeted_speculation_reuses_hits_and_cancels_misses(monkeypatch, caplog):
+    _patch_common(monkeypatch)
+    monkeypatch.setattr(main_module.settings, "speculative_module_count", 2)
+    main_module.RECOMMENDATION_COUNTS.update({"cost": 5, "security": 3, "testing": 1})
+    calls: list[str] = []
+    cancelled: list[str] = []
+
+    async def _triage(*_args, **_kwargs):
+        await asyncio.sleep(0.02)
+        return {"recommended_modules_to_run": ["security", "testing"]}, 0, False
+
+    async def _module_review(module_name: str, **_kwargs):
+        calls.append(module_name)
+        try:
+            await asyncio.sleep(0.05)
+        except asyncio.CancelledError:
+            cancelled.append(module_name)
+            raise
+        return _module_output(), 0, False
+
+    monkeypatch.setattr(main_module, "run_triage", _triage)
+    monkeypatch.setattr(main_module, "run_module_review", _module_review)
+
+    with caplog.at_level(logging.INFO, logger="app"):
+        response = TestClient(app).post("/analyze", json=_payload("targeted"))
+
+    assert response.status_code == 200
+    body = response.json()
+    assert list(body["modules"]) == ["security", "testing"]
+    assert sorted(calls) == ["cost", "security", "testing"]
+    assert cancelled == ["cost"]
+    assert main_module.RECOMMENDATION_COUNTS["testing"] == 2
+    complete = next(record for record in caplog.records if record.getMessage() == "analysis_complete")
+    assert complete.speculative_modules == {
+        "launched": ["cost", "security"],
+        "used": ["security"],
+        "cancelled": ["cost"],
+    }
+    assert complete.llm_limit == round(get_llm_limiter().limit, 2)
+
+
+def test_speculation_is_disabled_by_default(monkeypatch):
+    _patch_common(monkeypatch)
+    monkeypatch.setattr(main_module.settings, "speculative_module_count", 0)
+    calls: list[str] = []
+
+    async def _triage(*_args, **_kwargs):
+        return {"recommended_modules_to_run": ["testing"]}, 0, False
+
+    async def _module_review(module_name: str, **_kwargs):
+        calls.append(module_name)
+        return _module_output(), 0, False
+
+    monkeypatch.setattr(main_module, "run_triage", _triage)
+    monkeypatch.setattr(main_module, "run_module_review", _module_review)
+
+    response = TestClient(app).post("/analyze", json=_payload("targeted"))
+
+    assert response.status_code == 200
+    assert calls == ["testing"]
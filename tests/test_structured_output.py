@@ -0,0 +1,154 @@
+import asyncio
+import json
+import logging
+
+from fastapi.testclient import TestClient
+
+import app.clients as clients_module
+import app.reviewers as reviewers_module
+from app.config import get_settings
+from app.main import app
+from app.prompts import MODULES
+from benchmarks.stub_server import StubOpenAIServer, chat_completion
+
+_TRIAGE_REPLY = json.dumps(
+    {
+        "high_risk_areas": ["failover"],
+        "missing_info": [],
+        "recommended_modules_to_run": ["reliability"],
+        "top_questions_for_author": [],
+    }
+)
+
+
+def _configure(monkeypatch, server, mode):
+    monkeypatch.setattr(get_settings(), "openai_api_key", "stub")
+    monkeypatch.setattr(get_settings(), "openai_base_url", server.base_url)
+    monkeypatch.setattr(get_settings(), "llm_output_mode", mode)
+    monkeypatch.setattr(reviewers_module, "_JSON_SCHEMA_UNSUPPORTED", set())
+
+
+def _triage_twice():
+    async def _run():
+        try:
+            first = await reviewers_module.run_triage(context_text="ctx", user_query="first")
+            second = await reviewers_module.run_triage(context_text="ctx", user_query="second")
+            return first, second
+        finally:
+            await clients_module.close_clients()
+
+    return asyncio.run(_run())
+
+
+def _prompt(body: dict) -> str:
+    return body["messages"][-1]["content"]
+
+
+def test_json_schema_mode_sends_strict_schema_and_drops_schema_text(monkeypatch):
+    with StubOpenAIServer(responder=lambda _path, _body: (200, {}, chat_completion(_TRIAGE_REPLY))) as server:
+        _configure(monkeypatch, server, "json_schema")
+        (triage, _, repaired), _ = _triage_twice()
+
+    assert triage["recommended_modules_to_run"] == ["reliability"]
+    assert repaired is False
+    body = server.request_bodies[0]
+    response_format = body["response_format"]
+    assert response_format["type"] == "json_schema"
+    assert response_format["json_schema"]["name"] == "TriageOutput"
+    assert response_format["json_schema"]["strict"] is True
+    schema = response_format["json_schema"]["schema"]
+    assert schema["additionalProperties"] is False
+    assert set(schema["required"]) == set(schema["properties"])
+    assert "Return JSON ONLY" not in _prompt(body)
+
+
+def test_json_schema_triage_lists_the_valid_module_names(monkeypatch):
+    with StubOpenAIServer(responder=lambda _path, _body: (200, {}, chat_completion(_TRIAGE_REPLY))) as server:
+        _configure(monkeypatch, server, "json_schema")
+        _triage_twice()
+
+    schema = server.request_bodies[0]["response_format"]["json_schema"]["schema"]
+    assert schema["properties"]["recommended_modules_to_run"]["items"]["enum"] == MODULES
+
+
+def test_text_mode_keeps_schema_in_prompt(monkeypatch):
+    with StubOpenAIServer(responder=lambda _path, _body: (200, {}, chat_completion(_TRIAGE_REPLY))) as server:
+        _configure(monkeypatch, server, "text")
+        _triage_twice()
+
+    assert "response_format" not in server.request_bodies[0]
+    assert "Return JSON ONLY" in _prompt(server.request_bodies[0])
+
+
+def test_rejected_response_format_falls_back_to_text_mode_once(monkeypatch):
+    def _responder(_path, body):
+        if "response_format" in body:
+            return 400, {}, {"error": {"message": "Invalid parameter: 'response_format' is not supported"}}
+        return 200, {}, chat_completion(_TRIAGE_REPLY)
+
+    with StubOpenAIServer(responder=_responder) as server:
+        _configure(monkeypatch, server, "json_schema")
+        (first, _, _), (second, _, _) = _triage_twice()
+
+    assert first["high_risk_areas"] == second["high_risk_areas"] == ["failover"]
+    assert ["response_format" in body for body in server.request_bodies] == [True, False, False]
+    assert reviewers_module._JSON_SCHEMA_UNSUPPORTED == {get_settings().model_name}
+
+
+def test_combined_review_in_json_schema_mode_sends_a_keyed_schema(monkeypatch):
+    section = {"score": 7, "risk": "low", "findings": [], "recommendations": []}
+    reply = json.dumps({"security": section, "testing": section})
+    with StubOpenAIServer(responder=lambda _path, _body: (200, {}, chat_completion(reply))) as server:
+        _configure(monkeypatch, server, "json_schema")
+
+        async def _run():
+            try:
+                return await reviewers_module.run_multi_module_review(
+                    module_names=["security", "testing"], context_text="ctx", user_query="q"
+                )
+            finally:
+                await clients_module.close_clients()
+
+        results = asyncio.run(_run())
+
+    assert [results[module][0]["score"] for module in ("security", "testing")] == [7, 7]
+    body = server.request_bodies[0]
+    schema = body["response_format"]["json_schema"]["schema"]
+    assert schema["required"] == ["security", "testing"]
+    assert schema["additionalProperties"] is False
+    assert schema["properties"]["security"]["properties"]["findings"]["items"]["$ref"] in {
+        f"#/$defs/{name}" for name in schema["$defs"]
+    }
+    assert "Return JSON ONLY" not in _prompt(body)
+
+
+def test_json_schema_mode_repairs_on_the_calling_model_not_repair_model(monkeypatch):
+    replies = iter(["no structured output here", _TRIAGE_REPLY])
+    with StubOpenAIServer(responder=lambda _path, _body: (200, {}, chat_completion(next(replies)))) as server:
+        _configure(monkeypatch, server, "json_schema")
+        monkeypatch.setattr(get_settings(), "repair_model", "repairer")
+
+        async def _run():
+            try:
+                return await reviewers_module.run_triage(context_text="ctx", user_query="q")
+            finally:
+                await clients_module.close_clients()
+
+        _, _, repaired = asyncio.run(_run())
+
+    assert repaired is True
+    assert [body["model"] for body in server.request_bodies] == [get_settings().model_name] * 2
+    assert all("response_format" in body for body in server.request_bodies)
+
+
+def test_startup_warns_that_repair_model_is_unused_in_json_schema_mode(monkeypatch, caplog):
+    monkeypatch.setattr(get_settings(), "llm_output_mode", "json_schema")
+    monkeypatch.setattr(get_settings(), "repair_model", "repairer")
+
+    with caplog.at_level(logging.WARNING, logger="app"), TestClient(app):
+        pass
+
+    warning = next(
+        record for record in caplog.records if record.getMessage() == "repair_model_unused_in_json_schema_mode"
+    )
+    assert warning.model_name == "repairer"
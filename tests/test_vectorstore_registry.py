@@ -0,0 +1,89 @@
+import app.store as store_module
+from app.config import get_settings
+
+
+class _FakeChroma:
+    opened: list[str] = []
+
+    def __init__(self, collection_name: str, embedding_function, persist_directory: str):
+        self.collection_name = collection_name
+        self.embedding_function = embedding_function
+        self.deleted = False
+        _FakeChroma.opened.append(collection_name)
+
+    def delete_collection(self):
+        self.deleted = True
+
+
+def _fresh_registry(monkeypatch, size: int = 2):
+    _FakeChroma.opened = []
+    monkeypatch.setattr(store_module, "Chroma", _FakeChroma)
+    monkeypatch.setattr(store_module, "_VECTORSTORES", store_module.OrderedDict())
+    monkeypatch.setattr(
+        store_module,
+        "_VECTORSTORE_STATS",
+        {"opens": 0, "hits": 0, "evictions": 0, "invalidations": 0, "open_ms_total": 0.0},
+    )
+    monkeypatch.setattr(get_settings(), "vectorstore_cache_size", size)
+
+
+def test_vectorstore_is_opened_once_per_collection(monkeypatch):
+    _fresh_registry(monkeypatch)
+
+    first = store_module.get_vectorstore("default", require_embeddings=False)
+    second = store_module.get_vectorstore("default", require_embeddings=False)
+
+    assert first is second
+    assert _FakeChroma.opened == ["default"]
+    stats = store_module.vectorstore_stats()
+    assert stats["opens"] == 1
+    assert stats["hits"] == 1
+    assert stats["cached"] == 1
+    assert stats["setup_ms_saved"] >= 0
+
+
+def test_registry_evicts_least_recently_used(monkeypatch):
+    _fresh_registry(monkeypatch, size=2)
+
+    store_module.get_vectorstore("a", require_embeddings=False)
+    store_module.get_vectorstore("b", require_embeddings=False)
+    store_module.get_vectorstore("a", require_embeddings=False)
+    store_module.get_vectorstore("c", require_embeddings=False)
+    store_module.get_vectorstore("a", require_embeddings=False)
+    store_module.get_vectorstore("b", require_embeddings=False)
+
+    assert _FakeChroma.opened == ["a", "b", "c", "b"]
+    assert store_module.vectorstore_stats()["evictions"] == 2
+
+
+def test_delete_collection_invalidates_handle_and_bumps_version(monkeypatch):
+    _fresh_registry(monkeypatch)
+    handle = store_module.get_vectorstore("default", require_embeddings=False)
+    version = store_module.get_collection_version("default")
+
+    store_module.delete_collection("default")
+    reopened = store_module.get_vectorstore("default", require_embeddings=False)
+
+    assert handle.deleted is True
+    assert reopened is not handle
+    assert store_module.get_collection_version("default") == version + 1
+    assert store_module.vectorstore_stats()["invalidations"] == 1
+
+
+def test_app_shutdown_releases_vectorstores_and_the_embedding_batcher(monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+
+    import app.embeddings as embeddings_module
+    import app.main as main_module
+
+    _fresh_registry(monkeypatch)
+    monkeypatch.setattr(main_module.JOB_MANAGER, "db_path", tmp_path / "jobs.sqlite3")
+
+    with TestClient(main_module.app) as client:
+        store_module.get_vectorstore("default", require_embeddings=False)
+        client.portal.call(embeddings_module._batcher)
+        assert store_module.vectorstore_stats()["cached"] == 1
+        assert embeddings_module._BATCHER is not None
+
+    assert store_module.vectorstore_stats()["cached"] == 0
+    assert embeddings_module._BATCHER is None